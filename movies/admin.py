@@ -1,16 +1,48 @@
 from django.contrib import admin
-from .models import Movie, Category, MovieProgress
+from .models import Movie, Category, MovieProgress, Upload, ProcessingStage, MediaMetadata
+
+class ProcessingStageInline(admin.TabularInline):
+    model = ProcessingStage
+    fields = ['name', 'status', 'percent', 'exit_code', 'started_at', 'finished_at', 'updated_at', 'error']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class MediaMetadataInline(admin.TabularInline):
+    model = MediaMetadata
+    fields = ['name', 'duration_ms', 'video_codec', 'width', 'height', 'frame_rate', 'bitrate', 'peak_bitrate',
+              'keyframe_interval', 'audio_tracks', 'size', 'probed_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
+    inlines = [ProcessingStageInline, MediaMetadataInline]
     readonly_fields = [
         'video_120p',
         'video_360p',
         'video_720p',
         'video_1080p',
+        'hls_playlist',
+        'dash_manifest',
         'duration',
+        'source_sha256',
         'conversion_started',
         'created_at',
     ]
 admin.site.register(Category)
 admin.site.register(MovieProgress)
+
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'movie', 'offset', 'length', 'created_at', 'completed_at']
+    readonly_fields = ['movie', 'filename', 'length', 'offset', 'sha256', 'created_at', 'completed_at']
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.utils.benchmark import add_source_arguments, create_test_source, encode_rung, measure, measure_quality
+from movies.utils.video import get_video_duration
+
+
+class Command(BaseCommand):
+    """
+    Encodes one reference clip at one rung under every encoder profile in
+    VIDEO_ENCODER_PROFILES and reports, per profile:
+    - wall time and ffmpeg CPU-seconds of the encode,
+    - output size and average bitrate,
+    - SSIM and PSNR against the reference scaled to the same rung.
+    Use a real clip (--source) for meaningful quality numbers; the
+    synthetic testsrc2 source only compares speed.
+    """
+    help = "Benchmark encoder profiles for speed, size and quality (SSIM/PSNR)."
+
+    def add_arguments(self, parser):
+        add_source_arguments(parser)
+        parser.add_argument('--resolution', type=int, default=720, help="Rung to encode.")
+        parser.add_argument('--profiles', nargs='+', help="Profiles to compare (default: all).")
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or list(settings.VIDEO_ENCODER_PROFILES)
+        unknown = [name for name in profiles if name not in settings.VIDEO_ENCODER_PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown encoder profile(s): {', '.join(unknown)}")
+
+        workdir = tempfile.mkdtemp()
+        try:
+            source = options['source'] or create_test_source(workdir, options['duration'], options['size'])
+            duration = get_video_duration(source)
+            resolution = options['resolution']
+            self.stdout.write(f"{'profile':<12} {'wall s':>8} {'CPU s':>8} {'MiB':>8} {'kbit/s':>8} {'SSIM':>7} {'PSNR':>6}")
+            for name in profiles:
+                output = os.path.join(workdir, f"{name}.mp4")
+                wall, cpu = measure(lambda: encode_rung(source, output, resolution, name))
+                size = os.path.getsize(output)
+                ssim, psnr = measure_quality(output, source, resolution)
+                self.stdout.write(
+                    f"{name:<12} {wall:8.1f} {cpu:8.1f} {size / 1024 ** 2:8.1f} "
+                    f"{size * 8 / duration / 1000:8.0f} {ssim:7.4f} {psnr:>6}"
+                )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,97 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.utils.streaming import RangeFileWrapper
+
+
+class Command(BaseCommand):
+    """
+    Compares the Python chunk generator with the sendfile path used by
+    RangeFileResponse for ranged video streaming.
+    Writes a temporary file of --size-mb, then streams it --runs times into
+    a local socket (drained by a reader thread, like a client connection)
+    with both strategies and reports bytes/sec and CPU per GB.
+    """
+    help = "Benchmark generator vs. sendfile streaming of a byte range."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=256, help="Size of the generated test file.")
+        parser.add_argument('--chunk-size', type=int, default=8192, help="Chunk size of the generator path.")
+        parser.add_argument('--runs', type=int, default=3, help="Repetitions per strategy.")
+        parser.add_argument('--file', help="Use an existing media file instead of a generated one.")
+
+    def handle(self, *args, **options):
+        path = options['file'] or self._create_test_file(options['size_mb'])
+        try:
+            size = os.path.getsize(path)
+            self._read_through(path)  # warm the page cache for both strategies
+            strategies = [
+                ("generator", lambda out: self._stream_generator(path, size, out, options['chunk_size'])),
+                ("sendfile", lambda out: self._stream_sendfile(path, size, out)),
+            ]
+            for name, stream in strategies:
+                wall, cpu = self._measure(stream, options['runs'])
+                total = size * options['runs']
+                self.stdout.write(
+                    f"{name:>9}: {total / wall / 1024 ** 2:10.1f} MiB/s  "
+                    f"{cpu / (total / 1024 ** 3):8.3f} CPU-s/GiB"
+                )
+        finally:
+            if not options['file']:
+                os.remove(path)
+
+    def _create_test_file(self, size_mb):
+        fd, path = tempfile.mkstemp(suffix='.mp4')
+        block = os.urandom(1024 * 1024)
+        with os.fdopen(fd, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(block)
+        return path
+
+    def _read_through(self, path):
+        with open(path, 'rb') as f:
+            while f.read(1024 * 1024):
+                pass
+
+    def _measure(self, stream, runs):
+        sender, receiver = socket.socketpair()
+        drain = threading.Thread(target=self._drain, args=(receiver,), daemon=True)
+        drain.start()
+        try:
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            for _ in range(runs):
+                stream(sender.fileno())
+            sender.shutdown(socket.SHUT_WR)
+            drain.join()
+            return time.perf_counter() - wall_start, time.process_time() - cpu_start
+        finally:
+            sender.close()
+            receiver.close()
+
+    def _drain(self, sock):
+        buffer = bytearray(1024 * 1024)
+        while sock.recv_into(buffer):
+            pass
+
+    def _stream_generator(self, path, size, out, chunk_size):
+        with open(path, 'rb') as f:
+            for chunk in RangeFileWrapper(f, 0, size - 1, blksize=chunk_size):
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(out, view):]
+
+    def _stream_sendfile(self, path, size, out):
+        with open(path, 'rb') as f:
+            wrapper = RangeFileWrapper(f, 0, size - 1)
+            offset, remaining = wrapper.tell(), size
+            while remaining > 0:
+                sent = os.sendfile(out, wrapper.fileno(), offset, remaining)
+                if sent == 0:
+                    break
+                offset += sent
+                remaining -= sent
@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from movies.utils.benchmark import add_source_arguments, create_test_source, measure
+from movies.utils.video import RESOLUTIONS, convert_video_to_resolution, convert_video_to_resolutions
+
+
+class Command(BaseCommand):
+    """
+    Measures total ffmpeg CPU-seconds per movie for the two transcoding
+    modes on a synthetic lavfi source (testsrc2 + sine):
+    - fanout: one ffmpeg per resolution, each decoding the source itself.
+    - ladder: one ffmpeg that decodes once and splits into every resolution.
+    CPU time is read from the rusage of finished child processes.
+    """
+    help = "Benchmark fan-out vs. single-decode ladder transcoding."
+
+    def add_arguments(self, parser):
+        add_source_arguments(parser)
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp()
+        try:
+            source = options['source'] or create_test_source(workdir, options['duration'], options['size'])
+            resolutions = sorted(RESOLUTIONS)
+            with override_settings(MEDIA_ROOT=os.path.join(workdir, 'fanout')):
+                fanout = measure(lambda: [convert_video_to_resolution(source, r) for r in resolutions])
+            with override_settings(MEDIA_ROOT=os.path.join(workdir, 'ladder')):
+                ladder = measure(lambda: convert_video_to_resolutions(source, resolutions))
+            for name, (wall, cpu) in (("fanout", fanout), ("ladder", ladder)):
+                self.stdout.write(f"{name:>6}: {cpu:8.1f} CPU-s  {wall:8.1f} s wall")
+            self.stdout.write(f"ladder saves {(1 - ladder[1] / fanout[1]) * 100:.1f}% CPU per movie")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
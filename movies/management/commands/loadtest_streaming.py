@@ -0,0 +1,129 @@
+import asyncio
+import ssl
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Opens --viewers concurrent slow streaming connections against a running
+    server and reports how many of them are actually served.
+    Each viewer requests the first --range-mb of the video and reads it at
+    --rate KiB/s, like a player filling its buffer, for --duration seconds.
+    Run it once against the sync endpoint under gunicorn and once against
+    the async endpoint under an ASGI server to compare viewer capacity:
+
+        python manage.py loadtest_streaming --url http://localhost:8000/movies/1/stream/?resolution=360
+        python manage.py loadtest_streaming --url http://localhost:8000/movies/1/stream/async/?resolution=360
+
+    Stream requests are throttled per user (VIDEO_STREAM_THROTTLE_RATE,
+    30/minute by default), so one token only gets 30 viewers in. Pass
+    --token once per test user (viewers take them in turn) or raise the
+    rate on the server under test; otherwise most viewers count as
+    "HTTP 429".
+    """
+    help = "Load test a stream endpoint with many concurrent slow viewers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', required=True, help="Full stream URL including the resolution query.")
+        parser.add_argument('--token', action='append', default=[],
+                            help="DRF auth token sent as 'Authorization: Token <token>'; repeat it to spread "
+                                 "the viewers over several users.")
+        parser.add_argument('--viewers', type=int, default=200)
+        parser.add_argument('--rate', type=int, default=256, help="Read rate per viewer in KiB/s.")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds each viewer keeps reading.")
+        parser.add_argument('--range-mb', type=int, default=64, help="Size of the requested byte range.")
+        parser.add_argument('--connect-timeout', type=float, default=10.0,
+                            help="Seconds a viewer waits for response headers before counting as refused.")
+
+    def handle(self, *args, **options):
+        results = asyncio.run(self._run(options))
+        served = [r for r in results if r['error'] is None]
+        failed = len(results) - len(served)
+        self.stdout.write(f"viewers: {len(results)}  served: {len(served)}  failed: {failed}")
+        if served:
+            ttfb = sorted(r['ttfb'] for r in served)
+            throughput = [r['bytes'] / max(r['elapsed'], 1e-6) / 1024 for r in served]
+            self.stdout.write(
+                f"TTFB ms  p50: {percentile(ttfb, 50) * 1000:.0f}  "
+                f"p95: {percentile(ttfb, 95) * 1000:.0f}  max: {ttfb[-1] * 1000:.0f}"
+            )
+            self.stdout.write(
+                f"per-viewer KiB/s  mean: {statistics.mean(throughput):.0f}  "
+                f"min: {min(throughput):.0f}  (target {options['rate']})"
+            )
+        errors = {}
+        for r in results:
+            if r['error'] is not None:
+                errors[r['error']] = errors.get(r['error'], 0) + 1
+        for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {count} x {error}")
+
+    async def _run(self, options):
+        tokens = options['token'] or [None]
+        return await asyncio.gather(*(
+            self._viewer(options, tokens[index % len(tokens)]) for index in range(options['viewers'])
+        ))
+
+    async def _viewer(self, options, token):
+        result = {'ttfb': None, 'bytes': 0, 'elapsed': 0.0, 'error': None}
+        url = urlsplit(options['url'])
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        path = url.path + (f"?{url.query}" if url.query else "")
+        started = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    url.hostname, port,
+                    ssl=ssl.create_default_context() if url.scheme == 'https' else None,
+                ),
+                options['connect_timeout'],
+            )
+            writer.write(self._request(url, path, options, token).encode('latin-1'))
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), options['connect_timeout'])
+            result['ttfb'] = time.perf_counter() - started
+            status = int(status_line.split()[1])
+            if status not in (200, 206):
+                result['error'] = f"HTTP {status}"
+                return result
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            await self._read_slowly(reader, options, result, started)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError) as exc:
+            result['error'] = type(exc).__name__
+        finally:
+            result['elapsed'] = time.perf_counter() - started
+            if writer is not None:
+                writer.close()
+        return result
+
+    def _request(self, url, path, options, token):
+        headers = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {url.netloc}",
+            f"Range: bytes=0-{options['range_mb'] * 1024 * 1024 - 1}",
+            "Connection: close",
+        ]
+        if token:
+            headers.append(f"Authorization: Token {token}")
+        return "\r\n".join(headers) + "\r\n\r\n"
+
+    async def _read_slowly(self, reader, options, result, started):
+        chunk = max(options['rate'] * 1024 // 10, 1)
+        deadline = started + options['duration']
+        while time.perf_counter() < deadline:
+            data = await reader.read(chunk)
+            if not data:
+                break
+            result['bytes'] += len(data)
+            await asyncio.sleep(0.1)
+
+
+def percentile(sorted_values, percent):
+    index = min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
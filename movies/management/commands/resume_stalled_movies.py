@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.pipeline import find_stalled_movies, resume_processing
+
+
+class Command(BaseCommand):
+    """
+    Finds movies whose processing stalled (no stage changed for
+    --stall-timeout seconds, e.g. after a worker died) and re-enqueues only
+    the stages that did not finish. Run it periodically, e.g. from cron:
+        */15 * * * * python manage.py resume_stalled_movies
+    """
+    help = "Resume the processing of stalled movies."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stall-timeout', type=int, default=settings.VIDEO_STALL_TIMEOUT,
+                            help="Seconds without stage changes after which a movie counts as stalled.")
+        parser.add_argument('--include-failed', action='store_true',
+                            help="Also resume movies with a failed stage (retries used up).")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the stalled movies.")
+
+    def handle(self, *args, **options):
+        movies = find_stalled_movies(options['stall_timeout'], options['include_failed'])
+        for movie in movies:
+            if options['dry_run']:
+                self.stdout.write(f"{movie.id} {movie.title}: stalled")
+                continue
+            stages = resume_processing(movie)
+            if stages:
+                self.stdout.write(f"{movie.id} {movie.title}: resumed {', '.join(stages)}")
+            else:
+                self.stdout.write(f"{movie.id} {movie.title}: source is missing, cannot resume")
+        self.stdout.write(f"{len(movies)} stalled movie(s)")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_alter_movie_video_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='hls_playlist',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_movie_hls_playlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='dash_manifest',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+    ]
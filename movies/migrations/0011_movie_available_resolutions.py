@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_movie_dash_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='available_resolutions',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
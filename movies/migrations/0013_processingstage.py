@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 03:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('finished', 'Finished'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('percent', models.FloatField(default=0)),
+                ('exit_code', models.IntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['id'],
+                'unique_together': {('movie', 'name')},
+            },
+        ),
+    ]
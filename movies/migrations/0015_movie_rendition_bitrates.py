@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0014_movie_encoding_ladder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rendition_bitrates',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
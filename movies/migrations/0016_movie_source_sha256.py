@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0015_movie_rendition_bitrates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='source_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
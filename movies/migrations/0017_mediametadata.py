@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 04:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0016_movie_source_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20)),
+                ('duration_ms', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('video_codec', models.CharField(blank=True, max_length=32)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('frame_rate', models.FloatField(blank=True, null=True)),
+                ('bitrate', models.PositiveIntegerField(blank=True, null=True)),
+                ('peak_bitrate', models.PositiveIntegerField(blank=True, null=True)),
+                ('keyframe_interval', models.FloatField(blank=True, null=True)),
+                ('audio_tracks', models.JSONField(blank=True, default=list)),
+                ('size', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('probed_at', models.DateTimeField(auto_now=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['id'],
+                'unique_together': {('movie', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0017_mediametadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='seek_previews',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0018_movie_seek_previews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='thumbnail_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
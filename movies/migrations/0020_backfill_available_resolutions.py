@@ -0,0 +1,24 @@
+from django.db import migrations
+
+RESOLUTIONS = (120, 360, 720, 1080)
+
+
+def backfill_available_resolutions(apps, schema_editor):
+    # Movies converted before available_resolutions existed: their plan is every rendition they have.
+    Movie = apps.get_model('movies', 'Movie')
+    for movie in Movie.objects.filter(available_resolutions=[]).iterator():
+        resolutions = [resolution for resolution in RESOLUTIONS if getattr(movie, f'video_{resolution}p')]
+        if resolutions:
+            movie.available_resolutions = resolutions
+            movie.save(update_fields=['available_resolutions'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0019_movie_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_available_resolutions, migrations.RunPython.noop),
+    ]
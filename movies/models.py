@@ -1,3 +1,5 @@
+import os
+import uuid
 from django.db import models
 from django.conf import settings
 
@@ -23,7 +25,20 @@ class Movie(models.Model):
     - conversion_started: flag to prevent duplicate conversion jobs.
     - video_file: original upload, auto-converted into multiple resolutions.
     - video_120p...video_1080p: derived files for adaptive streaming.
+    - available_resolutions: rungs planned for the source (none above its height);
+      the other video_*p fields stay empty.
+    - encoding_ladder: per-title CRF/maxrate per rung chosen from a complexity probe.
+    - rendition_bitrates: measured average/peak kbit/s per rung, e.g. {"720": {"average": 2100, "peak": 3400}}.
+    - source_sha256: content hash of the last source; a re-upload of the same content
+      reuses the outputs of a completed movie instead of encoding again.
+    - thumbnail_variants: the thumbnail scaled to several widths per format,
+      e.g. {"webp": {"320": "thumbnails/7/<version>/thumb_320.webp"}}.
+    - seek_previews: WebVTT index of the seek-preview sprite sheets next to it
+      (previews/<movie id>/<version>/), extracted together with the thumbnail.
     - trailer: optional short clip, auto-generated if omitted.
+    - hls_playlist: HLS master playlist packaged from the renditions.
+    - dash_manifest: MPEG-DASH manifest; lives in a fresh folder per packaging run,
+      so segment URLs never change content.
     """
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -37,7 +52,15 @@ class Movie(models.Model):
     video_360p = models.FileField(null=True, blank=True)
     video_720p = models.FileField(null=True, blank=True)
     video_1080p = models.FileField(null=True, blank=True)
+    available_resolutions = models.JSONField(default=list, blank=True, editable=False)
+    encoding_ladder = models.JSONField(default=dict, blank=True, editable=False)
+    rendition_bitrates = models.JSONField(default=dict, blank=True, editable=False)
+    source_sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
+    seek_previews = models.FileField(null=True, blank=True, editable=False)
     trailer = models.FileField(upload_to='trailers/', blank=True, null=True, help_text="Optional. Wenn du keinen Trailer hochlädst, wird automatisch einer erzeugt.")
+    hls_playlist = models.FileField(null=True, blank=True, editable=False)
+    dash_manifest = models.FileField(null=True, blank=True, editable=False)
     def __str__(self):
         return self.title
 
@@ -58,4 +81,98 @@ class MovieProgress(models.Model):
         unique_together = ("user", "movie")  # Jeder User kann pro Movie nur einen Eintrag haben
 
     def __str__(self):
-        return f"{self.user.email} – {self.movie.title}"
\ No newline at end of file
+        return f"{self.user.email} – {self.movie.title}"
+
+class Upload(models.Model):
+    """
+    Resumable (tus-style) upload of a movie's source video.
+    - id: random UUID used in the upload URL.
+    - movie: receives the file as video_file once the upload is complete.
+    - filename: original file name, reused for the stored video.
+    - length: announced total size in bytes (Upload-Length).
+    - offset: bytes received so far (Upload-Offset).
+    - sha256: hex digest of the complete file, set on completion.
+    - completed_at: when the last byte arrived and the file was attached.
+    Bytes are written straight to MEDIA_ROOT/uploads/<id>.part.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="uploads")
+    filename = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def part_path(self):
+        return os.path.join(settings.MEDIA_ROOT, "uploads", f"{self.id}.part")
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.length})"
+
+
+class ProcessingStage(models.Model):
+    """
+    One stage of a movie's processing pipeline (thumbnail, trailer, duration,
+    one per rung like "720p", packaging, finalize, ...).
+    - status: queued, running, finished or failed.
+    - percent: progress of the stage; ffmpeg encodes report it live via -progress.
+    - exit_code: exit status of the failed ffmpeg/ffprobe process (0 when finished).
+    - error: message of the exception that failed the stage.
+    - started_at, finished_at, updated_at: timing, to spot slow or stuck stages.
+    """
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        FINISHED = "finished"
+        FAILED = "failed"
+
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="stages")
+    name = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    percent = models.FloatField(default=0)
+    exit_code = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        unique_together = ("movie", "name")
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.movie.title} – {self.name}: {self.status}"
+
+
+class MediaMetadata(models.Model):
+    """
+    Properties of a movie's source ("source") or of one rendition ("720p"),
+    read with a single ffprobe pass.
+    - duration_ms: exact duration in milliseconds.
+    - video_codec, width, height, frame_rate: first video stream.
+    - bitrate: average bitrate of the whole file in kbit/s.
+    - peak_bitrate: most video kbit/s in any second (renditions only).
+    - keyframe_interval: average seconds between keyframes (renditions only).
+    - audio_tracks: [{"codec", "channels", "sample_rate", "language"}, ...].
+    - size: file size in bytes.
+    """
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="media")
+    name = models.CharField(max_length=20)
+    duration_ms = models.PositiveBigIntegerField(null=True, blank=True)
+    video_codec = models.CharField(max_length=32, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    frame_rate = models.FloatField(null=True, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True)
+    peak_bitrate = models.PositiveIntegerField(null=True, blank=True)
+    keyframe_interval = models.FloatField(null=True, blank=True)
+    audio_tracks = models.JSONField(default=list, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    probed_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        unique_together = ("movie", "name")
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.movie.title} – {self.name}"
@@ -0,0 +1,289 @@
+#  Post-upload processing pipeline: waits for the upload to settle, then fans out the processing jobs.
+from datetime import timedelta
+from movies.tasks import job_retry, clear_stale_renditions, outputs_complete, save_reused_renditions, save_encoding_ladder, save_converted_resolution, save_converted_resolutions, save_chunked_renditions, save_thumbnail, save_trailer, save_media_metadata, save_hls_package, save_dash_package, finalize_conversion
+from .models import Movie, ProcessingStage, Upload
+from movies.stages import reset_stages, track_stage
+from django.db.models import Max
+from movies.utils.video import RESOLUTIONS, plan_resolutions, probe_media
+from movies.utils.uploads import file_sha256
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+import django_rq
+import os
+import subprocess
+
+
+def wait_for_upload(movie_id, path, last_size=-1, stable_checks=0, waited=0,
+                    check_interval=3, required_stable_checks=2, max_wait=1800):
+    """
+    Checks once whether the uploaded source is complete, i.e. its size
+    stayed the same for required_stable_checks checks in a row.
+    - Stable: starts the processing pipeline.
+    - Still growing or missing: schedules itself again in check_interval
+      seconds (needs a worker started with --with-scheduler).
+    - Gives up after max_wait seconds.
+    No worker ever sleeps while waiting.
+    """
+    if not Movie.objects.filter(id=movie_id).exists():
+        return
+    if os.path.exists(path):
+        current_size = os.path.getsize(path)
+        if current_size == last_size:
+            stable_checks += 1
+            if stable_checks >= required_stable_checks:
+                start_processing(movie_id, path)
+                return
+        else:
+            stable_checks = 0
+            last_size = current_size
+
+    waited += check_interval
+    if waited >= max_wait:
+        print(f"Upload of movie {movie_id} not ready after {max_wait}s, giving up: {path}")
+        return
+    django_rq.get_queue('fast').enqueue_in(
+        timedelta(seconds=check_interval), wait_for_upload, movie_id, path,
+        last_size=last_size, stable_checks=stable_checks, waited=waited,
+        check_interval=check_interval, required_stable_checks=required_stable_checks, max_wait=max_wait,
+    )
+
+
+def start_processing(movie_id, path):
+    """
+    Probes the source, plans the encoding ladder for it, records every
+    stage as a queued ProcessingStage and enqueues the processing jobs.
+    Only ffprobe runs here: thumbnail and trailer are enqueued at once,
+    the source hash and everything that depends on it run in
+    deduplicate_source.
+    """
+    if not Movie.objects.filter(id=movie_id).exists():
+        return
+    resolutions = probe_source(movie_id, path)
+    save_resolution_plan(movie_id, resolutions)
+    stages = pipeline_stages(resolutions)
+    reset_stages(movie_id, stages)
+    enqueue_processing(movie_id, path, resolutions, stages)
+
+
+def deduplicate_source(movie_id, path, resolutions, stages, wait_for=()):
+    """
+    Hashes the source (stage "dedup") and decides how the renditions are made:
+    - A completed movie was made from the same content: its renditions
+      and packages are linked by save_reused_renditions (stage "reuse"
+      replaces the encode and packaging stages) and nothing is encoded.
+    - Otherwise: the encode, packaging and finalize jobs of `stages`.
+    finalize_conversion also waits for the job ids in wait_for (thumbnail
+    and trailer, which still read the source).
+    """
+    if not Movie.objects.filter(id=movie_id).exists():
+        return
+    with track_stage(movie_id, "dedup"):
+        sha256 = source_sha256(movie_id, path)
+        Movie.objects.filter(id=movie_id).update(source_sha256=sha256)
+        donor = find_reusable_movie(movie_id, sha256)
+    if not donor:
+        enqueue_encodes(movie_id, path, resolutions, stages, wait_for)
+        return
+
+    replaced = [name for name in stages if name not in ("thumbnail", "trailer", "dedup", "finalize")]
+    ProcessingStage.objects.filter(movie_id=movie_id, name__in=replaced).delete()
+    ProcessingStage.objects.get_or_create(movie_id=movie_id, name="reuse")
+    save_reused_renditions(movie_id, donor.id, path)
+    django_rq.get_queue('maintenance').enqueue(finalize_conversion, path, movie_id, depends_on=list(wait_for) or None,
+                                               retry=job_retry())
+
+
+def save_resolution_plan(movie_id, resolutions):
+    #  Stores the planned rungs; renditions of rungs a previous source had but this one
+    #    doesn't get are deleted, so nothing serves or packages them any more.
+    movie = Movie.objects.get(id=movie_id)
+    movie.available_resolutions = resolutions
+    movie.save(update_fields=["available_resolutions", *clear_stale_renditions(movie, resolutions)])
+
+
+def pipeline_stages(resolutions):
+    #  Names of all stages of the pipeline in the current transcode mode.
+    return [
+        "thumbnail", "trailer", "dedup",
+        *(["analyze"] if settings.VIDEO_PER_TITLE else []),
+        *(["split", "chunks"] if settings.VIDEO_TRANSCODE_MODE == 'chunked' else []),
+        *(f"{resolution}p" for resolution in resolutions),
+        "hls", "dash", "finalize",
+    ]
+
+
+def enqueue_processing(movie_id, path, resolutions, stages):
+    """
+    Enqueues the jobs of the given stages followed by finalize_conversion,
+    each on the queue of its weight and with the retry policy of job_retry():
+    - fast: thumbnail, trailer (ready within seconds of the upload) and
+      the per-title complexity probe the renditions wait for.
+    - encode: the renditions.
+    - maintenance: the source hash (deduplicate_source, which enqueues
+      the encodes), HLS/DASH packaging and finalize_conversion.
+    Dependencies only point at jobs enqueued here; stages left out are done.
+    """
+    side_jobs = [
+        django_rq.get_queue('fast').enqueue(task, movie_id, path, retry=job_retry())
+        for name, task in (("thumbnail", save_thumbnail), ("trailer", save_trailer))
+        if name in stages
+    ]
+    wait_for = [job.id for job in side_jobs]
+    if "dedup" in stages:
+        django_rq.get_queue('maintenance').enqueue(deduplicate_source, movie_id, path, resolutions, stages, wait_for,
+                                                   retry=job_retry())
+        return
+    enqueue_encodes(movie_id, path, resolutions, stages, wait_for)
+
+
+def enqueue_encodes(movie_id, path, resolutions, stages, wait_for=()):
+    #  Enqueues the analyze, rendition, packaging and finalize jobs among `stages`;
+    #    finalize_conversion also waits for the job ids in wait_for.
+    fast_queue = django_rq.get_queue('fast')
+    encode_queue = django_rq.get_queue('encode')
+    maintenance_queue = django_rq.get_queue('maintenance')
+    analysis = None
+    if settings.VIDEO_PER_TITLE and "analyze" in stages:
+        analysis = [fast_queue.enqueue(save_encoding_ladder, movie_id, path, resolutions, retry=job_retry())]
+    pending = [resolution for resolution in resolutions if f"{resolution}p" in stages]
+
+    if settings.VIDEO_TRANSCODE_MODE == 'chunked' and pending:
+        #  The split job enqueues the chunk, concat, packaging and finalize jobs itself.
+        encode_queue.enqueue(save_chunked_renditions, path, movie_id, pending, list(wait_for),
+                             depends_on=analysis, retry=job_retry())
+        return
+    if not pending:
+        conversion_jobs = []
+    elif settings.VIDEO_TRANSCODE_MODE == 'ladder':
+        conversion_jobs = [encode_queue.enqueue(save_converted_resolutions, path, movie_id, pending,
+                                                depends_on=analysis, retry=job_retry())]
+    else:
+        conversion_jobs = [
+            encode_queue.enqueue(save_converted_resolution, path, movie_id, res, depends_on=analysis, retry=job_retry())
+            for res in pending
+        ]
+
+    packaging_jobs = [
+        maintenance_queue.enqueue(task, movie_id, depends_on=conversion_jobs or None, retry=job_retry())
+        for name, task in (("hls", save_hls_package), ("dash", save_dash_package))
+        if name in stages
+    ]
+    all_jobs = conversion_jobs + packaging_jobs + list(wait_for)
+    maintenance_queue.enqueue(finalize_conversion, path, movie_id, depends_on=all_jobs or None, retry=job_retry())
+
+
+def find_stalled_movies(stall_timeout, include_failed=False):
+    """
+    Returns the movies whose processing started but never finished and
+    whose stages haven't changed for stall_timeout seconds (e.g. the worker
+    died and took its jobs along). Movies with a failed stage are only
+    included with include_failed, their retries are used up.
+    Movies without any stage count once their source is older than stall_timeout.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stall_timeout)
+    movies = (
+        Movie.objects.filter(conversion_started=True)
+        .exclude(video_file="").exclude(video_file__isnull=True)
+        .annotate(last_update=Max("stages__updated_at"))
+    )
+    if not include_failed:
+        movies = movies.exclude(stages__status=ProcessingStage.Status.FAILED)
+    stalled = []
+    for movie in movies:
+        if movie.last_update is None:
+            path = movie.video_file.path
+            if not os.path.exists(path) or os.path.getmtime(path) > cutoff.timestamp():
+                continue
+        elif movie.last_update >= cutoff:
+            continue
+        stalled.append(movie)
+    return stalled
+
+
+def resume_processing(movie):
+    """
+    Re-enqueues the jobs of every stage of the movie that did not finish
+    and marks those stages queued again; finished stages are kept. A movie
+    without stages or with an unfinished reuse is processed from the start.
+    Returns the resumed stage names (empty if the source is gone).
+    """
+    path = movie.video_file.path
+    if not os.path.exists(path):
+        return []
+    unfinished_reuse = movie.stages.filter(name="reuse").exclude(status=ProcessingStage.Status.FINISHED).exists()
+    if not movie.stages.exists() or unfinished_reuse:
+        start_processing(movie.id, path)
+        movie.refresh_from_db(fields=["available_resolutions"])
+        return pipeline_stages(movie.available_resolutions)
+    pending = list(movie.stages.exclude(status=ProcessingStage.Status.FINISHED).values_list("name", flat=True))
+    if not pending:
+        return []
+    movie.stages.filter(name__in=pending).update(
+        status=ProcessingStage.Status.QUEUED, percent=0, exit_code=None, error="", updated_at=timezone.now(),
+    )
+    enqueue_processing(movie.id, path, movie.available_resolutions or probe_source(movie.id, path), pending)
+    return pending
+
+
+def source_sha256(movie_id, path):
+    #  Content hash of the source, or "" if it can't be read. A resumable upload hashed the file
+    #    while receiving it; that hash is used unless the file was written after the upload completed.
+    upload = Upload.objects.filter(movie_id=movie_id, completed_at__isnull=False).order_by("-completed_at").first()
+    try:
+        if upload and upload.sha256 and os.path.getmtime(path) <= upload.completed_at.timestamp():
+            return upload.sha256
+        return file_sha256(path)
+    except OSError:
+        return ""
+
+
+def find_reusable_movie(movie_id, sha256):
+    #  Returns a movie whose complete outputs were made from a source with this hash, or None.
+    #    Other movies must be finalized (still processing otherwise); the movie itself qualifies
+    #    if its previous source had the same content and its outputs are still there.
+    if not sha256:
+        return None
+    candidates = sorted(Movie.objects.filter(source_sha256=sha256), key=lambda movie: movie.id != movie_id)
+    for movie in candidates:
+        if movie.id != movie_id and movie.video_file:
+            continue
+        if outputs_complete(movie):
+            return movie
+    return None
+
+
+def probe_source(movie_id, path):
+    #  Probes the source once, stores its MediaMetadata and duration and returns the rungs its
+    #    size fills (plan_resolutions). Falls back to the full ladder if the source can't be probed.
+    try:
+        metadata = probe_media(path)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return list(RESOLUTIONS)
+    save_media_metadata(movie_id, "source", metadata)
+    return plan_resolutions(metadata["height"], metadata["width"]) if metadata["height"] else list(RESOLUTIONS)
+
+
+def attach_upload(upload, sha256):
+    """
+    Moves a completed upload into videos/ and makes it the movie's
+    video_file; saving the movie runs video_post_save, which starts the
+    pipeline. A previous, still unprocessed source is replaced.
+    """
+    name = default_storage.get_available_name(
+        default_storage.generate_filename(os.path.join("videos", os.path.basename(upload.filename)))
+    )
+    target_path = default_storage.path(name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    os.replace(upload.part_path, target_path)
+
+    upload.sha256 = sha256
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=["sha256", "completed_at"])
+
+    movie = upload.movie
+    if movie.video_file:
+        movie.video_file.delete(save=False)
+    movie.video_file.name = name
+    movie.conversion_started = False
+    movie.save(update_fields=["video_file", "conversion_started"])
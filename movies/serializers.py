@@ -1,18 +1,62 @@
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Movie, MovieProgress
+from movies.utils.images import supported_formats
+from movies.utils.thumbnail_cache import thumbnail_version
+from .models import Movie, MovieProgress, Upload, ProcessingStage, MediaMetadata
 
 class MovieSerializer(serializers.ModelSerializer):
     """
     Serializes basic Movie info along with the authenticated user’s watch progress.
     Fields:
       - id, title, trailer, description, thumbnail, categories: core movie metadata.
+      - thumbnail_srcset: srcset of the thumbnail variants per MIME type, e.g.
+        {"image/webp": "https://.../thumb_320.webp 320w, https://.../thumb_640.webp 640w"},
+        for <picture><source type srcset>. Thumbnails without variants (uploaded
+        in the admin) point at the on-demand resize endpoint instead.
       - progress: dynamic field showing how many seconds the user has watched.
     """
     progress = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Movie
-        fields = ['id', 'title', 'trailer', 'description', 'thumbnail', 'categories', 'progress']
+        fields = ['id', 'title', 'trailer', 'description', 'thumbnail', 'thumbnail_srcset', 'categories', 'progress']
+
+    def get_thumbnail_srcset(self, obj):
+        """
+        Smallest width first, preferred formats (THUMBNAIL_FORMATS order) first.
+        """
+        request = self.context.get('request')
+        if not obj.thumbnail_variants:
+            return self.get_resized_thumbnail_srcset(obj, request)
+        srcset = {}
+        preferred = [name for name in settings.THUMBNAIL_FORMATS if name in obj.thumbnail_variants]
+        for name in preferred + [name for name in obj.thumbnail_variants if name not in preferred]:
+            sizes = sorted(obj.thumbnail_variants[name].items(), key=lambda item: int(item[0]))
+            srcset[f"image/{name}"] = ", ".join(
+                f"{request.build_absolute_uri(default_storage.url(path))} {width}w" for width, path in sizes
+            )
+        return srcset
+
+    def get_resized_thumbnail_srcset(self, obj, request):
+        """
+        srcsets of the movie-thumbnail endpoint, which resizes on first request.
+        """
+        if not obj.thumbnail or not os.path.isfile(obj.thumbnail.path):
+            return {}
+        version = thumbnail_version(obj.thumbnail.path)
+        return {
+            f"image/{name}": ", ".join(
+                request.build_absolute_uri(reverse("movies:movie-thumbnail", kwargs={
+                    "pk": obj.pk, "version": version, "width": width, "fmt": name,
+                })) + f" {width}w"
+                for width in sorted(settings.THUMBNAIL_WIDTHS)
+            )
+            for name in supported_formats(settings.THUMBNAIL_FORMATS)
+        }
 
     def get_progress(self, obj):
         """
@@ -31,18 +75,39 @@ class MovieSerializer(serializers.ModelSerializer):
         return None
 
 
+class MediaMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MediaMetadata
+        fields = ['name', 'duration_ms', 'video_codec', 'width', 'height', 'frame_rate', 'bitrate',
+                  'peak_bitrate', 'keyframe_interval', 'audio_tracks', 'size']
+
+
 class MovieFileSerializer(serializers.ModelSerializer):
     """
     Provides file URLs and playback state for streaming endpoints.
     Adds:
       - progressInSeconds: last watch position for the current user.
       - finished: flag indicating if the user completed the movie.
+      - hls_url: versioned master playlist endpoint for adaptive streaming, or None.
+      - dash_url: versioned MPEG-DASH manifest endpoint, or None.
+      - resolutions: rungs that can be streamed right now; rungs above the
+        source height are never generated and never listed.
+      - rendition_bitrates: measured average/peak kbit/s per rung.
+      - seek_previews: WebVTT index and sprite sheets for seek previews,
+        or None before the thumbnail stage ran.
+      - media: probed properties of the source and of every rendition
+        (duration, codec, size, frame rate, bitrates, keyframes, audio).
     """
     progressInSeconds = serializers.SerializerMethodField()
     finished = serializers.SerializerMethodField()
+    hls_url = serializers.SerializerMethodField()
+    dash_url = serializers.SerializerMethodField()
+    resolutions = serializers.SerializerMethodField()
+    seek_previews = serializers.SerializerMethodField()
+    media = MediaMetadataSerializer(many=True, read_only=True)
     class Meta:
         model = Movie
-        fields = ['title', 'video_120p', 'video_360p', 'video_720p', 'video_1080p', 'progressInSeconds', 'finished']
+        fields = ['title', 'video_120p', 'video_360p', 'video_720p', 'video_1080p', 'resolutions', 'rendition_bitrates', 'seek_previews', 'media', 'hls_url', 'dash_url', 'progressInSeconds', 'finished']
         
     def get_progressInSeconds(self, obj):
         """
@@ -55,6 +120,53 @@ class MovieFileSerializer(serializers.ModelSerializer):
         except MovieProgress.DoesNotExist:
             return 0
     
+    def get_resolutions(self, obj):
+        """
+        Planned rungs whose rendition file exists, lowest first.
+        """
+        return [
+            resolution for resolution in sorted(obj.available_resolutions)
+            if getattr(obj, f"video_{resolution}p", None)
+        ]
+
+    def get_seek_previews(self, obj):
+        """
+        Absolute URLs of the WebVTT index and of its sprite sheets, which the
+        cues reference relative to the index.
+        """
+        if not obj.seek_previews:
+            return None
+        request = self.context['request']
+        folder = os.path.dirname(obj.seek_previews.name)
+        try:
+            names = sorted(name for name in default_storage.listdir(folder)[1] if name.startswith("sprite_"))
+        except FileNotFoundError:
+            return None
+        return {
+            "vtt": request.build_absolute_uri(obj.seek_previews.url),
+            "sprites": [request.build_absolute_uri(default_storage.url(f"{folder}/{name}")) for name in names],
+        }
+
+    def get_hls_url(self, obj):
+        """
+        Absolute URL of the HLS master playlist endpoint, once the movie is packaged.
+        """
+        if not obj.hls_playlist:
+            return None
+        version = os.path.basename(os.path.dirname(obj.hls_playlist.name))
+        url = reverse("movies:movie-hls", kwargs={"pk": obj.pk, "name": f"{version}/master.m3u8"})
+        return self.context['request'].build_absolute_uri(url)
+
+    def get_dash_url(self, obj):
+        """
+        Absolute URL of the DASH manifest endpoint, including its version folder.
+        """
+        if not obj.dash_manifest:
+            return None
+        version = os.path.basename(os.path.dirname(obj.dash_manifest.name))
+        url = reverse("movies:movie-dash", kwargs={"pk": obj.pk, "name": f"{version}/manifest.mpd"})
+        return self.context['request'].build_absolute_uri(url)
+
     def get_finished(self, obj):
         """
         Return whether the current user has marked this movie as finished.
@@ -95,4 +207,36 @@ class MovieProgressSerializer(serializers.ModelSerializer):
             movie_id=movie_id,
             defaults=validated_data
         )
-        return obj
\ No newline at end of file
+        return obj
+
+class UploadSerializer(serializers.ModelSerializer):
+    """
+    Creates and describes resumable uploads.
+    Fields:
+      - movie, filename: given when the upload is created.
+      - id, length, offset, sha256, completed_at: upload state (read-only).
+    """
+    class Meta:
+        model = Upload
+        fields = ['id', 'movie', 'filename', 'length', 'offset', 'sha256', 'completed_at']
+        read_only_fields = ['id', 'length', 'offset', 'sha256', 'completed_at']
+
+
+class ProcessingStageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProcessingStage
+        fields = ['name', 'status', 'percent', 'exit_code', 'error', 'started_at', 'finished_at', 'updated_at']
+
+
+class MovieStatusSerializer(serializers.ModelSerializer):
+    """
+    Processing state of a movie for operators.
+    Fields:
+      - id, title, conversion_started: the movie.
+      - stages: every pipeline stage with status, progress, exit code and timing.
+    """
+    stages = ProcessingStageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Movie
+        fields = ['id', 'title', 'conversion_started', 'stages']
@@ -1,38 +1,30 @@
 	#  Handles enqueuing post-upload video processing jobs and cleaning up files on delete.
-from movies.tasks import save_converted_resolution, save_thumbnail, save_trailer, save_video_duration, finalize_conversion
-from .models import Movie
-from movies.utils.wait import wait_until_file_is_ready
+from movies.pipeline import wait_for_upload
+from movies.tasks import get_chunk_dir
+from .models import Movie, Upload
+from movies.utils.file_cache import media_file_cache
+from django.conf import settings
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 import django_rq
+import os
+import shutil
 
 
 @receiver(post_save, sender=Movie)
 def video_post_save(sender, instance, created, **kwargs):
     #  Called after a Movie is saved: if a new video_file is present,
-    #    mark conversion_started and enqueue all processing tasks.
+    #    mark conversion_started and enqueue the readiness check, which
+    #    starts all processing tasks once the upload is complete. The job is
+    #    enqueued on commit, so workers never see an uncommitted movie.
     if not instance.video_file:
         return
     path = instance.video_file.path
     if not instance.conversion_started:
         instance.conversion_started = True
         instance.save(update_fields=["conversion_started"])
-
-        if wait_until_file_is_ready(path, check_interval=3, required_stable_checks=2, max_wait=1800):
-            queue = django_rq.get_queue('default')
-            movie_id = instance.id
-            thumbnail_job = queue.enqueue(save_thumbnail, movie_id, path) 
-            resolutions = [120, 360, 720, 1080]
-            conversion_jobs = [
-                queue.enqueue(save_converted_resolution, path, movie_id, res)
-                for res in resolutions
-            ]
-
-            trailer_job = queue.enqueue(save_trailer, movie_id, path)
-            duration_job = queue.enqueue(save_video_duration, movie_id, path)
-
-            all_jobs = conversion_jobs + [thumbnail_job, trailer_job, duration_job]
-            queue.enqueue(finalize_conversion, path, movie_id, depends_on=all_jobs)
+        transaction.on_commit(lambda: django_rq.get_queue('fast').enqueue(wait_for_upload, instance.id, path))
 
 
 @receiver(post_delete, sender=Movie)
@@ -50,7 +42,29 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     for field in file_fields:
         file_field = getattr(instance, field, None)
         if file_field:
+            media_file_cache.invalidate(file_field.path)
             file_field.delete(False)
 
+    if instance.hls_playlist:
+        # hls/<movie id>/<version>/master.m3u8
+        shutil.rmtree(os.path.dirname(os.path.dirname(instance.hls_playlist.path)), ignore_errors=True)
+    if instance.thumbnail_variants:
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, "thumbnails", str(instance.id)), ignore_errors=True)
+    if instance.seek_previews:
+        # previews/<movie id>/<version>/thumbnails.vtt
+        shutil.rmtree(os.path.dirname(os.path.dirname(instance.seek_previews.path)), ignore_errors=True)
+    if instance.dash_manifest:
+        # dash/<movie id>/<version>/manifest.mpd
+        shutil.rmtree(os.path.dirname(os.path.dirname(instance.dash_manifest.path)), ignore_errors=True)
+
+
+
+    # leftovers of an unfinished chunked encode
+    shutil.rmtree(get_chunk_dir(instance.id), ignore_errors=True)
 
 
+@receiver(post_delete, sender=Upload)
+def delete_upload_part(sender, instance, **kwargs):
+    #  Removes the partial file of an unfinished upload.
+    if os.path.exists(instance.part_path):
+        os.remove(instance.part_path)
@@ -0,0 +1,113 @@
+#  Records the state of every processing stage of a movie in ProcessingStage rows.
+import time
+from contextlib import contextmanager
+from django.db.models import F
+from django.utils import timezone
+from .models import ProcessingStage
+
+
+def reset_stages(movie_id, names):
+    """
+    Replaces the stages of a movie with fresh queued ones, one per name.
+    """
+    ProcessingStage.objects.filter(movie_id=movie_id).delete()
+    ProcessingStage.objects.bulk_create(
+        ProcessingStage(movie_id=movie_id, name=name) for name in names
+    )
+
+
+class StageTracker:
+    """
+    Progress callback of a running stage. Writes the percentage at most
+    every min_interval seconds, so ffmpeg's progress reports don't turn
+    into one UPDATE each.
+    """
+
+    def __init__(self, movie_id, names, min_interval=1.0):
+        self.movie_id = movie_id
+        self.names = names
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def stages(self):
+        return ProcessingStage.objects.filter(movie_id=self.movie_id, name__in=self.names)
+
+    def progress(self, percent):
+        now = time.monotonic()
+        if now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        self.stages().update(percent=round(min(percent, 100.0), 1), updated_at=timezone.now())
+
+
+@contextmanager
+def track_stage(movie_id, *names):
+    """
+    Marks the named stages as running for the duration of the block and as
+    finished (exit code 0) or failed afterwards. A failing ffmpeg/ffprobe
+    call stores its exit code; the exception is re-raised so RQ marks the
+    job as failed too. Yields a StageTracker for progress updates.
+    """
+    now = timezone.now()
+    for name in names:
+        ProcessingStage.objects.update_or_create(
+            movie_id=movie_id, name=name,
+            defaults={
+                "status": ProcessingStage.Status.RUNNING, "percent": 0, "exit_code": None,
+                "error": "", "started_at": now, "finished_at": None,
+            },
+        )
+    tracker = StageTracker(movie_id, names)
+    try:
+        yield tracker
+    except Exception as exc:
+        tracker.stages().update(
+            status=ProcessingStage.Status.FAILED, exit_code=getattr(exc, "returncode", None),
+            error=str(exc)[:2000], finished_at=timezone.now(), updated_at=timezone.now(),
+        )
+        raise
+    tracker.stages().update(
+        status=ProcessingStage.Status.FINISHED, percent=100, exit_code=0,
+        finished_at=timezone.now(), updated_at=timezone.now(),
+    )
+
+
+def start_stage(movie_id, name):
+    """
+    Marks a stage that is worked on by several jobs (e.g. "chunks") as running.
+    """
+    ProcessingStage.objects.update_or_create(
+        movie_id=movie_id, name=name,
+        defaults={"status": ProcessingStage.Status.RUNNING, "percent": 0, "started_at": timezone.now()},
+    )
+
+
+def advance_stage(movie_id, name, percent):
+    """
+    Adds `percent` to a shared stage (atomically, jobs run in parallel) and
+    marks it finished once it reaches 100, also if a job failed on the way
+    and its retry completed the stage.
+    """
+    stages = ProcessingStage.objects.filter(movie_id=movie_id, name=name)
+    stages.update(percent=F("percent") + percent, updated_at=timezone.now())
+    stages.filter(percent__gte=99.9).exclude(status=ProcessingStage.Status.FINISHED).update(
+        status=ProcessingStage.Status.FINISHED, percent=100, exit_code=0, finished_at=timezone.now(),
+    )
+
+
+def stage_finished(movie_id, name):
+    """
+    True if the stage finished since the pipeline last started. The stages
+    are reset for every new source, so the outputs of a finished stage
+    always belong to the current source.
+    """
+    return ProcessingStage.objects.filter(
+        movie_id=movie_id, name=name, status=ProcessingStage.Status.FINISHED,
+    ).exists()
+
+
+def fail_stage(movie_id, name, exc):
+    ProcessingStage.objects.filter(movie_id=movie_id, name=name).update(
+        status=ProcessingStage.Status.FAILED, exit_code=getattr(exc, "returncode", None),
+        error=str(exc)[:2000], finished_at=timezone.now(),
+    )
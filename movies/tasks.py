@@ -1,8 +1,121 @@
+import django_rq
 import os
-from movies.utils.video import convert_video_to_resolution, generate_thumbnail, get_video_duration, cut_video_for_trailer
-from movies.models import Movie
+import shutil
+import subprocess
+import uuid
+from datetime import timedelta
+from movies.utils.video import (
+    convert_video_to_resolution, convert_video_to_resolutions, extract_frame_previews, write_sprite_vtt,
+    get_video_duration, probe_media,
+    cut_video_for_trailer, is_web_compatible, package_hls, package_dash, rendition_target_path,
+    split_video_into_chunks, encode_video_chunk, concat_video_chunks, measure_complexity, per_title_ladder,
+    list_chunks, chunk_target_path, RESOLUTIONS,
+)
+from movies.utils.images import write_image_variants
+from movies.utils.dedup import link_media_file, link_media_tree
+from movies.models import Movie, MediaMetadata
+from movies.stages import track_stage, start_stage, advance_stage, fail_stage, stage_finished
 from django.conf import settings
 from django.core.files import File
+from django.db import transaction
+from rq import Retry
+
+
+#  Every task is idempotent: a stage that already finished for the current source and whose
+#    output file is still there is skipped, so a retried or resumed job only redoes missing work.
+#    Database writes after a skip are repeated, they only store the same values again.
+def job_retry():
+    """
+    RQ retry policy of the processing jobs: one retry per entry of
+    VIDEO_JOB_RETRY_INTERVALS, waiting that many seconds first
+    (exponential backoff). Retries are scheduled, so the workers of every
+    queue need --with-scheduler.
+    """
+    return Retry(max=len(settings.VIDEO_JOB_RETRY_INTERVALS), interval=settings.VIDEO_JOB_RETRY_INTERVALS)
+
+
+def output_exists(path):
+    """
+    True if path is a non-empty file.
+    """
+    return bool(path) and os.path.isfile(path) and os.path.getsize(path) > 0
+
+
+def stage_done(movie_id, name, path):
+    """
+    True if the stage finished for the current source and its output is still valid.
+    """
+    return output_exists(path) and stage_finished(movie_id, name)
+
+
+def save_encoding_ladder(movie_id, source_path, resolutions):
+    """
+    Runs the complexity probe on the source and stores the per-title
+    CRF/maxrate ladder in the Movie model's encoding_ladder field.
+    If the probe fails the rungs are encoded with their plain profiles,
+    so the conversions that depend on this job still run.
+    """
+    try:
+        movie = Movie.objects.get(id=movie_id)
+    except Movie.DoesNotExist:
+        raise
+
+    if movie.encoding_ladder and stage_finished(movie_id, "analyze"):
+        return
+    try:
+        with track_stage(movie_id, "analyze"):
+            ladder = per_title_ladder(measure_complexity(source_path), resolutions)
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return
+    movie.encoding_ladder = ladder
+    movie.save(update_fields=["encoding_ladder"])
+
+
+def rung_encodings(movie):
+    """
+    Returns the movie's per-title encoder overrides as {resolution: {...}}.
+    """
+    return {int(resolution): encoding for resolution, encoding in movie.encoding_ladder.get("rungs", {}).items()}
+
+
+def save_media_metadata(movie_id, name, metadata):
+    """
+    Stores the result of probe_media as the movie's MediaMetadata `name`
+    ("source" or a rung like "720p"). The source's duration is also
+    saved, rounded to whole seconds, in the Movie model's duration field.
+    """
+    fields = {field.name for field in MediaMetadata._meta.concrete_fields} - {"id", "movie", "name", "probed_at"}
+    MediaMetadata.objects.update_or_create(
+        movie_id=movie_id, name=name,
+        defaults={key: value for key, value in metadata.items() if key in fields},
+    )
+    if name == "source":
+        Movie.objects.filter(id=movie_id).update(duration=round(metadata["duration_ms"] / 1000))
+
+
+def save_rendition_metadata(movie_id, target_paths):
+    """
+    Probes the given renditions ({resolution: path}) once each, stores
+    their MediaMetadata and merges their average and peak video bitrate
+    into the Movie model's rendition_bitrates field. The row is locked, as
+    the rungs of one movie may finish in parallel jobs. A rendition that
+    can't be probed is skipped.
+    """
+    measured = {}
+    for resolution, target_path in target_paths.items():
+        try:
+            metadata = probe_media(target_path, packets=True)
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            continue
+        save_media_metadata(movie_id, f"{resolution}p", metadata)
+        if "peak_bitrate" in metadata:
+            measured[str(resolution)] = {"average": metadata["video_bitrate"], "peak": metadata["peak_bitrate"]}
+    if not measured:
+        return
+    with transaction.atomic():
+        movie = Movie.objects.select_for_update().get(id=movie_id)
+        movie.rendition_bitrates = {**movie.rendition_bitrates, **measured}
+        movie.save(update_fields=["rendition_bitrates"])
 
 
 def save_converted_resolution(source_path, movie_id, resolution):
@@ -10,14 +123,19 @@ def save_converted_resolution(source_path, movie_id, resolution):
     Converts a video to the specified resolution and saves the path
     in the corresponding field of the Movie model.
     """
-    target_path = convert_video_to_resolution(source_path, resolution)
-    relative_path = os.path.relpath(target_path, settings.MEDIA_ROOT)
-
     try:
         movie = Movie.objects.get(id=movie_id)
     except Movie.DoesNotExist:
         raise
 
+    target_path = rendition_target_path(source_path, resolution)
+    converted = not stage_done(movie_id, f"{resolution}p", target_path)
+    if converted:
+        encoding = rung_encodings(movie).get(resolution)
+        with track_stage(movie_id, f"{resolution}p") as stage:
+            target_path = convert_video_to_resolution(source_path, resolution, on_progress=stage.progress, encoding=encoding)
+    relative_path = os.path.relpath(target_path, settings.MEDIA_ROOT)
+
     field_map = {
         120: 'video_120p',
         360: 'video_360p',
@@ -28,12 +146,251 @@ def save_converted_resolution(source_path, movie_id, resolution):
     if field_name:
         setattr(movie, field_name, relative_path)
         movie.save(update_fields=[field_name])
+    if converted or str(resolution) not in movie.rendition_bitrates:
+        save_rendition_metadata(movie_id, {resolution: target_path})
+
+
+def save_converted_resolutions(source_path, movie_id, resolutions):
+    """
+    Converts a video to all given resolutions in one ffmpeg process
+    (single decode) and saves every path in its Movie field at once.
+    Rungs that are already done are left out of the encode.
+    """
+    try:
+        movie = Movie.objects.get(id=movie_id)
+    except Movie.DoesNotExist:
+        raise
+
+    target_paths = {resolution: rendition_target_path(source_path, resolution) for resolution in resolutions}
+    pending = [
+        resolution for resolution in resolutions
+        if not stage_done(movie_id, f"{resolution}p", target_paths[resolution])
+    ]
+    if pending:
+        with track_stage(movie_id, *(f"{resolution}p" for resolution in pending)) as stage:
+            converted = convert_video_to_resolutions(
+                source_path, pending, on_progress=stage.progress, encodings=rung_encodings(movie),
+            )
+        target_paths.update(converted)
+
+    field_names = []
+    for resolution, target_path in target_paths.items():
+        field_name = f"video_{resolution}p"
+        setattr(movie, field_name, os.path.relpath(target_path, settings.MEDIA_ROOT))
+        field_names.append(field_name)
+    movie.save(update_fields=field_names)
+    save_rendition_metadata(movie_id, {
+        resolution: target_path for resolution, target_path in target_paths.items()
+        if resolution in pending or str(resolution) not in movie.rendition_bitrates
+    })
+
+
+def get_chunk_dir(movie_id):
+    """
+    Returns the working folder MEDIA_ROOT/chunks/<movie id> of chunked encoding.
+    """
+    return os.path.join(settings.MEDIA_ROOT, "chunks", str(movie_id))
+
+
+def save_chunked_renditions(source_path, movie_id, resolutions, wait_for=()):
+    """
+    Splits the source at keyframes into chunks and enqueues one encode job
+    per chunk, so any number of workers encode the movie in parallel.
+    A concat job joins the chunks per resolution; HLS/DASH packaging and
+    finalize_conversion follow it. finalize_conversion also waits for the
+    job ids in wait_for (jobs that still read the source).
+    The chunks of a finished split are reused.
+    """
+    try:
+        movie = Movie.objects.get(id=movie_id)
+    except Movie.DoesNotExist:
+        raise
+
+    chunk_dir = get_chunk_dir(movie_id)
+    chunk_paths = list_chunks(chunk_dir) if os.path.isdir(chunk_dir) and stage_finished(movie_id, "split") else []
+    if not chunk_paths:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        with track_stage(movie_id, "split"):
+            chunk_paths = split_video_into_chunks(source_path, chunk_dir, settings.VIDEO_CHUNK_DURATION)
+    if not stage_finished(movie_id, "chunks"):
+        start_stage(movie_id, "chunks")
+
+    encode_queue = django_rq.get_queue('encode')
+    maintenance_queue = django_rq.get_queue('maintenance')
+    chunk_jobs = [
+        encode_queue.enqueue(encode_chunk, chunk_path, resolutions, movie_id=movie_id, total=len(chunk_paths),
+                             encodings=rung_encodings(movie), job_timeout=settings.VIDEO_CHUNK_JOB_TIMEOUT,
+                             retry=job_retry())
+        for chunk_path in chunk_paths
+    ]
+    concat_job = encode_queue.enqueue(
+        save_concatenated_renditions, source_path, movie_id, chunk_paths, resolutions, depends_on=chunk_jobs,
+        retry=job_retry(),
+    )
+    hls_job = maintenance_queue.enqueue(save_hls_package, movie_id, depends_on=[concat_job], retry=job_retry())
+    dash_job = maintenance_queue.enqueue(save_dash_package, movie_id, depends_on=[concat_job], retry=job_retry())
+    maintenance_queue.enqueue(finalize_conversion, source_path, movie_id, depends_on=[concat_job, hls_job, dash_job, *wait_for],
+                              retry=job_retry())
+
+
+def encode_chunk(chunk_path, resolutions, movie_id=None, total=1, encodings=None):
+    """
+    Encodes one chunk of the source into every resolution and advances
+    the movie's shared "chunks" stage by its share of the total. A chunk
+    whose encoded files all exist was done before and is skipped; it still
+    counts, as start_stage reset the stage when the chunks were enqueued again.
+    """
+    target_paths = {resolution: chunk_target_path(chunk_path, resolution) for resolution in resolutions}
+    if not all(output_exists(target_path) for target_path in target_paths.values()):
+        try:
+            target_paths = encode_video_chunk(chunk_path, resolutions, encodings)
+        except Exception as exc:
+            if movie_id is not None:
+                fail_stage(movie_id, "chunks", exc)
+            raise
+    if movie_id is not None:
+        advance_stage(movie_id, "chunks", 100 / total)
+    return target_paths
+
+
+def save_concatenated_renditions(source_path, movie_id, chunk_paths, resolutions):
+    """
+    Concatenates the encoded chunks of every resolution into one MP4 rendition
+    with the source audio, saves the paths in the Movie model and removes
+    the chunk folder.
+    """
+    try:
+        movie = Movie.objects.get(id=movie_id)
+    except Movie.DoesNotExist:
+        raise
+
+    field_names = []
+    target_paths = {}
+    for resolution in sorted(resolutions):
+        target_path = rendition_target_path(source_path, resolution)
+        if not stage_done(movie_id, f"{resolution}p", target_path):
+            encoded_chunks = [chunk_target_path(chunk_path, resolution) for chunk_path in chunk_paths]
+            with track_stage(movie_id, f"{resolution}p"):
+                target_path = concat_video_chunks(encoded_chunks, source_path, target_path)
+            target_paths[resolution] = target_path
+        field_name = f"video_{resolution}p"
+        setattr(movie, field_name, os.path.relpath(target_path, settings.MEDIA_ROOT))
+        field_names.append(field_name)
+    movie.save(update_fields=field_names)
+    shutil.rmtree(get_chunk_dir(movie_id), ignore_errors=True)
+    save_rendition_metadata(movie_id, target_paths)
+
+
+def clear_stale_renditions(movie, resolutions):
+    """
+    Empties the video_<res>p fields of the rungs outside `resolutions`
+    (left over from a previous, taller source), deletes their files and
+    drops their measured bitrates. Changes the instance only; returns the
+    names of the fields to save.
+    """
+    field_names = []
+    for resolution in RESOLUTIONS:
+        field_name = f"video_{resolution}p"
+        file_field = getattr(movie, field_name)
+        if resolution in resolutions or not file_field:
+            continue
+        path = file_field.path
+        if os.path.isfile(path):
+            os.remove(path)
+        setattr(movie, field_name, None)
+        field_names.append(field_name)
+    planned = {str(resolution) for resolution in resolutions}
+    if set(movie.rendition_bitrates) - planned:
+        movie.rendition_bitrates = {
+            resolution: bitrates for resolution, bitrates in movie.rendition_bitrates.items() if resolution in planned
+        }
+        field_names.append("rendition_bitrates")
+    return field_names
+
+
+def outputs_complete(movie):
+    """
+    True if every planned rendition and both streaming packages of the
+    movie exist on disk.
+    """
+    if not movie.available_resolutions or not movie.hls_playlist or not movie.dash_manifest:
+        return False
+    files = [getattr(movie, f"video_{resolution}p") for resolution in movie.available_resolutions]
+    return all(files) and all(output_exists(file.path) for file in [*files, movie.hls_playlist, movie.dash_manifest])
+
+
+def save_reused_renditions(movie_id, donor_id, source_path):
+    """
+    Gives the movie the outputs of a completed movie with the same source
+    content (donor) instead of encoding: renditions and the HLS/DASH
+    packages are hard-linked under the movie's own names and the measured
+    metadata is copied. No ffmpeg runs. Thumbnail, seek previews and
+    trailer are not taken over, their fast jobs run for every source.
+    A movie that is its own donor (same content uploaded again) keeps its outputs.
+    """
+    try:
+        movie = Movie.objects.get(id=movie_id)
+        donor = Movie.objects.get(id=donor_id)
+    except Movie.DoesNotExist:
+        raise
+
+    if stage_finished(movie_id, "reuse"):
+        return
+    with track_stage(movie_id, "reuse"):
+        if movie.id == donor.id:
+            return
+        #  The movie's own previous renditions and packages are replaced, not kept next to the links.
+        field_names = [*clear_stale_renditions(movie, []), "hls_playlist", "dash_manifest"]
+        previous_packages = [file.path for file in (movie.hls_playlist, movie.dash_manifest) if file]
+        for field_name in ("available_resolutions", "duration", "encoding_ladder", "rendition_bitrates"):
+            setattr(movie, field_name, getattr(donor, field_name))
+            field_names.append(field_name)
+        for resolution in donor.available_resolutions:
+            field_name = f"video_{resolution}p"
+            target_name = os.path.relpath(rendition_target_path(source_path, resolution), settings.MEDIA_ROOT)
+            setattr(movie, field_name, link_media_file(getattr(donor, field_name).path, target_name))
+            field_names.append(field_name)
+        hls_dir = os.path.join(settings.MEDIA_ROOT, "hls", str(movie.id), uuid.uuid4().hex[:12])
+        link_media_tree(os.path.dirname(donor.hls_playlist.path), hls_dir)
+        movie.hls_playlist = os.path.relpath(os.path.join(hls_dir, "master.m3u8"), settings.MEDIA_ROOT)
+        dash_dir = os.path.join(settings.MEDIA_ROOT, "dash", str(movie.id), uuid.uuid4().hex[:12])
+        link_media_tree(os.path.dirname(donor.dash_manifest.path), dash_dir)
+        movie.dash_manifest = os.path.relpath(os.path.join(dash_dir, "manifest.mpd"), settings.MEDIA_ROOT)
+        movie.save(update_fields=list(dict.fromkeys(field_names)))
+        for path in previous_packages:
+            schedule_package_removal(os.path.dirname(path))
+
+        copies = list(donor.media.exclude(name="source"))
+        for metadata in copies:
+            metadata.pk, metadata.movie_id = None, movie.id
+        MediaMetadata.objects.filter(movie_id=movie.id).exclude(name="source").delete()
+        MediaMetadata.objects.bulk_create(copies)
+
+
+def source_duration(movie_id, source_path):
+    #  Duration of the source in seconds, from its MediaMetadata or else from ffprobe.
+    source = MediaMetadata.objects.filter(movie_id=movie_id, name="source").first()
+    if source and source.duration_ms:
+        return source.duration_ms / 1000
+    return get_video_duration(source_path)
+
+
+def thumbnail_variant_dir(movie):
+    #  Absolute folder thumbnails/<movie id>/<version>/ of the movie's thumbnail variants, or None.
+    for sizes in movie.thumbnail_variants.values():
+        for name in sizes.values():
+            return os.path.dirname(os.path.join(settings.MEDIA_ROOT, name))
+    return None
 
 
 def save_thumbnail(movie_id, source_path):
     """
-    Generates a thumbnail from the video and saves the path
-    in the Movie model's thumbnail field.
+    Extracts the poster thumbnail and the seek-preview sprite sheets with
+    their WebVTT index in one ffmpeg pass and saves them in the Movie
+    model's thumbnail and seek_previews fields. The poster is then scaled
+    to THUMBNAIL_WIDTHS in every THUMBNAIL_FORMATS format (thumbnail_variants).
+    Sprites and variants go to new folders previews/<movie id>/<version>/
+    and thumbnails/<movie id>/<version>/; the previous ones are removed.
     """
     try:
         movie = Movie.objects.get(id=movie_id)
@@ -44,12 +401,64 @@ def save_thumbnail(movie_id, source_path):
     os.makedirs(thumb_folder, exist_ok=True)
     thumb_path = os.path.join(thumb_folder, f"{movie.title}_thumb.webp")
 
-    generate_thumbnail(source_path, thumb_path)
+    previews_done = bool(movie.seek_previews) and output_exists(movie.seek_previews.path)
+    if not (previews_done and stage_done(movie_id, "thumbnail", thumb_path)):
+        previous = movie.seek_previews.path if movie.seek_previews else None
+        previous_variants = thumbnail_variant_dir(movie)
+        version = uuid.uuid4().hex[:12]
+        output_dir = os.path.join(settings.MEDIA_ROOT, "previews", str(movie.id), version)
+        variant_dir = os.path.join(settings.MEDIA_ROOT, "thumbnails", str(movie.id), version)
+        try:
+            with track_stage(movie_id, "thumbnail"):
+                duration = source_duration(movie_id, source_path)
+                sprite_paths = extract_frame_previews(
+                    source_path, thumb_path, output_dir, poster_time=min(5, duration / 2),
+                    interval=settings.VIDEO_PREVIEW_INTERVAL, tile_width=settings.VIDEO_PREVIEW_TILE_WIDTH,
+                    grid=settings.VIDEO_PREVIEW_GRID, poster_width=settings.VIDEO_POSTER_WIDTH,
+                )
+                vtt_path = write_sprite_vtt(
+                    os.path.join(output_dir, "thumbnails.vtt"), sprite_paths, duration,
+                    interval=settings.VIDEO_PREVIEW_INTERVAL, grid=settings.VIDEO_PREVIEW_GRID,
+                )
+                variants = write_image_variants(
+                    thumb_path, variant_dir, settings.THUMBNAIL_WIDTHS, settings.THUMBNAIL_FORMATS,
+                )
+        except Exception:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            shutil.rmtree(variant_dir, ignore_errors=True)
+            raise
+        movie.seek_previews = os.path.relpath(vtt_path, settings.MEDIA_ROOT)
+        movie.thumbnail_variants = {
+            name: {str(width): os.path.relpath(path, settings.MEDIA_ROOT) for width, path in sizes.items()}
+            for name, sizes in variants.items()
+        }
+        if previous and os.path.dirname(previous) != output_dir:
+            shutil.rmtree(os.path.dirname(previous), ignore_errors=True)
+        if previous_variants and previous_variants != variant_dir:
+            shutil.rmtree(previous_variants, ignore_errors=True)
 
     relative_thumb_path = os.path.relpath(thumb_path, settings.MEDIA_ROOT)
     setattr(movie, "thumbnail", relative_thumb_path)
     print(f"Thumbnail saved at: {relative_thumb_path}")
-    movie.save(update_fields=["thumbnail"])
+    movie.save(update_fields=["thumbnail", "seek_previews", "thumbnail_variants"])
+
+
+def trailer_options(movie_id, duration=7):
+    """
+    Start and cut mode of the trailer, from the source's MediaMetadata:
+    - start: VIDEO_TRAILER_START, moved back for sources too short for it.
+    - copy: stream copy if VIDEO_TRAILER_MODE is "copy" and the source's
+      codecs are web-compatible. Unprobed sources are re-encoded.
+    """
+    source = MediaMetadata.objects.filter(movie_id=movie_id, name="source").first()
+    start = settings.VIDEO_TRAILER_START
+    if source and source.duration_ms:
+        start = max(min(start, source.duration_ms / 1000 - duration), 0)
+    copy = (
+        settings.VIDEO_TRAILER_MODE == "copy" and source is not None
+        and is_web_compatible(source.video_codec, source.audio_tracks)
+    )
+    return {"duration": duration, "start": start, "copy": copy}
 
 
 def save_trailer(movie_id, source_path):
@@ -66,7 +475,9 @@ def save_trailer(movie_id, source_path):
     os.makedirs(trailer_folder, exist_ok=True)
     trailer_path = os.path.join(trailer_folder, f"{movie.title}_trailer.mp4")
 
-    cut_video_for_trailer(source_path, trailer_path)
+    if not stage_done(movie_id, "trailer", trailer_path):
+        with track_stage(movie_id, "trailer"):
+            cut_video_for_trailer(source_path, trailer_path, **trailer_options(movie_id))
 
     relative_trailer_path = os.path.relpath(trailer_path, settings.MEDIA_ROOT)
     setattr(movie, "trailer", relative_trailer_path)
@@ -74,33 +485,117 @@ def save_trailer(movie_id, source_path):
     movie.save(update_fields=["trailer"])
 
 
-def save_video_duration(movie_id, source_path):
+def get_rendition_paths(movie):
+    """
+    Returns {resolution: absolute path} of the movie's converted MP4
+    renditions, limited to the rungs planned for the current source.
+    """
+    rendition_paths = {}
+    for resolution in movie.available_resolutions:
+        field = getattr(movie, f"video_{resolution}p")
+        if field:
+            rendition_paths[resolution] = field.path
+    return rendition_paths
+
+
+def remove_package_version(version_dir):
+    """
+    Deletes a replaced HLS/DASH version folder.
+    """
+    shutil.rmtree(version_dir, ignore_errors=True)
+
+
+def schedule_package_removal(version_dir):
     """
-    Retrieves the duration of the video and saves it
-    in the Movie model's duration field.
+    Removes a replaced HLS/DASH version folder after PACKAGE_GRACE_PERIOD
+    seconds (a scheduled maintenance job), so players that loaded its
+    playlist or manifest before the switch can keep fetching segments.
+    Without a grace period the folder is removed right away.
+    """
+    if settings.PACKAGE_GRACE_PERIOD <= 0:
+        remove_package_version(version_dir)
+        return
+    django_rq.get_queue('maintenance').enqueue_in(
+        timedelta(seconds=settings.PACKAGE_GRACE_PERIOD), remove_package_version, version_dir,
+    )
+
+
+def save_hls_package(movie_id):
+    """
+    Packages the converted MP4 renditions as HLS (fMP4 segments per
+    rendition plus a master playlist) into a new folder
+    hls/<movie id>/<version>/ and saves the master playlist path in the
+    Movie model's hls_playlist field. The previous version is removed
+    after a grace period (schedule_package_removal), so every segment URL
+    always refers to the same bytes.
+    Without renditions the stage fails (and is retried) instead of
+    finishing without a package.
     """
     try:
         movie = Movie.objects.get(id=movie_id)
     except Movie.DoesNotExist:
         raise
 
-    duration = get_video_duration(source_path)
-    movie.duration = duration
-    movie.save(update_fields=["duration"])
+    if movie.hls_playlist and stage_done(movie_id, "hls", movie.hls_playlist.path):
+        return
+    with track_stage(movie_id, "hls"):
+        rendition_paths = get_rendition_paths(movie)
+        if not rendition_paths:
+            raise FileNotFoundError(f"No renditions to package for movie {movie_id}")
+        previous = movie.hls_playlist.path if movie.hls_playlist else None
+        output_dir = os.path.join(settings.MEDIA_ROOT, "hls", str(movie.id), uuid.uuid4().hex[:12])
+        master_path = package_hls(rendition_paths, output_dir, segment_duration=settings.HLS_SEGMENT_DURATION)
+
+    movie.hls_playlist = os.path.relpath(master_path, settings.MEDIA_ROOT)
+    movie.save(update_fields=["hls_playlist"])
+    if previous:
+        schedule_package_removal(os.path.dirname(previous))
+
+
+def save_dash_package(movie_id):
+    """
+    Packages the converted MP4 renditions as MPEG-DASH into a new folder
+    dash/<movie id>/<version>/ and saves the manifest path in the Movie
+    model's dash_manifest field. The previous version is removed after a
+    grace period like in save_hls_package, so every segment URL always
+    refers to the same bytes. Fails like
+    save_hls_package without renditions.
+    """
+    try:
+        movie = Movie.objects.get(id=movie_id)
+    except Movie.DoesNotExist:
+        raise
+
+    if movie.dash_manifest and stage_done(movie_id, "dash", movie.dash_manifest.path):
+        return
+    with track_stage(movie_id, "dash"):
+        rendition_paths = get_rendition_paths(movie)
+        if not rendition_paths:
+            raise FileNotFoundError(f"No renditions to package for movie {movie_id}")
+        previous = movie.dash_manifest.path if movie.dash_manifest else None
+        output_dir = os.path.join(settings.MEDIA_ROOT, "dash", str(movie.id), uuid.uuid4().hex[:12])
+        manifest_path = package_dash(rendition_paths, output_dir, segment_duration=settings.HLS_SEGMENT_DURATION)
+
+    movie.dash_manifest = os.path.relpath(manifest_path, settings.MEDIA_ROOT)
+    movie.save(update_fields=["dash_manifest"])
+    if previous:
+        schedule_package_removal(os.path.dirname(previous))
 
 
 def finalize_conversion(path, movie_id):
     """
     Deletes the original uploaded video file and resets the video_file field
     after processing is complete. Also removes the physical file if it still exists.
+    Running it again after it finished changes nothing.
     """
     from movies.models import Movie
     movie = Movie.objects.get(id=movie_id)
-    if movie.video_file:
-        movie.video_file.delete(save=False)
+    with track_stage(movie_id, "finalize"):
+        if movie.video_file:
+            movie.video_file.delete(save=False)
 
-    if os.path.exists(path):
-        os.remove(path)
+        if os.path.exists(path):
+            os.remove(path)
 
-    movie.video_file = None
-    movie.save(update_fields=["video_file"])
+        movie.video_file = None
+        movie.save(update_fields=["video_file"])
@@ -0,0 +1,45 @@
+import math
+import subprocess
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from movies.management.commands import benchmark_encoders, benchmark_transcode
+from movies.utils.benchmark import encode_rung, measure, measure_quality, parse_quality
+
+
+class BenchmarkHelpersTests(SimpleTestCase):
+    def test_parse_quality_reads_ssim_and_psnr(self):
+        log = (
+            "[Parsed_ssim_4 @ 0x1] SSIM Y:0.98 U:0.99 V:0.99 All:0.985123 (18.3)\n"
+            "[Parsed_psnr_5 @ 0x2] PSNR y:41.2 u:45.0 v:45.1 average:42.37 min:38.0 max:50.1\n"
+        )
+        self.assertEqual(parse_quality(log), (0.985123, "42.37"))
+        ssim, psnr = parse_quality("")
+        self.assertTrue(math.isnan(ssim))
+        self.assertEqual(psnr, "?")
+
+    def test_measure_times_the_call(self):
+        calls = []
+        wall, cpu = measure(lambda: calls.append(1))
+        self.assertEqual(calls, [1])
+        self.assertGreaterEqual(wall, 0)
+        self.assertGreaterEqual(cpu, 0)
+
+    def test_encode_and_quality_use_the_rung_filter(self):
+        commands = []
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, stderr="SSIM All:0.9 PSNR average:inf")
+        with mock.patch("movies.utils.benchmark.subprocess.run", fake_run):
+            encode_rung("in.mp4", "out.mp4", 720, "fast")
+            self.assertEqual(measure_quality("out.mp4", "in.mp4", 720), (0.9, "inf"))
+        self.assertEqual(commands[0][-1], "out.mp4")
+        self.assertIn("-an", commands[0])
+        self.assertIn("scale=", commands[1][commands[1].index("-lavfi") + 1])
+
+    def test_both_commands_take_the_source_options(self):
+        for module in (benchmark_transcode, benchmark_encoders):
+            parser = module.Command().create_parser("manage.py", "benchmark")
+            options = parser.parse_args(["--source", "clip.mp4", "--duration", "5"])
+            self.assertEqual((options.source, options.duration, options.size), ("clip.mp4", 5, "1920x1080"))
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import time
+from django.test import SimpleTestCase
+from movies.utils.file_cache import MediaFileCache
+
+
+class MediaFileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir.name, f"video_{i}.mp4")
+            with open(path, "wb") as f:
+                f.write(b"0123456789"[: i + 5])
+            self.paths.append(path)
+        self.cache = MediaFileCache(maxsize=2, ttl=60)
+
+    def tearDown(self):
+        self.cache.clear()
+        self.tmpdir.cleanup()
+
+    def test_second_open_is_a_hit_and_reuses_descriptor(self):
+        f, stat = self.cache.open(self.paths[0])
+        fd = f.fileno()
+        self.assertEqual(stat.st_size, 5)
+        f.close()
+        f2, _ = self.cache.open(self.paths[0])
+        self.assertEqual(f2.fileno(), fd)
+        f2.close()
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_concurrent_opens_get_separate_descriptors(self):
+        f1, _ = self.cache.open(self.paths[0])
+        f2, _ = self.cache.open(self.paths[0])
+        self.assertNotEqual(f1.fileno(), f2.fileno())
+        f1.seek(3)
+        self.assertEqual(f2.read(2), b"01")
+        f1.close()
+        f2.close()
+
+    def test_lru_eviction(self):
+        for path in self.paths:
+            f, _ = self.cache.open(path)
+            f.close()
+        stats = self.cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        f, _ = self.cache.open(self.paths[0])
+        f.close()
+        self.assertEqual(self.cache.stats()["misses"], 4)
+
+    def test_invalidate_picks_up_rewritten_file(self):
+        f, stat = self.cache.open(self.paths[0])
+        f.close()
+        with open(self.paths[0], "wb") as out:
+            out.write(b"rewritten content")
+        self.cache.invalidate(self.paths[0])
+        f, stat = self.cache.open(self.paths[0])
+        self.assertEqual(stat.st_size, len(b"rewritten content"))
+        self.assertEqual(f.read(), b"rewritten content")
+        f.close()
+
+    def test_new_descriptor_of_a_replaced_file_gets_its_own_stat(self):
+        f1, stat = self.cache.open(self.paths[0])
+        self.assertEqual(stat.st_size, 5)
+        replacement = os.path.join(self.tmpdir.name, "replacement.mp4")
+        with open(replacement, "wb") as out:
+            out.write(b"rewritten content")
+        os.replace(replacement, self.paths[0])
+        f2, stat = self.cache.open(self.paths[0])
+        self.assertEqual(stat.st_size, len(b"rewritten content"))
+        self.assertEqual(f2.read(), b"rewritten content")
+        f1.close()
+        f2.close()
+        self.assertEqual(self.cache.stats()["idle_fds"], 1)
+
+    def test_descriptor_in_use_is_closed_after_invalidate(self):
+        f, _ = self.cache.open(self.paths[0])
+        self.cache.invalidate(self.paths[0])
+        f.close()
+        self.assertEqual(self.cache.stats()["idle_fds"], 0)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = MediaFileCache(maxsize=2, ttl=0.01)
+        f, _ = cache.open(self.paths[0])
+        f.close()
+        time.sleep(0.02)
+        f, _ = cache.open(self.paths[0])
+        f.close()
+        self.assertEqual(cache.stats()["misses"], 2)
+        cache.clear()
+
+    def test_disabled_cache_opens_plain_files(self):
+        cache = MediaFileCache(maxsize=0)
+        f, stat = cache.open(self.paths[1])
+        self.assertEqual(f.read(), b"012345")
+        f.close()
+        self.assertEqual(cache.stats()["entries"], 0)
@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+from django.test import SimpleTestCase
+from PIL import Image
+from movies.utils.images import plan_widths, supported_formats, write_image_variants
+
+
+class ImageVariantTests(SimpleTestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.poster = os.path.join(self.folder, "poster.webp")
+        Image.new("RGB", (800, 450), "red").save(self.poster)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_plan_widths_never_upscales(self):
+        self.assertEqual(plan_widths(800, [1280, 320, 640]), [320, 640])
+        self.assertEqual(plan_widths(200, [320, 640]), [200])
+
+    def test_supported_formats_skips_formats_pillow_cannot_write(self):
+        self.assertEqual(supported_formats(["webp", "nosuchformat"]), ["webp"])
+
+    def test_write_image_variants_scales_every_width_and_format(self):
+        variants = write_image_variants(self.poster, os.path.join(self.folder, "out"), [320, 640, 1280], ["webp"])
+        self.assertEqual(sorted(variants["webp"]), [320, 640])
+        with Image.open(variants["webp"][320]) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (320, 180)))
+        self.assertTrue(variants["webp"][640].endswith("thumb_640.webp"))
@@ -1,3 +1,5 @@
+import importlib
+from django.apps import apps
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from movies.models import Movie, MovieProgress
@@ -17,6 +19,14 @@ class MovieModelTest(TestCase):
         # created_at ist in der Vergangenheit (nahe jetzt)
         self.assertTrue(timezone.now() >= m.created_at)
 
+    def test_backfill_plans_the_existing_renditions(self):
+        migration = importlib.import_module("movies.migrations.0020_backfill_available_resolutions")
+        old = Movie.objects.create(title="Old", video_120p="videos/old_120p.mp4", video_720p="videos/old_720p.mp4")
+        planned = Movie.objects.create(title="Planned", video_360p="videos/p_360p.mp4", available_resolutions=[120, 360])
+        migration.backfill_available_resolutions(apps, None)
+        self.assertEqual(Movie.objects.get(pk=old.pk).available_resolutions, [120, 720])
+        self.assertEqual(Movie.objects.get(pk=planned.pk).available_resolutions, [120, 360])
+
 class MovieProgressModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(email="u@example.com", password="pass")
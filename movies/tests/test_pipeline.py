@@ -0,0 +1,371 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import hashlib
+from movies.models import Movie, ProcessingStage, Upload
+from movies.pipeline import wait_for_upload, start_processing, deduplicate_source, find_stalled_movies, resume_processing, source_sha256
+from movies.tasks import save_reused_renditions, save_encoding_ladder, save_converted_resolution, save_converted_resolutions, save_chunked_renditions, save_thumbnail, save_trailer, save_hls_package, save_dash_package, finalize_conversion
+
+
+def probe(width, height):
+    return {"duration_ms": 61500, "video_codec": "h264", "width": width, "height": height, "frame_rate": 25.0,
+            "bitrate": 8000, "audio_tracks": [], "size": 61500000}
+
+
+def run_deduplication(queue):
+    #  Runs the deduplicate_source job start_processing enqueued, as a worker would.
+    call = next(c for c in queue.enqueue.call_args_list if c[0][0] == deduplicate_source)
+    deduplicate_source(*call[0][1:])
+
+
+class WaitForUploadTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'upload.mp4')
+        with open(self.path, 'wb') as f:
+            f.write(b'12345')
+        self.movie = Movie.objects.create(title='Upload')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @mock.patch('movies.pipeline.start_processing')
+    @mock.patch('django_rq.get_queue')
+    def test_reschedules_while_size_is_unknown(self, mock_get_queue, mock_start):
+        wait_for_upload(self.movie.pk, self.path)
+
+        mock_get_queue.return_value.enqueue.assert_not_called()
+        mock_get_queue.assert_called_once_with('fast')
+        call = mock_get_queue.return_value.enqueue_in.call_args
+        self.assertEqual(call[0][:4], (timedelta(seconds=3), wait_for_upload, self.movie.pk, self.path))
+        self.assertEqual(call[1]['last_size'], 5)
+        self.assertEqual(call[1]['stable_checks'], 0)
+        self.assertEqual(call[1]['waited'], 3)
+
+    @mock.patch('movies.pipeline.start_processing')
+    @mock.patch('django_rq.get_queue')
+    def test_starts_processing_once_size_is_stable(self, mock_get_queue, mock_start):
+        wait_for_upload(self.movie.pk, self.path, last_size=5, stable_checks=1, waited=6)
+
+        mock_start.assert_called_once_with(self.movie.pk, self.path)
+        mock_get_queue.return_value.enqueue_in.assert_not_called()
+
+    @mock.patch('movies.pipeline.start_processing')
+    @mock.patch('django_rq.get_queue')
+    def test_resets_stable_checks_when_file_grows(self, mock_get_queue, mock_start):
+        wait_for_upload(self.movie.pk, self.path, last_size=3, stable_checks=1, waited=6)
+
+        mock_get_queue.return_value.enqueue.assert_not_called()
+        self.assertEqual(mock_get_queue.return_value.enqueue_in.call_args[1]['stable_checks'], 0)
+
+    @mock.patch('movies.pipeline.start_processing')
+    @mock.patch('django_rq.get_queue')
+    def test_gives_up_after_max_wait(self, mock_get_queue, mock_start):
+        wait_for_upload(self.movie.pk, os.path.join(self.tmp_dir, 'missing.mp4'), waited=1797)
+
+        mock_get_queue.return_value.enqueue.assert_not_called()
+        mock_get_queue.return_value.enqueue_in.assert_not_called()
+
+    @mock.patch('movies.pipeline.start_processing')
+    @mock.patch('django_rq.get_queue')
+    def test_stops_when_movie_was_deleted(self, mock_get_queue, mock_start):
+        movie_id = self.movie.pk
+        self.movie.delete()
+        wait_for_upload(movie_id, self.path)
+
+        mock_get_queue.return_value.enqueue.assert_not_called()
+        mock_get_queue.return_value.enqueue_in.assert_not_called()
+
+
+class StartProcessingTests(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Test Movie')
+        self.path = '/uploads/test.mp4'
+
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1920, 1080))
+    @mock.patch('django_rq.get_queue')
+    def test_enqueues_all_tasks(self, mock_get_queue, mock_dimensions):
+        fake_queue = mock.Mock()
+        mock_get_queue.return_value = fake_queue
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(fake_queue)
+
+        expected_calls = [
+            mock.call(save_converted_resolution, self.path, self.movie.pk, res, depends_on=mock.ANY, retry=mock.ANY)
+            for res in [120, 360, 720, 1080]
+        ] + [
+            mock.call(save_thumbnail, self.movie.pk, self.path, retry=mock.ANY),
+            mock.call(save_trailer, self.movie.pk, self.path, retry=mock.ANY),
+            mock.call(save_encoding_ladder, self.movie.pk, self.path, [120, 360, 720, 1080], retry=mock.ANY),
+            mock.call(save_hls_package, self.movie.pk, depends_on=mock.ANY, retry=mock.ANY),
+            mock.call(save_dash_package, self.movie.pk, depends_on=mock.ANY, retry=mock.ANY),
+        ]
+        fake_queue.enqueue.assert_has_calls(expected_calls, any_order=True)
+
+        finalize_calls = [c for c in fake_queue.enqueue.call_args_list if c[0][0] == finalize_conversion]
+        self.assertEqual(len(finalize_calls), 1)
+
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1280, 720))
+    @mock.patch('django_rq.get_queue')
+    def test_routes_jobs_by_weight(self, mock_get_queue, mock_dimensions):
+        queues = {name: mock.Mock() for name in ('fast', 'encode', 'maintenance')}
+        mock_get_queue.side_effect = queues.__getitem__
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(queues['maintenance'])
+
+        routed = {
+            name: [c[0][0] for c in queue.enqueue.call_args_list]
+            for name, queue in queues.items()
+        }
+        self.assertEqual(routed['fast'], [save_thumbnail, save_trailer, save_encoding_ladder])
+        self.assertEqual(routed['encode'], [save_converted_resolution] * 3)
+        self.assertEqual(routed['maintenance'], [deduplicate_source, save_hls_package, save_dash_package, finalize_conversion])
+
+    @override_settings(VIDEO_TRANSCODE_MODE='ladder')
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1920, 1080))
+    @mock.patch('django_rq.get_queue')
+    def test_ladder_mode_enqueues_single_conversion(self, mock_get_queue, mock_dimensions):
+        fake_queue = mock.Mock()
+        mock_get_queue.return_value = fake_queue
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(fake_queue)
+
+        functions = [c[0][0] for c in fake_queue.enqueue.call_args_list]
+        self.assertNotIn(save_converted_resolution, functions)
+        fake_queue.enqueue.assert_any_call(save_converted_resolutions, self.path, self.movie.pk, [120, 360, 720, 1080],
+                                           depends_on=mock.ANY, retry=mock.ANY)
+
+    @override_settings(VIDEO_TRANSCODE_MODE='chunked')
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1920, 1080))
+    @mock.patch('django_rq.get_queue')
+    def test_chunked_mode_enqueues_split_job(self, mock_get_queue, mock_dimensions):
+        fake_queue = mock.Mock()
+        mock_get_queue.return_value = fake_queue
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(fake_queue)
+
+        functions = [c[0][0] for c in fake_queue.enqueue.call_args_list]
+        self.assertIn(save_chunked_renditions, functions)
+        self.assertNotIn(save_converted_resolution, functions)
+        self.assertNotIn(finalize_conversion, functions)
+        split_call = next(c for c in fake_queue.enqueue.call_args_list if c[0][0] == save_chunked_renditions)
+        self.assertEqual(len(split_call[0][4]), 2)
+
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(854, 480))
+    @mock.patch('django_rq.get_queue')
+    def test_skips_rungs_above_source(self, mock_get_queue, mock_dimensions):
+        fake_queue = mock.Mock()
+        mock_get_queue.return_value = fake_queue
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(fake_queue)
+
+        resolutions = [
+            c[0][3] for c in fake_queue.enqueue.call_args_list
+            if c[0][0] == save_converted_resolution
+        ]
+        self.assertEqual(resolutions, [120, 360])
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).available_resolutions, [120, 360])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(854, 480))
+    @mock.patch('django_rq.get_queue')
+    def test_clears_renditions_of_a_previous_taller_source(self, mock_get_queue, mock_dimensions):
+        self.addCleanup(shutil.rmtree, self.movie.video_360p.storage.location, True)
+        self.movie.available_resolutions = [120, 360, 720, 1080]
+        self.movie.rendition_bitrates = {"360": {"average": 800, "peak": 1200}, "1080": {"average": 5000, "peak": 8000}}
+        for resolution in (360, 720, 1080):
+            getattr(self.movie, f'video_{resolution}p').save(f'old_{resolution}p.mp4', ContentFile(b'old'), save=False)
+        self.movie.save()
+        stale_path = self.movie.video_1080p.path
+
+        start_processing(self.movie.pk, self.path)
+
+        movie = Movie.objects.get(pk=self.movie.pk)
+        self.assertEqual(movie.available_resolutions, [120, 360])
+        self.assertFalse(movie.video_720p)
+        self.assertFalse(movie.video_1080p)
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertTrue(os.path.exists(movie.video_360p.path))
+        self.assertEqual(list(movie.rendition_bitrates), ["360"])
+
+    @override_settings(VIDEO_TRANSCODE_MODE='chunked')
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1280, 720))
+    @mock.patch('django_rq.get_queue')
+    def test_records_queued_stages(self, mock_get_queue, mock_dimensions):
+        ProcessingStage.objects.create(movie=self.movie, name='old', status=ProcessingStage.Status.FAILED)
+        start_processing(self.movie.pk, self.path)
+        stages = list(self.movie.stages.values_list('name', 'status'))
+        self.assertEqual([name for name, _ in stages], [
+            'thumbnail', 'trailer', 'dedup', 'analyze', 'split', 'chunks', '120p', '360p', '720p', 'hls', 'dash', 'finalize',
+        ])
+        self.assertTrue(all(status == ProcessingStage.Status.QUEUED for _, status in stages))
+
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1280, 720))
+    @mock.patch('django_rq.get_queue')
+    def test_renditions_wait_for_complexity_probe(self, mock_get_queue, mock_dimensions):
+        queues = {name: mock.Mock() for name in ('fast', 'encode', 'maintenance')}
+        mock_get_queue.side_effect = queues.__getitem__
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(queues['maintenance'])
+
+        analysis_job = queues['fast'].enqueue.return_value
+        for call in queues['encode'].enqueue.call_args_list:
+            self.assertEqual(call[1]['depends_on'], [analysis_job])
+
+    @override_settings(VIDEO_PER_TITLE=False)
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1280, 720))
+    @mock.patch('django_rq.get_queue')
+    def test_per_title_can_be_disabled(self, mock_get_queue, mock_dimensions):
+        fake_queue = mock.Mock()
+        mock_get_queue.return_value = fake_queue
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(fake_queue)
+
+        functions = [c[0][0] for c in fake_queue.enqueue.call_args_list]
+        self.assertNotIn(save_encoding_ladder, functions)
+        fake_queue.enqueue.assert_any_call(save_converted_resolution, self.path, self.movie.pk, 720, depends_on=None,
+                                           retry=mock.ANY)
+        self.assertFalse(self.movie.stages.filter(name='analyze').exists())
+
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(1280, 720))
+    @mock.patch('django_rq.get_queue')
+    def test_stores_source_metadata_and_rounded_duration(self, mock_get_queue, mock_probe):
+        start_processing(self.movie.pk, self.path)
+        mock_probe.assert_called_once_with(self.path)
+        source = self.movie.media.get(name='source')
+        self.assertEqual((source.duration_ms, source.width, source.height, source.video_codec), (61500, 1280, 720, 'h264'))
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).duration, 62)
+
+    @mock.patch('movies.pipeline.probe_media', side_effect=FileNotFoundError('ffprobe'))
+    @mock.patch('django_rq.get_queue')
+    def test_full_ladder_when_source_cannot_be_probed(self, mock_get_queue, mock_dimensions):
+        start_processing(self.movie.pk, self.path)
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).available_resolutions, [120, 360, 720, 1080])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ResumeStalledTests(TestCase):
+    def setUp(self):
+        with mock.patch('django_rq.get_queue'):
+            self.movie = Movie.objects.create(title='Stalled', available_resolutions=[120, 360])
+            self.movie.video_file.save('stalled.mp4', ContentFile(b'source'), save=True)
+        self.movie.refresh_from_db()
+        for name in ('thumbnail', 'trailer', '120p', '360p', 'hls', 'dash', 'finalize'):
+            status = ProcessingStage.Status.FINISHED if name in ('thumbnail', 'trailer', '120p') else ProcessingStage.Status.RUNNING
+            ProcessingStage.objects.create(movie=self.movie, name=name, status=status)
+
+    def tearDown(self):
+        shutil.rmtree(self.movie.video_file.storage.location, ignore_errors=True)
+
+    def _age_stages(self, seconds):
+        self.movie.stages.update(updated_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_finds_only_movies_without_recent_progress(self):
+        self.assertEqual(find_stalled_movies(3600), [])
+        self._age_stages(7200)
+        self.assertEqual([movie.pk for movie in find_stalled_movies(3600)], [self.movie.pk])
+
+    def test_failed_movies_need_include_failed(self):
+        self._age_stages(7200)
+        self.movie.stages.filter(name='360p').update(status=ProcessingStage.Status.FAILED)
+        self.assertEqual(find_stalled_movies(3600), [])
+        self.assertEqual(len(find_stalled_movies(3600, include_failed=True)), 1)
+
+    @override_settings(VIDEO_PER_TITLE=False)
+    @mock.patch('django_rq.get_queue')
+    def test_resume_enqueues_only_unfinished_stages(self, mock_get_queue):
+        queues = {name: mock.Mock() for name in ('fast', 'encode', 'maintenance')}
+        mock_get_queue.side_effect = queues.__getitem__
+        self._age_stages(7200)
+
+        resumed = resume_processing(self.movie)
+
+        self.assertEqual(resumed, ['360p', 'hls', 'dash', 'finalize'])
+        queues['fast'].enqueue.assert_not_called()
+        self.assertEqual([c[0][1:] for c in queues['encode'].enqueue.call_args_list],
+                         [(self.movie.video_file.path, self.movie.pk, 360)])
+        self.assertEqual([c[0][0] for c in queues['maintenance'].enqueue.call_args_list],
+                         [save_hls_package, save_dash_package, finalize_conversion])
+        retry = queues['encode'].enqueue.call_args[1]['retry']
+        self.assertEqual((retry.max, retry.intervals), (3, [60, 240, 960]))
+        self.assertTrue(all(
+            status == ProcessingStage.Status.QUEUED
+            for status in self.movie.stages.filter(name__in=resumed).values_list('status', flat=True)
+        ))
+        self.assertEqual(find_stalled_movies(3600), [])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DeduplicationTests(TestCase):
+    def setUp(self):
+        with mock.patch('django_rq.get_queue'):
+            self.movie = Movie.objects.create(title='Re-upload')
+            self.movie.video_file.save('source.mp4', ContentFile(b'same content'), save=True)
+        self.path = self.movie.video_file.path
+        self.sha256 = hashlib.sha256(b'same content').hexdigest()
+
+    def tearDown(self):
+        shutil.rmtree(self.movie.video_file.storage.location, ignore_errors=True)
+
+    def _donor(self, **fields):
+        donor = Movie.objects.create(title='Original', source_sha256=self.sha256, available_resolutions=[360], **fields)
+        for name in ('video_360p', 'hls_playlist', 'dash_manifest'):
+            getattr(donor, name).save(f'{name}.out', ContentFile(b'output'), save=False)
+        donor.save()
+        return donor
+
+    @mock.patch('movies.pipeline.save_reused_renditions')
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(640, 360))
+    @mock.patch('django_rq.get_queue')
+    def test_same_content_reuses_completed_movie(self, mock_get_queue, mock_dimensions, mock_reuse):
+        queues = {name: mock.Mock() for name in ('fast', 'encode', 'maintenance')}
+        mock_get_queue.side_effect = queues.__getitem__
+        donor = self._donor()
+
+        start_processing(self.movie.pk, self.path)
+
+        self.assertEqual([c[0][0] for c in queues['fast'].enqueue.call_args_list], [save_thumbnail, save_trailer])
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).source_sha256, '')
+        run_deduplication(queues['maintenance'])
+
+        mock_reuse.assert_called_once_with(self.movie.pk, donor.pk, self.path)
+        queues['encode'].enqueue.assert_not_called()
+        self.assertEqual([c[0][0] for c in queues['maintenance'].enqueue.call_args_list],
+                         [deduplicate_source, finalize_conversion])
+        finalize_call = queues['maintenance'].enqueue.call_args
+        self.assertEqual(len(finalize_call[1]['depends_on']), 2)
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).source_sha256, self.sha256)
+        self.assertEqual(sorted(self.movie.stages.values_list('name', flat=True)),
+                         ['dedup', 'finalize', 'reuse', 'thumbnail', 'trailer'])
+
+    @mock.patch('movies.pipeline.probe_media', return_value=probe(640, 360))
+    @mock.patch('django_rq.get_queue')
+    def test_unfinished_duplicate_is_not_reused(self, mock_get_queue, mock_dimensions):
+        with mock.patch('django_rq.get_queue'):
+            self._donor(video_file='videos/other.mp4')
+
+        start_processing(self.movie.pk, self.path)
+        run_deduplication(mock_get_queue.return_value)
+
+        functions = [c[0][0] for c in mock_get_queue.return_value.enqueue.call_args_list]
+        self.assertNotIn(save_reused_renditions, functions)
+        self.assertIn(save_converted_resolution, functions)
+
+    @mock.patch('movies.pipeline.file_sha256')
+    def test_hash_of_resumable_upload_is_reused(self, mock_sha256):
+        Upload.objects.create(movie=self.movie, filename='source.mp4', length=12, offset=12,
+                              sha256='a' * 64, completed_at=timezone.now())
+        self.assertEqual(source_sha256(self.movie.pk, self.path), 'a' * 64)
+        mock_sha256.assert_not_called()
@@ -1,7 +1,13 @@
 import io
-from django.test import TestCase, RequestFactory
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, RequestFactory, override_settings
 from django.contrib.auth import get_user_model
-from movies.models import Movie, MovieProgress, Category
+from movies.models import Movie, MovieProgress, Category, MediaMetadata
+from movies.utils.thumbnail_cache import thumbnail_version
 from movies.serializers import MovieSerializer, MovieFileSerializer, MovieProgressSerializer
 
 User = get_user_model()
@@ -35,6 +41,34 @@ class MovieSerializerAdditionalTests(TestCase):
         self.assertIn("progressInSeconds", data["progress"])
         self.assertEqual(data["progress"]["progressInSeconds"], 42)
 
+    @override_settings(THUMBNAIL_FORMATS=["avif", "webp"])
+    def test_thumbnail_srcset_lists_variants_smallest_first(self):
+        req = self.factory.get("/")
+        req.user = self.user
+        self.assertEqual(MovieSerializer(self.movie, context={"request": req}).data["thumbnail_srcset"], {})
+        self.movie.thumbnail_variants = {
+            "webp": {"640": "thumbnails/1/v1/thumb_640.webp", "320": "thumbnails/1/v1/thumb_320.webp"},
+            "avif": {"320": "thumbnails/1/v1/thumb_320.avif"},
+        }
+        srcset = MovieSerializer(self.movie, context={"request": req}).data["thumbnail_srcset"]
+        self.assertEqual(list(srcset), ["image/avif", "image/webp"])
+        self.assertEqual(srcset["image/webp"], (
+            "http://testserver/media/thumbnails/1/v1/thumb_320.webp 320w, "
+            "http://testserver/media/thumbnails/1/v1/thumb_640.webp 640w"
+        ))
+
+    @override_settings(THUMBNAIL_FORMATS=["webp"], THUMBNAIL_WIDTHS=[640, 320])
+    def test_thumbnail_srcset_of_uploaded_thumbnail_uses_resize_endpoint(self):
+        req = self.factory.get("/")
+        req.user = self.user
+        with self.settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            self.movie.thumbnail.save("upload.png", ContentFile(b"png"), save=False)
+            version = thumbnail_version(self.movie.thumbnail.path)
+            srcset = MovieSerializer(self.movie, context={"request": req}).data["thumbnail_srcset"]
+            shutil.rmtree(settings.MEDIA_ROOT)
+        base = f"http://testserver/movies/{self.movie.pk}/thumbnail/{version}"
+        self.assertEqual(srcset, {"image/webp": f"{base}/320.webp 320w, {base}/640.webp 640w"})
+
     def test_categories_listed(self):
         req = self.factory.get("/")
         req.user = self.user
@@ -73,6 +107,59 @@ class MovieFileSerializerAdditionalTests(TestCase):
         self.assertEqual(data["progressInSeconds"], 0)
         self.assertFalse(data["finished"])
 
+    def test_hls_url(self):
+        req = self.factory.get("/")
+        req.user = self.user
+        self.assertIsNone(MovieFileSerializer(self.movie, context={"request": req}).data["hls_url"])
+        self.movie.hls_playlist = f"hls/{self.movie.pk}/abc123/master.m3u8"
+        data = MovieFileSerializer(self.movie, context={"request": req}).data
+        self.assertEqual(data["hls_url"], f"http://testserver/movies/{self.movie.pk}/hls/abc123/master.m3u8")
+
+    def test_resolutions_lists_only_generated_rungs(self):
+        req = self.factory.get("/")
+        req.user = self.user
+        self.movie.available_resolutions = [120, 360]
+        self.movie.video_120p = "videos/120p/x_120p.mp4"
+        data = MovieFileSerializer(self.movie, context={"request": req}).data
+        self.assertEqual(data["resolutions"], [120])
+        self.movie.video_360p = "videos/360p/x_360p.mp4"
+        data = MovieFileSerializer(self.movie, context={"request": req}).data
+        self.assertEqual(data["resolutions"], [120, 360])
+
+    def test_media_lists_probed_renditions(self):
+        req = self.factory.get("/")
+        req.user = self.user
+        MediaMetadata.objects.create(movie=self.movie, name="720p", duration_ms=61500, video_codec="h264",
+                                     width=1280, height=720, frame_rate=25.0, bitrate=3100, size=23831250)
+        data = MovieFileSerializer(self.movie, context={"request": req}).data
+        self.assertEqual(len(data["media"]), 1)
+        self.assertEqual(data["media"][0]["name"], "720p")
+        self.assertEqual(data["media"][0]["duration_ms"], 61500)
+        self.assertEqual((data["media"][0]["width"], data["media"][0]["bitrate"]), (1280, 3100))
+
+    def test_seek_previews_lists_vtt_and_sprites(self):
+        req = self.factory.get("/")
+        req.user = self.user
+        self.assertIsNone(MovieFileSerializer(self.movie, context={"request": req}).data["seek_previews"])
+        folder = f"previews/{self.movie.pk}/abc123"
+        with self.settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            for name in ("thumbnails.vtt", "sprite_001.jpg", "sprite_000.jpg"):
+                default_storage.save(f"{folder}/{name}", ContentFile(b"x"))
+            self.movie.seek_previews = f"{folder}/thumbnails.vtt"
+            data = MovieFileSerializer(self.movie, context={"request": req}).data["seek_previews"]
+            shutil.rmtree(settings.MEDIA_ROOT)
+        self.assertEqual(data["vtt"], f"http://testserver/media/{folder}/thumbnails.vtt")
+        self.assertEqual(data["sprites"], [
+            f"http://testserver/media/{folder}/sprite_000.jpg", f"http://testserver/media/{folder}/sprite_001.jpg",
+        ])
+
+    def test_dash_url_contains_version(self):
+        req = self.factory.get("/")
+        req.user = self.user
+        self.movie.dash_manifest = f"dash/{self.movie.pk}/abc123/manifest.mpd"
+        data = MovieFileSerializer(self.movie, context={"request": req}).data
+        self.assertEqual(data["dash_url"], f"http://testserver/movies/{self.movie.pk}/dash/abc123/manifest.mpd")
+
 
 class MovieProgressSerializerAdditionalTests(TestCase):
     def setUp(self):
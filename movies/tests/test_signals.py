@@ -2,11 +2,11 @@ import os
 import shutil
 import tempfile
 from unittest import mock
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from movies.models import Movie
-from movies.tasks import save_converted_resolution, save_thumbnail, save_trailer, save_video_duration, finalize_conversion
+from movies.pipeline import wait_for_upload
 import django_rq
 
 class SignalTests(TestCase):
@@ -32,30 +32,28 @@ class SignalTests(TestCase):
             conversion_started=False
         )
 
-    @mock.patch('movies.signals.wait_until_file_is_ready', return_value=True)
     @mock.patch('django_rq.get_queue')
-    def test_video_post_save_enqueues_all_tasks(self, mock_get_queue, mock_wait):
+    def test_video_post_save_enqueues_readiness_check(self, mock_get_queue):
         fake_queue = mock.Mock()
         mock_get_queue.return_value = fake_queue
 
-        self.movie.conversion_started = False
-        self.movie.save(update_fields=['conversion_started'])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.movie.conversion_started = False
+            self.movie.save(update_fields=['conversion_started'])
+        mock_get_queue.assert_not_called()
+        for callback in callbacks:
+            callback()
 
         m = Movie.objects.get(pk=self.movie.pk)
         self.assertTrue(m.conversion_started)
+        mock_get_queue.assert_called_once_with('fast')
+        fake_queue.enqueue.assert_called_once_with(wait_for_upload, self.movie.pk, m.video_file.path)
 
-        expected_calls = [
-            mock.call(save_converted_resolution, mock.ANY, self.movie.pk, res)
-            for res in [120, 360, 720, 1080]
-        ] + [
-            mock.call(save_thumbnail, self.movie.pk, mock.ANY),
-            mock.call(save_trailer, self.movie.pk, mock.ANY),
-            mock.call(save_video_duration, self.movie.pk, mock.ANY),
-        ]
-        fake_queue.enqueue.assert_has_calls(expected_calls, any_order=True)
-
-        finalize_calls = [c for c in fake_queue.enqueue.call_args_list if c[0][0] == finalize_conversion]
-        self.assertEqual(len(finalize_calls), 1)
+    @mock.patch('django_rq.get_queue')
+    def test_video_post_save_ignores_started_movies(self, mock_get_queue):
+        self.movie.title = 'Renamed'
+        self.movie.save()
+        mock_get_queue.return_value.enqueue.assert_not_called()
 
     def test_auto_delete_file_on_delete_removes_files(self):
         # Assign additional file fields
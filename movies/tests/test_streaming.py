@@ -1,7 +1,14 @@
+import io
 import os
 import tempfile
-from django.test import RequestFactory, SimpleTestCase
-from movies.utils.streaming import RangeFileResponse
+import threading
+import time
+from unittest import mock
+from wsgiref.util import FileWrapper
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+from movies.utils import streaming
+from movies.utils.streaming import RangeFileResponse, RangeFileWrapper, offload_file_response
 
 class RangeFileResponseTests(SimpleTestCase):
     def setUp(self):
@@ -39,4 +46,209 @@ class RangeFileResponseTests(SimpleTestCase):
         self.assertEqual(response.status_code, 206)
         expected_end = len(self.content) - 1
         self.assertEqual(response['Content-Range'], f'bytes 7-{expected_end}/{len(self.content)}')
-        self.assertEqual(b''.join(response.streaming_content), self.content[7:])
\ No newline at end of file
+        self.assertEqual(b''.join(response.streaming_content), self.content[7:])
+
+    def test_partial_content_exposes_file_to_stream(self):
+        request = self.factory.get('/', HTTP_RANGE='bytes=2-5')
+        response = RangeFileResponse(request, self.filename, chunk_size=2)
+        self.assertIsInstance(response.file_to_stream, RangeFileWrapper)
+        self.assertEqual(response.file_to_stream.fileno(), response.file_to_stream.filelike.fileno())
+        self.assertEqual(response.file_to_stream.tell(), 2)
+        response.close()
+
+    def test_file_wrapper_stays_within_range(self):
+        request = self.factory.get('/', HTTP_RANGE='bytes=3-4')
+        response = RangeFileResponse(request, self.filename, chunk_size=1024)
+        # wsgiref's FileWrapper reads blocks until EOF, like the WSGI handler would
+        wrapped = FileWrapper(response.file_to_stream, response.block_size)
+        self.assertEqual(b''.join(wrapped), self.content[3:5])
+        response.close()
+
+    def test_full_content_sets_content_length(self):
+        request = self.factory.get('/')
+        response = RangeFileResponse(request, self.filename)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertIsNotNone(response.file_to_stream)
+        response.close()
+
+
+class RangeFileWrapperTests(SimpleTestCase):
+    def test_read_is_bounded_by_range_end(self):
+        wrapper = RangeFileWrapper(io.BytesIO(b'0123456789'), 4, 6)
+        self.assertEqual(wrapper.read(), b'456')
+        self.assertEqual(wrapper.read(), b'')
+
+    def test_iteration_uses_block_size(self):
+        wrapper = RangeFileWrapper(io.BytesIO(b'0123456789'), 0, 4, blksize=2)
+        self.assertEqual(list(wrapper), [b'01', b'23', b'4'])
+
+
+class OffloadFileResponseTests(SimpleTestCase):
+    @override_settings(VIDEO_STREAM_OFFLOAD='')
+    def test_disabled_returns_none(self):
+        self.assertIsNone(offload_file_response('/media/videos/a.mp4', 'videos/a.mp4'))
+
+    @override_settings(VIDEO_STREAM_OFFLOAD='nginx', VIDEO_STREAM_OFFLOAD_PREFIX='/protected-media/')
+    def test_nginx_sets_accel_redirect(self):
+        response = offload_file_response('/media/videos/my movie.mp4', 'videos/my movie.mp4', content_type='video/mp4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/my%20movie.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(VIDEO_STREAM_OFFLOAD='sendfile')
+    def test_sendfile_sets_absolute_path(self):
+        response = offload_file_response('/media/videos/a.mp4', 'videos/a.mp4')
+        self.assertEqual(response['X-Sendfile'], '/media/videos/a.mp4')
+
+    @override_settings(VIDEO_STREAM_OFFLOAD='lighttpd2')
+    def test_unknown_mode_raises(self):
+        with self.assertRaises(ValueError):
+            offload_file_response('/media/videos/a.mp4', 'videos/a.mp4')
+
+
+class RangeFileResponseRfc7233Tests(SimpleTestCase):
+    def setUp(self):
+        self.content = b'0123456789'
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        tmp.write(self.content)
+        tmp.close()
+        self.filename = tmp.name
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def _response(self, range_header):
+        request = self.factory.get('/', HTTP_RANGE=range_header)
+        return RangeFileResponse(request, self.filename, chunk_size=3, content_type='video/mp4')
+
+    def test_suffix_range(self):
+        response = self._response('bytes=-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+    def test_suffix_range_longer_than_file(self):
+        response = self._response('bytes=-50')
+        self.assertEqual(response['Content-Range'], 'bytes 0-9/10')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_range_past_eof_is_unsatisfiable(self):
+        response = self._response('bytes=10-20')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_invalid_range_is_ignored(self):
+        for header in ('bytes=5-2', 'bytes=abc', 'items=0-1', 'bytes=-'):
+            response = self._response(header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_overlapping_ranges_are_coalesced(self):
+        response = self._response('bytes=2-4, 3-6')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-6/10')
+
+    def test_unsatisfiable_part_is_dropped(self):
+        response = self._response('bytes=0-1, 50-60')
+        self.assertEqual(response['Content-Range'], 'bytes 0-1/10')
+
+    def test_multipart_byteranges(self):
+        response = self._response('bytes=0-1, -2')
+        self.assertEqual(response.status_code, 206)
+        content_type = response['Content-Type']
+        self.assertTrue(content_type.startswith('multipart/byteranges; boundary='))
+        boundary = content_type.split('boundary=')[1]
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Length'], str(len(body)))
+        expected = (
+            f'--{boundary}\r\nContent-Type: video/mp4\r\nContent-Range: bytes 0-1/10\r\n\r\n01\r\n'
+            f'--{boundary}\r\nContent-Type: video/mp4\r\nContent-Range: bytes 8-9/10\r\n\r\n89\r\n'
+            f'--{boundary}--\r\n'
+        ).encode()
+        self.assertEqual(body, expected)
+
+
+class RangeFileResponseConditionalTests(SimpleTestCase):
+    def setUp(self):
+        self.content = b'0123456789'
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        tmp.write(self.content)
+        tmp.close()
+        self.filename = tmp.name
+        self.factory = RequestFactory()
+        self.validators = RangeFileResponse(self.factory.get('/'), self.filename)
+        self.validators.close()
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def _response(self, **headers):
+        request = self.factory.get('/', **headers)
+        return RangeFileResponse(request, self.filename, content_type='video/mp4', cache_control='private, max-age=60')
+
+    def test_validators_and_cache_control_are_sent(self):
+        response = self._response()
+        stat = os.stat(self.filename)
+        self.assertEqual(response['ETag'], f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"')
+        self.assertEqual(response['Last-Modified'], http_date(int(stat.st_mtime)))
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60')
+
+    def test_if_none_match_returns_304(self):
+        response = self._response(HTTP_IF_NONE_MATCH=self.validators['ETag'], HTTP_RANGE='bytes=0-1')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(b''.join(response.streaming_content), b'')
+        self.assertEqual(response['ETag'], self.validators['ETag'])
+        self.assertNotIn('Content-Type', response)
+
+    def test_if_modified_since_returns_304(self):
+        response = self._response(HTTP_IF_MODIFIED_SINCE=self.validators['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_match_mismatch_returns_412(self):
+        response = self._response(HTTP_IF_MATCH='"other"')
+        self.assertEqual(response.status_code, 412)
+
+    def test_if_range_with_current_etag_honours_range(self):
+        response = self._response(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=self.validators['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'01')
+
+    def test_if_range_with_current_date_honours_range(self):
+        response = self._response(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=self.validators['Last-Modified'])
+        self.assertEqual(response.status_code, 206)
+
+    def test_if_range_with_stale_etag_sends_full_file(self):
+        response = self._response(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_if_range_with_weak_etag_sends_full_file(self):
+        response = self._response(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='W/' + self.validators['ETag'])
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+class ReadExecutorTests(SimpleTestCase):
+    def test_concurrent_first_calls_share_one_pool(self):
+        real_executor = streaming.ThreadPoolExecutor
+        def slow_executor(**kwargs):
+            time.sleep(0.05)
+            return real_executor(**kwargs)
+        barrier = threading.Barrier(4)
+        pools = []
+        def first_call():
+            barrier.wait()
+            pools.append(streaming.get_read_executor())
+        with mock.patch.object(streaming, "_read_executor", None), \
+                mock.patch.object(streaming, "ThreadPoolExecutor", side_effect=slow_executor) as constructor:
+            threads = [threading.Thread(target=first_call) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            pools[0].shutdown()
+        self.assertEqual(constructor.call_count, 1)
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
@@ -1,26 +1,63 @@
 import os
 import tempfile
 import shutil
+import subprocess
+from unittest import mock
 
 from django.test import TestCase, override_settings
 from django.core.files.base import ContentFile
 from django.conf import settings
 from movies import tasks as tasks_module
-from movies.models import Movie
+from movies.models import Movie, ProcessingStage
 from movies.tasks import (
+    save_reused_renditions,
+    save_encoding_ladder,
     save_converted_resolution,
+    save_converted_resolutions,
+    save_chunked_renditions,
+    save_concatenated_renditions,
+    encode_chunk,
+    get_rendition_paths,
     save_thumbnail,
     save_trailer,
-    save_video_duration,
+    save_media_metadata,
+    save_hls_package,
+    save_dash_package,
     finalize_conversion,
+    remove_package_version,
 )
 from movies.utils.video import (
     convert_video_to_resolution,
-    generate_thumbnail,
+    extract_frame_previews,
     cut_video_for_trailer,
-    get_video_duration,
 )
 
+#  Stand-ins for the ffmpeg/ffprobe binaries, run as real processes: like ffmpeg, the fake refuses
+#    to overwrite an existing output without -y (stdin is /dev/null, so it can't ask).
+FAKE_FFMPEG = """#!/usr/bin/env python3
+import os, sys
+args = sys.argv[1:]
+if os.path.exists(args[-1]) and "-y" not in args:
+    sys.stderr.write("File '%s' already exists. Exiting.\\n" % args[-1])
+    sys.exit(1)
+with open(args[-1], "wb") as output:
+    output.write(b"encoded")
+"""
+FAKE_FFPROBE = """#!/usr/bin/env python3
+import sys
+print('{"format": {"duration": "10.0"}, "streams": []}' if "json" in sys.argv else "10.0")
+"""
+
+
+def install_fake_binaries(folder):
+    for name, script in (("ffmpeg", FAKE_FFMPEG), ("ffprobe", FAKE_FFPROBE)):
+        path = os.path.join(folder, name)
+        with open(path, "w") as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+    return mock.patch.dict(os.environ, {"PATH": folder + os.pathsep + os.environ["PATH"]})
+
+
 @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class MovieTasksTest(TestCase):
     def setUp(self):
@@ -36,7 +73,7 @@ class MovieTasksTest(TestCase):
         shutil.rmtree(self.tmp_media, ignore_errors=True)
 
     def test_save_converted_resolution_updates_field(self):
-        def fake_convert(src, res):
+        def fake_convert(src, res, on_progress=None, encoding=None):
             target = os.path.join(self.tmp_media, f"vid_{res}.mp4")
             with open(target, "wb") as f:
                 f.write(b"converted")
@@ -53,24 +90,277 @@ class MovieTasksTest(TestCase):
         finally:
             tasks_module.convert_video_to_resolution = real_convert
 
+    @override_settings(VIDEO_RATE_CONTROL="capped")
+    def test_rerun_after_interrupted_encode_overwrites_leftovers(self):
+        target = tasks_module.rendition_target_path(self.source_path, 360)
+        for leftover in (target, f"{target}.part.mp4"):
+            with open(leftover, "wb") as f:
+                f.write(b"partial")
+        ProcessingStage.objects.create(movie=self.movie, name="360p", status=ProcessingStage.Status.FAILED)
+        bin_dir = tempfile.mkdtemp()
+        try:
+            with install_fake_binaries(bin_dir):
+                save_converted_resolution(self.source_path, self.movie.id, 360)
+        finally:
+            shutil.rmtree(bin_dir)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"encoded")
+        self.assertFalse(os.path.exists(f"{target}.part.mp4"))
+        self.assertEqual(ProcessingStage.objects.get(movie=self.movie, name="360p").status, ProcessingStage.Status.FINISHED)
+
+    def test_save_converted_resolutions_updates_all_fields(self):
+        def fake_convert(src, resolutions, on_progress=None, encodings=None):
+            targets = {}
+            for res in resolutions:
+                targets[res] = os.path.join(self.tmp_media, f"vid_{res}.mp4")
+                with open(targets[res], "wb") as f:
+                    f.write(b"converted")
+            return targets
+        real_convert = tasks_module.convert_video_to_resolutions
+        try:
+            tasks_module.convert_video_to_resolutions = fake_convert
+            save_converted_resolutions(self.source_path, self.movie.id, [120, 1080])
+            m = Movie.objects.get(pk=self.movie.id)
+            self.assertEqual(m.video_120p.name, "vid_120.mp4")
+            self.assertEqual(m.video_1080p.name, "vid_1080.mp4")
+            self.assertFalse(m.video_360p)
+            stages = {stage.name: stage.status for stage in m.stages.all()}
+            self.assertEqual(stages, {"120p": "finished", "1080p": "finished"})
+        finally:
+            tasks_module.convert_video_to_resolutions = real_convert
+
+    @mock.patch('movies.tasks.measure_complexity', return_value=180.0)
+    def test_save_encoding_ladder_feeds_conversion(self, mock_measure):
+        save_encoding_ladder(self.movie.id, self.source_path, [360])
+        m = Movie.objects.get(pk=self.movie.id)
+        self.assertEqual(m.encoding_ladder["complexity_kbps"], 180.0)
+        self.assertEqual(m.stages.get(name="analyze").status, ProcessingStage.Status.FINISHED)
+        with mock.patch('movies.tasks.convert_video_to_resolution', side_effect=subprocess.CalledProcessError(1, [])) as convert:
+            with self.assertRaises(subprocess.CalledProcessError):
+                save_converted_resolution(self.source_path, self.movie.id, 360)
+        self.assertEqual(convert.call_args[1]["encoding"], m.encoding_ladder["rungs"]["360"])
+
+    @mock.patch('movies.tasks.measure_complexity', side_effect=subprocess.CalledProcessError(1, ["ffmpeg"]))
+    def test_failed_probe_keeps_profile_defaults(self, mock_measure):
+        save_encoding_ladder(self.movie.id, self.source_path, [360])
+        m = Movie.objects.get(pk=self.movie.id)
+        self.assertEqual(m.encoding_ladder, {})
+        self.assertEqual(m.stages.get(name="analyze").status, ProcessingStage.Status.FAILED)
+
+    @mock.patch('movies.tasks.probe_media', return_value={
+        "duration_ms": 10000, "video_codec": "h264", "width": 640, "height": 360, "frame_rate": 25.0,
+        "bitrate": 950, "audio_tracks": [{"codec": "aac", "channels": 2, "sample_rate": 48000, "language": ""}],
+        "size": 1187500, "video_bitrate": 800, "peak_bitrate": 1400, "keyframe_interval": 2.0,
+    })
+    def test_save_converted_resolution_records_bitrate(self, mock_measure):
+        self.movie.rendition_bitrates = {"120": {"average": 150, "peak": 240}}
+        self.movie.save(update_fields=["rendition_bitrates"])
+        with mock.patch('movies.tasks.convert_video_to_resolution', return_value=os.path.join(self.tmp_media, "vid_360.mp4")):
+            save_converted_resolution(self.source_path, self.movie.id, 360)
+        m = Movie.objects.get(pk=self.movie.id)
+        self.assertEqual(m.rendition_bitrates, {
+            "120": {"average": 150, "peak": 240},
+            "360": {"average": 800, "peak": 1400},
+        })
+        mock_measure.assert_called_once_with(os.path.join(self.tmp_media, "vid_360.mp4"), packets=True)
+        rendition = m.media.get(name="360p")
+        self.assertEqual((rendition.bitrate, rendition.peak_bitrate, rendition.keyframe_interval), (950, 1400, 2.0))
+        self.assertEqual(rendition.audio_tracks[0]["codec"], "aac")
+
+    def test_finished_rendition_is_not_encoded_again(self):
+        target = tasks_module.rendition_target_path(self.source_path, 360)
+        with open(target, "wb") as f:
+            f.write(b"converted")
+        ProcessingStage.objects.create(movie=self.movie, name="360p", status=ProcessingStage.Status.FINISHED)
+        with mock.patch('movies.tasks.convert_video_to_resolution') as convert:
+            save_converted_resolution(self.source_path, self.movie.id, 360)
+        convert.assert_not_called()
+        self.assertEqual(Movie.objects.get(pk=self.movie.id).video_360p.name, "videos/360p/original_360p.mp4")
+
+    def test_unfinished_rendition_is_encoded_again(self):
+        target = tasks_module.rendition_target_path(self.source_path, 360)
+        with open(target, "wb") as f:
+            f.write(b"half written")
+        ProcessingStage.objects.create(movie=self.movie, name="360p", status=ProcessingStage.Status.RUNNING)
+        with mock.patch('movies.tasks.convert_video_to_resolution', return_value=target) as convert:
+            save_converted_resolution(self.source_path, self.movie.id, 360)
+        convert.assert_called_once()
+
+    def test_encode_chunk_skips_encoded_chunk(self):
+        chunk_dir = tasks_module.get_chunk_dir(self.movie.id)
+        for resolution in (120, 360):
+            os.makedirs(os.path.join(chunk_dir, f"{resolution}p"))
+            with open(os.path.join(chunk_dir, f"{resolution}p", "chunk_00000.mp4"), "wb") as f:
+                f.write(b"encoded")
+        ProcessingStage.objects.create(movie=self.movie, name="chunks", status=ProcessingStage.Status.RUNNING)
+        with mock.patch('movies.tasks.encode_video_chunk') as encode:
+            encode_chunk(os.path.join(chunk_dir, "chunk_00000.mp4"), [120, 360], movie_id=self.movie.id)
+        encode.assert_not_called()
+        stage = ProcessingStage.objects.get(movie=self.movie, name="chunks")
+        self.assertEqual((stage.status, stage.percent), (ProcessingStage.Status.FINISHED, 100))
+
+    def _completed_movie(self, title):
+        donor = Movie.objects.create(title=title, available_resolutions=[360], duration=42,
+                                     rendition_bitrates={"360": {"average": 700, "peak": 900}})
+        donor.video_360p.save("donor_360p.mp4", ContentFile(b"rendition"), save=False)
+        donor.thumbnail.save("donor_thumb.webp", ContentFile(b"thumb"), save=False)
+        for folder, name in ((f"hls/{donor.id}/v1", "master.m3u8"), (f"dash/{donor.id}/v1", "manifest.mpd")):
+            os.makedirs(os.path.join(self.tmp_media, folder, "360p"))
+            with open(os.path.join(self.tmp_media, folder, name), "w") as f:
+                f.write("playlist")
+            with open(os.path.join(self.tmp_media, folder, "360p", "segment_00000.m4s"), "wb") as f:
+                f.write(b"segment")
+        donor.hls_playlist = f"hls/{donor.id}/v1/master.m3u8"
+        donor.dash_manifest = f"dash/{donor.id}/v1/manifest.mpd"
+        donor.save()
+        return donor
+
+    def test_save_reused_renditions_links_outputs_of_donor(self):
+        donor = self._completed_movie("Donor")
+        save_reused_renditions(self.movie.id, donor.id, self.source_path)
+
+        m = Movie.objects.get(pk=self.movie.id)
+        self.assertNotEqual(m.video_360p.name, donor.video_360p.name)
+        self.assertTrue(os.path.samefile(m.video_360p.path, donor.video_360p.path))
+        self.assertEqual((m.available_resolutions, m.duration, m.rendition_bitrates),
+                         ([360], 42, donor.rendition_bitrates))
+        self.assertRegex(m.hls_playlist.name, rf"^hls/{m.id}/\w+/master.m3u8$")
+        self.assertTrue(os.path.samefile(
+            os.path.join(os.path.dirname(m.hls_playlist.path), "360p", "segment_00000.m4s"),
+            os.path.join(os.path.dirname(donor.hls_playlist.path), "360p", "segment_00000.m4s"),
+        ))
+        self.assertTrue(os.path.exists(os.path.join(os.path.dirname(m.dash_manifest.path), "360p", "segment_00000.m4s")))
+        self.assertEqual(m.stages.get(name="reuse").status, ProcessingStage.Status.FINISHED)
+
+        donor.delete()
+        with open(m.video_360p.path, "rb") as f:
+            self.assertEqual(f.read(), b"rendition")
+        self.assertTrue(os.path.exists(m.hls_playlist.path))
+
+    @override_settings(PACKAGE_GRACE_PERIOD=0)
+    def test_reuse_replaces_the_movies_own_outputs(self):
+        donor = self._completed_movie("Donor")
+        own = self._completed_movie("Own")
+        save_reused_renditions(own.id, donor.id, self.source_path)
+
+        m = Movie.objects.get(pk=own.id)
+        self.assertFalse(os.path.exists(own.video_360p.path))
+        self.assertFalse(os.path.exists(os.path.dirname(own.hls_playlist.path)))
+        self.assertFalse(os.path.exists(os.path.dirname(own.dash_manifest.path)))
+        self.assertTrue(os.path.samefile(m.video_360p.path, donor.video_360p.path))
+        self.assertTrue(os.path.exists(m.hls_playlist.path))
+
+    def test_failed_conversion_records_exit_code(self):
+        def fake_convert(src, res, on_progress=None, encoding=None):
+            on_progress(40.0)
+            raise subprocess.CalledProcessError(187, ["ffmpeg"])
+        with mock.patch('movies.tasks.convert_video_to_resolution', side_effect=fake_convert):
+            with self.assertRaises(subprocess.CalledProcessError):
+                save_converted_resolution(self.source_path, self.movie.id, 720)
+        stage = ProcessingStage.objects.get(movie=self.movie, name="720p")
+        self.assertEqual(stage.status, ProcessingStage.Status.FAILED)
+        self.assertEqual(stage.exit_code, 187)
+        self.assertEqual(stage.percent, 40.0)
+        self.assertIsNotNone(stage.finished_at)
+
+    @override_settings(VIDEO_CHUNK_DURATION=30)
+    @mock.patch('movies.tasks.django_rq.get_queue')
+    @mock.patch('movies.tasks.split_video_into_chunks')
+    def test_save_chunked_renditions_enqueues_chunk_jobs(self, mock_split, mock_get_queue):
+        mock_split.return_value = ["/c/chunk_00000.mp4", "/c/chunk_00001.mp4"]
+        queues = {name: mock.Mock() for name in ('encode', 'maintenance')}
+        mock_get_queue.side_effect = queues.__getitem__
+
+        save_chunked_renditions(self.source_path, self.movie.id, [120, 360], ["thumb-job"])
+
+        self.assertEqual(mock_split.call_args[0][2], 30)
+        encode_functions = [c[0][0] for c in queues['encode'].enqueue.call_args_list]
+        self.assertEqual(encode_functions, [encode_chunk, encode_chunk, save_concatenated_renditions])
+        calls = queues['encode'].enqueue.call_args_list + queues['maintenance'].enqueue.call_args_list
+        chunk_calls = [c for c in calls if c[0][0] == encode_chunk]
+        self.assertEqual([c[0][1] for c in chunk_calls], mock_split.return_value)
+        concat_call = next(c for c in calls if c[0][0] == save_concatenated_renditions)
+        self.assertEqual(len(concat_call[1]["depends_on"]), 2)
+        finalize_call = next(c for c in calls if c[0][0] == finalize_conversion)
+        self.assertIn("thumb-job", finalize_call[1]["depends_on"])
+        self.assertEqual(len(finalize_call[1]["depends_on"]), 4)
+
+    def test_encode_chunk_advances_shared_stage(self):
+        ProcessingStage.objects.create(movie=self.movie, name="chunks", status=ProcessingStage.Status.RUNNING)
+        with mock.patch('movies.tasks.encode_video_chunk', return_value={}):
+            encode_chunk("/c/chunk_00000.mp4", [360], movie_id=self.movie.id, total=2)
+            stage = ProcessingStage.objects.get(movie=self.movie, name="chunks")
+            self.assertEqual((stage.status, stage.percent), (ProcessingStage.Status.RUNNING, 50))
+            encode_chunk("/c/chunk_00001.mp4", [360], movie_id=self.movie.id, total=2)
+        stage = ProcessingStage.objects.get(movie=self.movie, name="chunks")
+        self.assertEqual((stage.status, stage.percent), (ProcessingStage.Status.FINISHED, 100))
+
+    def test_retried_chunk_finishes_a_failed_stage(self):
+        ProcessingStage.objects.create(movie=self.movie, name="chunks", status=ProcessingStage.Status.RUNNING)
+        with mock.patch('movies.tasks.encode_video_chunk', side_effect=[{}, OSError("disk full"), {}]):
+            encode_chunk("/c/chunk_00000.mp4", [360], movie_id=self.movie.id, total=2)
+            with self.assertRaises(OSError):
+                encode_chunk("/c/chunk_00001.mp4", [360], movie_id=self.movie.id, total=2)
+            encode_chunk("/c/chunk_00001.mp4", [360], movie_id=self.movie.id, total=2)
+        stage = ProcessingStage.objects.get(movie=self.movie, name="chunks")
+        self.assertEqual((stage.status, stage.percent), (ProcessingStage.Status.FINISHED, 100))
+
+    def test_save_concatenated_renditions_updates_fields_and_cleans_up(self):
+        chunk_dir = tasks_module.get_chunk_dir(self.movie.id)
+        os.makedirs(chunk_dir)
+        chunk_paths = [os.path.join(chunk_dir, "chunk_00000.mp4"), os.path.join(chunk_dir, "chunk_00001.mp4")]
+        joined = {}
+        def fake_concat(chunks, source, target):
+            joined[target] = chunks
+            with open(target, "wb") as f:
+                f.write(b"joined")
+            return target
+        with mock.patch('movies.tasks.concat_video_chunks', side_effect=fake_concat):
+            save_concatenated_renditions(self.source_path, self.movie.id, chunk_paths, [360, 120])
+        m = Movie.objects.get(pk=self.movie.id)
+        self.assertTrue(m.video_120p.name.endswith("_120p.mp4"))
+        self.assertTrue(m.video_360p.name.endswith("_360p.mp4"))
+        self.assertEqual(joined[m.video_360p.path], [
+            os.path.join(chunk_dir, "360p", "chunk_00000.mp4"),
+            os.path.join(chunk_dir, "360p", "chunk_00001.mp4"),
+        ])
+        self.assertFalse(os.path.exists(chunk_dir))
+
     def test_save_thumbnail_creates_file_and_updates_field(self):
-        def fake_generate(src, dest):
-            os.makedirs(os.path.dirname(dest), exist_ok=True)
-            with open(dest, "wb") as f:
-                f.write(b"thumb")
+        from PIL import Image
+        def fake_extract(src, poster, sprite_dir, **options):
+            os.makedirs(os.path.dirname(poster), exist_ok=True)
+            Image.new("RGB", (800, 450)).save(poster)
+            os.makedirs(sprite_dir, exist_ok=True)
+            Image.new("RGB", (1600, 900)).save(os.path.join(sprite_dir, "sprite_000.jpg"))
+            return [os.path.join(sprite_dir, "sprite_000.jpg")]
 
-        real_generate = tasks_module.generate_thumbnail
+        save_media_metadata(self.movie.id, "source", {"duration_ms": 12000})
+        real_extract = tasks_module.extract_frame_previews
         try:
-            tasks_module.generate_thumbnail = fake_generate
+            tasks_module.extract_frame_previews = fake_extract
             save_thumbnail(self.movie.id, self.source_path)
             m = Movie.objects.get(pk=self.movie.id)
             self.assertTrue(m.thumbnail.name.endswith("TestMovie_thumb.webp"))
             self.assertTrue(os.path.exists(os.path.join(self.tmp_media, m.thumbnail.name)))
+            self.assertTrue(m.seek_previews.name.startswith(f"previews/{m.id}/"))
+            with open(m.seek_previews.path) as vtt:
+                self.assertIn("sprite_000.jpg#xywh=160,0,160,90", vtt.read())
+            self.assertEqual(sorted(m.thumbnail_variants["webp"]), ["320", "640"])
+            self.assertTrue(os.path.exists(os.path.join(self.tmp_media, m.thumbnail_variants["webp"]["320"])))
+
+            ProcessingStage.objects.filter(movie=m, name="thumbnail").delete()
+            save_thumbnail(self.movie.id, self.source_path)
+            rerun = Movie.objects.get(pk=self.movie.id)
+            self.assertNotEqual(rerun.seek_previews.name, m.seek_previews.name)
+            self.assertFalse(os.path.exists(os.path.dirname(m.seek_previews.path)))
+            self.assertFalse(os.path.exists(os.path.join(self.tmp_media, m.thumbnail_variants["webp"]["320"])))
+            self.assertTrue(os.path.exists(os.path.join(self.tmp_media, rerun.thumbnail_variants["webp"]["320"])))
         finally:
-            tasks_module.generate_thumbnail = real_generate
+            tasks_module.extract_frame_previews = real_extract
 
     def test_save_trailer_creates_file_and_updates_field(self):
-        def fake_cut(src, dest):
+        def fake_cut(src, dest, **options):
             os.makedirs(os.path.dirname(dest), exist_ok=True)
             with open(dest, "wb") as f:
                 f.write(b"trailer")
@@ -86,19 +376,108 @@ class MovieTasksTest(TestCase):
         finally:
             tasks_module.cut_video_for_trailer = real_cut
 
-    def test_save_video_duration_sets_duration(self):
-        def fake_duration(src):
-            return 123
-        real_get_duration = tasks_module.get_video_duration
-        try:
-            tasks_module.get_video_duration = fake_duration
+    @override_settings(VIDEO_TRAILER_MODE="copy", VIDEO_TRAILER_START=60)
+    def test_trailer_options_copy_only_web_compatible_sources(self):
+        self.assertEqual(tasks_module.trailer_options(self.movie.id), {"duration": 7, "start": 60, "copy": False})
+        save_media_metadata(self.movie.id, "source", {
+            "duration_ms": 30000, "video_codec": "h264", "audio_tracks": [{"codec": "aac"}],
+        })
+        self.assertEqual(tasks_module.trailer_options(self.movie.id), {"duration": 7, "start": 23, "copy": True})
+        save_media_metadata(self.movie.id, "source", {
+            "duration_ms": 30000, "video_codec": "hevc", "audio_tracks": [{"codec": "aac"}],
+        })
+        self.assertFalse(tasks_module.trailer_options(self.movie.id)["copy"])
+        save_media_metadata(self.movie.id, "source", {
+            "duration_ms": 30000, "video_codec": "h264", "audio_tracks": [{"codec": "pcm_s16le"}],
+        })
+        self.assertFalse(tasks_module.trailer_options(self.movie.id)["copy"])
+
+    def test_save_media_metadata_rounds_source_duration(self):
+        save_media_metadata(self.movie.id, "source", {"duration_ms": 122600, "width": 1920, "height": 1080})
+        save_media_metadata(self.movie.id, "source", {"duration_ms": 123400, "width": 1920, "height": 1080})
+        m = Movie.objects.get(pk=self.movie.id)
+        self.assertEqual(m.duration, 123)
+        self.assertEqual(m.media.get().duration_ms, 123400)
+
+    def test_rendition_paths_follow_the_plan(self):
+        self.movie.available_resolutions = [360]
+        self.movie.video_360p.save("vid_360.mp4", ContentFile(b"converted"), save=False)
+        self.movie.video_720p.save("vid_720.mp4", ContentFile(b"stale"), save=True)
+        self.assertEqual(list(get_rendition_paths(self.movie)), [360])
 
-            save_video_duration(self.movie.id, self.source_path)
+    def assert_removal_scheduled(self, mock_get_queue, version_dir):
+        mock_get_queue.assert_called_with('maintenance')
+        delay, function, path = mock_get_queue.return_value.enqueue_in.call_args[0]
+        self.assertEqual((delay.total_seconds(), function, path), (settings.PACKAGE_GRACE_PERIOD, remove_package_version, version_dir))
+        # still served during the grace period, gone once the job ran
+        self.assertTrue(os.path.exists(version_dir))
+        function(path)
+        self.assertFalse(os.path.exists(version_dir))
 
+    @mock.patch('movies.tasks.django_rq.get_queue')
+    def test_save_hls_package_writes_new_version_and_removes_old(self, mock_get_queue):
+        self.movie.available_resolutions = [360]
+        self.movie.video_360p.save("vid_360.mp4", ContentFile(b"converted"), save=True)
+        calls = []
+        def fake_package(renditions, output_dir, segment_duration):
+            calls.append(renditions)
+            os.makedirs(output_dir, exist_ok=True)
+            master = os.path.join(output_dir, "master.m3u8")
+            with open(master, "w") as f:
+                f.write("#EXTM3U\n")
+            return master
+        real_package = tasks_module.package_hls
+        try:
+            tasks_module.package_hls = fake_package
+            save_hls_package(self.movie.id)
             m = Movie.objects.get(pk=self.movie.id)
-            self.assertEqual(m.duration, 123)
+            self.assertRegex(m.hls_playlist.name, rf"^hls/{self.movie.id}/\w+/master.m3u8$")
+            self.assertEqual(list(calls[0]), [360])
+
+            ProcessingStage.objects.filter(movie=m, name="hls").delete()
+            save_hls_package(self.movie.id)
+            rerun = Movie.objects.get(pk=self.movie.id)
+            self.assertNotEqual(rerun.hls_playlist.name, m.hls_playlist.name)
+            self.assert_removal_scheduled(mock_get_queue, os.path.dirname(m.hls_playlist.path))
+            self.assertTrue(os.path.exists(rerun.hls_playlist.path))
+        finally:
+            tasks_module.package_hls = real_package
+
+    def test_packaging_without_renditions_fails_the_stage(self):
+        for name, task in (("hls", save_hls_package), ("dash", save_dash_package)):
+            with self.assertRaises(FileNotFoundError):
+                task(self.movie.id)
+            stage = ProcessingStage.objects.get(movie=self.movie, name=name)
+            self.assertEqual(stage.status, ProcessingStage.Status.FAILED)
+        self.assertFalse(Movie.objects.get(pk=self.movie.id).hls_playlist)
+
+    @mock.patch('movies.tasks.django_rq.get_queue')
+    def test_save_dash_package_writes_new_version_and_removes_old(self, mock_get_queue):
+        self.movie.available_resolutions = [720]
+        self.movie.video_720p.save("vid_720.mp4", ContentFile(b"converted"), save=True)
+        def fake_package(renditions, output_dir, segment_duration):
+            os.makedirs(output_dir, exist_ok=True)
+            manifest = os.path.join(output_dir, "manifest.mpd")
+            with open(manifest, "w") as f:
+                f.write("<MPD/>")
+            return manifest
+        real_package = tasks_module.package_dash
+        try:
+            tasks_module.package_dash = fake_package
+            save_dash_package(self.movie.id)
+            first = Movie.objects.get(pk=self.movie.id).dash_manifest
+            self.assertTrue(first.name.startswith(f"dash/{self.movie.id}/"))
+            save_dash_package(self.movie.id)
+            self.assertEqual(Movie.objects.get(pk=self.movie.id).dash_manifest.name, first.name)
+            # a new pipeline run (new source) resets the stages and repackages
+            ProcessingStage.objects.filter(movie=self.movie).delete()
+            save_dash_package(self.movie.id)
+            second = Movie.objects.get(pk=self.movie.id).dash_manifest
+            self.assertNotEqual(first.name, second.name)
+            self.assert_removal_scheduled(mock_get_queue, os.path.dirname(first.path))
+            self.assertTrue(os.path.exists(second.path))
         finally:
-            tasks_module.get_video_duration = real_get_duration
+            tasks_module.package_dash = real_package
 
     def test_finalize_conversion_deletes_original_and_clears_field(self):
         m = Movie.objects.get(pk=self.movie.id)
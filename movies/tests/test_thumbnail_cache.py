@@ -0,0 +1,49 @@
+import os
+import tempfile
+from django.test import SimpleTestCase
+from PIL import Image
+from movies.utils.thumbnail_cache import ThumbnailCache, thumbnail_version
+
+
+class ThumbnailCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "poster.png")
+        Image.new("RGB", (1000, 500), "blue").save(self.source)
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_miss_resizes_into_place_and_hit_reuses_file(self):
+        cache = ThumbnailCache(self.cache_dir, max_bytes=10 ** 6)
+        path = cache.get(self.source, 320, "webp")
+        with Image.open(path) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (320, 160)))
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(path)])
+
+        os.utime(path, (0, 0))
+        self.assertEqual(cache.get(self.source, 320, "webp"), path)
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_never_upscales(self):
+        path = ThumbnailCache(self.cache_dir, max_bytes=10 ** 6).get(self.source, 1280, "webp")
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (1000, 500))
+
+    def test_evicts_least_recently_served_beyond_max_bytes(self):
+        cache = ThumbnailCache(self.cache_dir, max_bytes=10 ** 6)
+        old = cache.get(self.source, 320, "webp")
+        recent = cache.get(self.source, 640, "webp")
+        os.utime(old, (1, 1))
+        os.utime(recent, (2, 2))
+        cache.max_bytes = os.path.getsize(recent) + 1
+        newest = cache.get(self.source, 100, "webp")
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(newest))
+
+    def test_version_changes_when_the_image_is_replaced(self):
+        version = thumbnail_version(self.source)
+        Image.new("RGB", (800, 400), "red").save(self.source)
+        os.utime(self.source, ns=(0, os.stat(self.source).st_mtime_ns + 1))
+        self.assertNotEqual(thumbnail_version(self.source), version)
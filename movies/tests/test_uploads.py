@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from movies.models import Movie, Upload
+from movies.pipeline import wait_for_upload
+from movies.utils import uploads as uploads_module
+
+User = get_user_model()
+
+
+class UploadViewTest(APITestCase):
+    def setUp(self):
+        self.tmp_media = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.tmp_media)
+        self.override.enable()
+        self.admin = User.objects.create_superuser(email="admin@example.com", password="pw")
+        self.client.force_authenticate(self.admin)
+        self.movie = Movie.objects.create(title="Upload Movie")
+        self.content = os.urandom(3000)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.tmp_media, ignore_errors=True)
+
+    def _create(self, length=None):
+        return self.client.post(
+            reverse("movies:movie-upload-create"),
+            {"movie": self.movie.pk, "filename": "../big movie.mp4"},
+            format="json",
+            HTTP_UPLOAD_LENGTH=str(length or len(self.content)),
+        )
+
+    def _patch(self, url, offset, data):
+        return self.client.generic(
+            "PATCH", url, data,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_create_returns_location_and_zero_offset(self):
+        response = self._create()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["Upload-Offset"], "0")
+        upload = Upload.objects.get()
+        self.assertEqual(response["Location"], reverse("movies:movie-upload", args=[upload.pk]))
+        self.assertTrue(os.path.exists(upload.part_path))
+
+    def test_create_requires_upload_length(self):
+        response = self.client.post(reverse("movies:movie-upload-create"),
+                                    {"movie": self.movie.pk, "filename": "a.mp4"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(UPLOAD_MAX_SIZE=100)
+    def test_create_rejects_too_large_upload(self):
+        self.assertEqual(self._create().status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_non_admin_is_forbidden(self):
+        user = User.objects.create_user(email="user@example.com", password="pw")
+        self.client.force_authenticate(user)
+        self.assertEqual(self._create().status_code, status.HTTP_403_FORBIDDEN)
+
+    @mock.patch("django_rq.get_queue")
+    def test_chunks_resume_and_complete(self, mock_get_queue):
+        url = self._create()["Location"]
+
+        response = self._patch(url, 0, self.content[:1000])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response["Upload-Offset"], "1000")
+
+        head = self.client.head(url)
+        self.assertEqual(head["Upload-Offset"], "1000")
+        self.assertEqual(head["Upload-Length"], "3000")
+
+        # another worker (or a restart) lost the in-memory hash state
+        uploads_module._hashers.clear()
+        self._patch(url, 1000, self.content[1000:2000])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._patch(url, 2000, self.content[2000:])
+        self.assertEqual(response["Upload-Offset"], "3000")
+
+        upload = Upload.objects.get()
+        self.assertIsNotNone(upload.completed_at)
+        self.assertEqual(upload.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertFalse(os.path.exists(upload.part_path))
+
+        movie = Movie.objects.get(pk=self.movie.pk)
+        self.assertEqual(movie.video_file.name, "videos/big_movie.mp4")
+        with open(movie.video_file.path, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertTrue(movie.conversion_started)
+        mock_get_queue.return_value.enqueue.assert_called_once_with(wait_for_upload, movie.pk, movie.video_file.path)
+
+    def test_offset_mismatch_is_conflict(self):
+        url = self._create()["Location"]
+        self._patch(url, 0, self.content[:1000])
+        response = self._patch(url, 500, self.content[500:1500])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response["Upload-Offset"], "1000")
+
+    def test_concurrent_chunk_is_conflict(self):
+        url = self._create()["Location"]
+        upload = Upload.objects.get()
+        with uploads_module.upload_write_lock(upload.pk) as acquired:
+            self.assertTrue(acquired)
+            response = self._patch(url, 0, self.content[:1000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Upload.objects.get().offset, 0)
+        self.assertEqual(self._patch(url, 0, self.content[:1000]).status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_chunk_past_upload_length_is_rejected(self):
+        url = self._create(length=10)["Location"]
+        response = self._patch(url, 0, self.content[:20])
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(Upload.objects.get().offset, 0)
+
+    def test_wrong_content_type_is_rejected(self):
+        url = self._create()["Location"]
+        response = self.client.generic("PATCH", url, self.content, content_type="application/octet-stream",
+                                       HTTP_UPLOAD_OFFSET="0")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_deleting_upload_removes_part_file(self):
+        self._create()
+        upload = Upload.objects.get()
+        upload.delete()
+        self.assertFalse(os.path.exists(upload.part_path))
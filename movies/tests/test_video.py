@@ -1,13 +1,30 @@
+import json
 import os
 import tempfile
 import shutil
 import subprocess
+from unittest import mock
 from django.test import SimpleTestCase, override_settings
 from movies.utils.video import (
     convert_video_to_resolution,
-    generate_thumbnail,
+    convert_video_to_resolutions,
+    plan_resolutions,
+    encoder_args,
+    rendition_encoder_args,
+    run_ffmpeg,
+    split_video_into_chunks,
+    encode_video_chunk,
+    concat_video_chunks,
+    measure_complexity,
+    probe_media,
+    per_title_ladder,
+    extract_frame_previews,
+    write_sprite_vtt,
     get_video_duration,
     cut_video_for_trailer,
+    package_hls,
+    package_dash,
+    add_dash_base_url,
 )
 
 @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
@@ -28,6 +45,15 @@ class VideoUtilsTests(SimpleTestCase):
             shutil.rmtree(root, ignore_errors=True)
         os.remove(self.source_path)
 
+    def fake_encode(self, commands):
+        # records ffmpeg commands and writes their .part outputs like ffmpeg would
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            for arg in cmd:
+                if str(arg).endswith(".part.mp4"):
+                    open(arg, "wb").close()
+        return fake_run
+
     def _get_media_root(self):
         from django.conf import settings
         return settings.MEDIA_ROOT
@@ -42,17 +68,66 @@ class VideoUtilsTests(SimpleTestCase):
         self.assertTrue(path.endswith("_360p.mp4"))
         self.assertTrue(os.path.exists(path))
 
-    def test_generate_thumbnail_creates_file(self):
+    def test_encoder_args_from_profile(self):
+        profile = {"codec": "libx265", "preset": "fast", "crf": 26, "maxrate": "2M", "gop": 48, "threads": 4}
+        self.assertEqual(encoder_args(profile), [
+            "-c:v", "libx265", "-preset", "fast", "-crf", "26",
+            "-maxrate", "2M", "-bufsize", "2M", "-g", "48", "-threads", "4",
+        ])
+
+    @override_settings(
+        VIDEO_ENCODER_PROFILES={"hq": {"preset": "slow", "crf": 20}, "cheap": {"preset": "veryfast", "crf": 25}},
+        VIDEO_DEFAULT_PROFILE="hq",
+        VIDEO_RUNG_PROFILES={120: "cheap"},
+    )
+    def test_rendition_profile_per_rung(self):
+        self.assertEqual(rendition_encoder_args(120)[:6], ["-c:v", "libx264", "-preset", "veryfast", "-crf", "25"])
+        self.assertEqual(rendition_encoder_args(1080)[:6], ["-c:v", "libx264", "-preset", "slow", "-crf", "20"])
+        commands = []
+        self.video_mod.subprocess.run = self.fake_encode(commands)
+        convert_video_to_resolution(self.source_path, 120)
+        self.assertEqual(commands[0][commands[0].index("-preset") + 1], "veryfast")
+
+    def test_extract_frame_previews_writes_poster_and_sprites_in_one_run(self):
+        calls = []
         def fake_run(cmd, **kwargs):
-            target = cmd[-1]
-            os.makedirs(os.path.dirname(target), exist_ok=True)
-            open(target, "wb").close()
+            calls.append(cmd)
+            open(cmd[cmd.index('-frames:v') + 6], "wb").close()
+            open(cmd[-1] % 0, "wb").close()
         self.video_mod.subprocess.run = fake_run
+        sprite_dir = os.path.join(self._get_media_root(), "previews")
         out = os.path.join(self._get_media_root(), "thumb.webp")
-        result = generate_thumbnail(self.source_path, out)
-        self.assertEqual(result, out)
+        os.makedirs(self._get_media_root(), exist_ok=True)
+
+        sprites = extract_frame_previews(self.source_path, out, sprite_dir, poster_time=2.5, interval=10, tile_width=120, grid=5)
+        self.assertEqual(len(calls), 1)
+        cmd = calls[0]
+        filters = cmd[cmd.index('-filter_complex') + 1]
+        self.assertEqual(cmd[cmd.index('-ss') + 1:cmd.index('-ss') + 4], ['2.5', '-i', self.source_path])
+        self.assertEqual(cmd[cmd.index('-skip_frame') + 1:cmd.index('-skip_frame') + 4], ['nokey', '-i', self.source_path])
+        self.assertIn("[1:v]fps=1/10,scale=120:-2,tile=5x5", filters)
+        self.assertNotIn("[1:v]scale='min(1280", filters)
+        self.assertEqual(sprites, [os.path.join(sprite_dir, "sprite_000.jpg")])
         self.assertTrue(os.path.exists(out))
 
+    def test_write_sprite_vtt_maps_times_to_tiles(self):
+        from PIL import Image
+        folder = os.path.join(self._get_media_root(), "previews")
+        os.makedirs(folder, exist_ok=True)
+        sheets = []
+        for index in range(2):
+            sheets.append(os.path.join(folder, f"sprite_{index:03d}.jpg"))
+            Image.new("RGB", (320, 180)).save(sheets[-1])
+
+        vtt_path = write_sprite_vtt(os.path.join(folder, "thumbnails.vtt"), sheets, duration=21, interval=5, grid=2)
+        with open(vtt_path) as vtt:
+            lines = vtt.read().splitlines()
+        self.assertEqual(lines[0], "WEBVTT")
+        self.assertEqual(lines[2:4], ["00:00:00.000 --> 00:00:05.000", "sprite_000.jpg#xywh=0,0,160,90"])
+        self.assertEqual(lines[12], "sprite_000.jpg#xywh=160,90,160,90")
+        self.assertEqual(lines[14:16], ["00:00:20.000 --> 00:00:21.000", "sprite_001.jpg#xywh=0,0,160,90"])
+        self.assertEqual(len([line for line in lines if "-->" in line]), 5)
+
     def test_get_video_duration_parses_stdout(self):
         class Dummy:
             stdout = "12.34\n"
@@ -73,4 +148,336 @@ class VideoUtilsTests(SimpleTestCase):
         out = os.path.join(self._get_media_root(), "trail.mp4")
         result = cut_video_for_trailer(self.source_path, out, duration=5)
         self.assertEqual(result, out)
-        self.assertTrue(os.path.exists(out))
\ No newline at end of file
+        self.assertTrue(os.path.exists(out))
+
+    def test_cut_video_for_trailer_copies_from_keyframe_before_start(self):
+        calls = []
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            if cmd[0] == 'ffprobe':
+                return subprocess.CompletedProcess(cmd, 0, stdout="28.000000,__\n30.000000,K_\n31.000000,__\n", stderr="")
+            os.makedirs(os.path.dirname(cmd[-1]), exist_ok=True)
+            open(cmd[-1], "wb").close()
+        self.video_mod.subprocess.run = fake_run
+
+        out = os.path.join(self._get_media_root(), "trail.mp4")
+        cut_video_for_trailer(self.source_path, out, start=31.5, copy=True)
+        self.assertIn('1.5%31.5', calls[0])
+        ffmpeg = calls[1]
+        self.assertEqual(ffmpeg[ffmpeg.index('-ss') + 1], '30.0')
+        self.assertIn('copy', ffmpeg)
+        self.assertNotIn('-vf', ffmpeg)
+        self.assertEqual(len(calls), 2)
+
+    @override_settings(VIDEO_TRAILER_RESOLUTION=360, VIDEO_TRAILER_PROFILE="fast")
+    def test_cut_video_for_trailer_reencodes_small_if_copy_fails(self):
+        calls = []
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            if '-c' in cmd and 'copy' in cmd:
+                raise subprocess.CalledProcessError(1, cmd)
+            os.makedirs(os.path.dirname(cmd[-1]), exist_ok=True)
+            open(cmd[-1], "wb").close()
+        self.video_mod.subprocess.run = fake_run
+
+        out = os.path.join(self._get_media_root(), "trail.mp4")
+        cut_video_for_trailer(self.source_path, out, copy=True)
+        encode = calls[-1]
+        self.assertEqual(len(calls), 2)
+        self.assertIn("scale='min(640,iw)':'min(360,ih)':force_original_aspect_ratio=decrease:force_divisible_by=2", encode)
+        self.assertEqual(encode[encode.index('-preset') + 1], 'veryfast')
+        self.assertLess(encode.index('-ss'), encode.index('-i'))
+
+    def test_package_hls_writes_master_playlist(self):
+        def fake_run(cmd, **kwargs):
+            if cmd[0] == 'ffprobe':
+                class Dummy:
+                    stdout = "640x360\n"
+                return Dummy()
+            playlist = cmd[-1]
+            folder = os.path.dirname(playlist)
+            with open(os.path.join(folder, "segment_00000.m4s"), "wb") as f:
+                f.write(b"x" * 600)
+            with open(os.path.join(folder, "segment_00001.m4s"), "wb") as f:
+                f.write(b"x" * 150)
+            with open(playlist, "w") as f:
+                f.write("#EXTM3U\n#EXTINF:6.000000,\nsegment_00000.m4s\n#EXTINF:2.000000,\nsegment_00001.m4s\n#EXT-X-ENDLIST\n")
+        self.video_mod.subprocess.run = fake_run
+
+        output_dir = os.path.join(self._get_media_root(), "hls", "1")
+        master = package_hls({360: self.source_path}, output_dir)
+        with open(master) as f:
+            content = f.read()
+        self.assertIn("#EXT-X-STREAM-INF:BANDWIDTH=800,AVERAGE-BANDWIDTH=750,RESOLUTION=640x360", content)
+        self.assertIn("360p/index.m3u8", content)
+
+    def test_convert_video_to_resolution_forces_aligned_keyframes(self):
+        commands = []
+        self.video_mod.subprocess.run = self.fake_encode(commands)
+        convert_video_to_resolution(self.source_path, 720)
+        self.assertIn("-force_key_frames", commands[0])
+
+    def test_package_dash_maps_all_renditions(self):
+        commands = []
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            class Dummy:
+                stdout = "1\n"
+            return Dummy()
+        self.video_mod.subprocess.run = fake_run
+
+        output_dir = os.path.join(self._get_media_root(), "dash", "1", "v1")
+        manifest = package_dash({720: "/r/720.mp4", 360: "/r/360.mp4"}, output_dir)
+        self.assertEqual(manifest, os.path.join(output_dir, "manifest.mpd"))
+        ffmpeg = commands[-1]
+        self.assertEqual(ffmpeg[ffmpeg.index("-f") + 1], "dash")
+        self.assertEqual([ffmpeg[i + 1] for i, arg in enumerate(ffmpeg) if arg == "-i"], ["/r/360.mp4", "/r/720.mp4"])
+        self.assertIn("1:a:0", ffmpeg)
+        self.assertEqual(ffmpeg[ffmpeg.index("-adaptation_sets") + 1], "id=0,streams=v id=1,streams=a")
+
+    def test_add_dash_base_url(self):
+        manifest = '<?xml version="1.0"?>\n<MPD xmlns="urn:mpeg:dash:schema:mpd:2011">\n\t<Period/>\n</MPD>\n'
+        result = add_dash_base_url(manifest, "https://cdn.example.com/media/dash/1/v1/?a=1&b=2")
+        self.assertIn(
+            '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011">\n\t<BaseURL>https://cdn.example.com/media/dash/1/v1/?a=1&amp;b=2</BaseURL>',
+            result,
+        )
+
+    def test_split_video_into_chunks_cuts_at_keyframes_without_reencoding(self):
+        chunk_dir = os.path.join(self._get_media_root(), "chunks", "1")
+        commands = []
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            for index in (1, 0):
+                open(os.path.join(chunk_dir, f"chunk_{index:05d}.mp4"), "wb").close()
+        self.video_mod.subprocess.run = fake_run
+
+        chunks = split_video_into_chunks(self.source_path, chunk_dir, chunk_duration=30)
+        cmd = commands[0]
+        self.assertEqual(cmd[cmd.index("-c") + 1], "copy")
+        self.assertEqual(cmd[cmd.index("-f") + 1], "segment")
+        self.assertEqual(cmd[cmd.index("-segment_time") + 1], "30")
+        self.assertEqual([os.path.basename(c) for c in chunks], ["chunk_00000.mp4", "chunk_00001.mp4"])
+
+    def test_encode_video_chunk_writes_one_file_per_resolution(self):
+        chunk_dir = os.path.join(self._get_media_root(), "chunks", "1")
+        os.makedirs(chunk_dir, exist_ok=True)
+        commands = []
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            for arg in cmd:
+                if arg.endswith(".part.mp4"):
+                    open(arg, "wb").close()
+        self.video_mod.subprocess.run = fake_run
+
+        paths = encode_video_chunk(os.path.join(chunk_dir, "chunk_00003.mp4"), [720, 120])
+        self.assertEqual(paths[120], os.path.join(chunk_dir, "120p", "chunk_00003.mp4"))
+        self.assertEqual(commands[0][-1], f"{paths[720]}.part.mp4")
+        self.assertEqual(commands[0].count("-an"), 2)
+        self.assertTrue(os.path.exists(paths[720]))
+        self.assertFalse(os.path.exists(commands[0][-1]))
+
+    def test_concat_video_chunks_copies_video_and_adds_source_audio(self):
+        target = os.path.join(self._get_media_root(), "joined.mp4")
+        os.makedirs(self._get_media_root(), exist_ok=True)
+        lists = []
+        def fake_run(cmd, **kwargs):
+            with open(cmd[cmd.index("-i") + 1]) as f:
+                lists.append(f.read())
+            self.assertEqual(cmd[cmd.index("-c:v") + 1], "copy")
+            self.assertIn(self.source_path, cmd)
+            self.assertEqual(cmd[-1], f"{target}.part.mp4")
+            self.assertFalse(os.path.exists(target))
+            with open(cmd[-1], "wb") as f:
+                f.write(b"joined")
+        self.video_mod.subprocess.run = fake_run
+
+        concat_video_chunks(["/c/a.mp4", "/c/it's.mp4"], self.source_path, target)
+        self.assertEqual(lists[0], "file '/c/a.mp4'\nfile '/c/it'\\''s.mp4'\n")
+        self.assertFalse(os.path.exists(f"{target}.txt"))
+        self.assertFalse(os.path.exists(f"{target}.part.mp4"))
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"joined")
+
+    def test_failed_concat_leaves_no_target(self):
+        target = os.path.join(self._get_media_root(), "joined.mp4")
+        os.makedirs(self._get_media_root(), exist_ok=True)
+        def fake_run(cmd, **kwargs):
+            with open(cmd[-1], "wb") as f:
+                f.write(b"trunc")
+            raise subprocess.CalledProcessError(1, cmd)
+        self.video_mod.subprocess.run = fake_run
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            concat_video_chunks(["/c/a.mp4"], self.source_path, target)
+        self.assertFalse(os.path.exists(target))
+
+    def test_run_ffmpeg_reports_progress(self):
+        class FakePopen:
+            returncode = 0
+            def __init__(self, cmd, **kwargs):
+                self.cmd = cmd
+                self.stdout = iter(["frame=1\n", "out_time_us=N/A\n", "out_time_us=2500000\n", "progress=continue\n", "out_time_us=10000000\n"])
+                popens.append(self)
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                return False
+        popens = []
+        reported = []
+        with mock.patch.object(self.video_mod, "get_video_duration", return_value=10.0), \
+                mock.patch.object(self.video_mod.subprocess, "Popen", FakePopen):
+            run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], reported.append, "in.mp4")
+        self.assertEqual(popens[0].cmd[:4], ["ffmpeg", "-progress", "pipe:1", "-nostats"])
+        self.assertEqual(reported, [25.0, 100.0])
+
+    def test_run_ffmpeg_raises_on_failure(self):
+        class FakePopen:
+            returncode = 1
+            stdout = iter([])
+            def __init__(self, cmd, **kwargs):
+                pass
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                return False
+        with mock.patch.object(self.video_mod, "get_video_duration", return_value=10.0), \
+                mock.patch.object(self.video_mod.subprocess, "Popen", FakePopen):
+            with self.assertRaises(subprocess.CalledProcessError):
+                run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], lambda percent: None, "in.mp4")
+
+    @mock.patch('movies.utils.video.get_video_duration', return_value=100.0)
+    def test_measure_complexity_samples_across_the_video(self, mock_duration):
+        commands = []
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            with open(cmd[-1], "wb") as f:
+                f.write(b"x" * 1000)
+        self.video_mod.subprocess.run = fake_run
+
+        kbps = measure_complexity(self.source_path, samples=4, sample_duration=4)
+        self.assertEqual([cmd[cmd.index("-ss") + 1] for cmd in commands], ["10.500", "35.500", "60.500", "85.500"])
+        self.assertEqual(kbps, 2.0)
+
+    @override_settings(
+        VIDEO_ENCODER_PROFILES={"balanced": {"crf": 23}},
+        VIDEO_DEFAULT_PROFILE="balanced",
+        VIDEO_RUNG_PROFILES={},
+    )
+    def test_per_title_ladder_follows_complexity(self):
+        simple = per_title_ladder(120.0, [360, 1080])
+        self.assertEqual(simple["rungs"]["1080"], {"crf": 27, "maxrate": "3250k", "bufsize": "6500k"})
+        self.assertEqual(simple["rungs"]["360"]["maxrate"], "500k")
+        complex_ = per_title_ladder(4000.0, [1080])
+        self.assertEqual(complex_["rungs"]["1080"], {"crf": 22, "maxrate": "8125k", "bufsize": "16250k"})
+        commands = []
+        self.video_mod.subprocess.run = self.fake_encode(commands)
+        convert_video_to_resolution(self.source_path, 1080, encoding=simple["rungs"]["1080"])
+        cmd = commands[0]
+        self.assertEqual(cmd[cmd.index("-crf") + 1], "27")
+        self.assertEqual(cmd[cmd.index("-maxrate") + 1], "3250k")
+
+    def test_renditions_are_capped_at_rung_maxrate(self):
+        args = rendition_encoder_args(360)
+        self.assertEqual(args[args.index("-maxrate") + 1], "1000k")
+        self.assertEqual(args[args.index("-bufsize") + 1], "2000k")
+        self.assertIn("-crf", args)
+        with self.settings(VIDEO_RATE_CONTROL="crf"):
+            self.assertNotIn("-maxrate", rendition_encoder_args(360))
+
+    @override_settings(VIDEO_RATE_CONTROL="crf")
+    def test_crf_mode_drops_per_title_caps(self):
+        args = rendition_encoder_args(1080, encoding={"crf": 22, "maxrate": "8125k", "bufsize": "16250k"})
+        self.assertEqual(args[args.index("-crf") + 1], "22")
+        self.assertNotIn("-maxrate", args)
+        self.assertNotIn("-bufsize", args)
+
+    @override_settings(VIDEO_RATE_CONTROL="two_pass")
+    def test_two_pass_encode(self):
+        commands = []
+        self.video_mod.subprocess.run = self.fake_encode(commands)
+
+        path = convert_video_to_resolution(self.source_path, 720)
+        self.assertEqual(len(commands), 2)
+        first, second = commands
+        self.assertEqual(first[first.index("-pass") + 1], "1")
+        self.assertEqual(first[-1], os.devnull)
+        self.assertEqual(second[second.index("-pass") + 1], "2")
+        self.assertEqual(second[-1], f"{path}.part.mp4")
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(first[first.index("-passlogfile") + 1], second[second.index("-passlogfile") + 1])
+        self.assertNotIn("-crf", second)
+        self.assertEqual(second[second.index("-b:v") + 1], "2450k")
+        self.assertEqual(second[second.index("-maxrate") + 1], "3500k")
+
+    def test_probe_media_streams_video_packets_in_a_second_pass(self):
+        probe = {
+            "streams": [
+                {"index": 0, "codec_type": "video", "codec_name": "h264", "width": 1280, "height": 720,
+                 "avg_frame_rate": "30000/1001"},
+                {"index": 1, "codec_type": "audio", "codec_name": "aac", "channels": 2, "sample_rate": "48000",
+                 "tags": {"language": "deu"}},
+            ],
+            "format": {"duration": "2.002000", "bit_rate": "650000", "size": "162662"},
+        }
+        commands = []
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps(probe))
+        self.video_mod.subprocess.run = fake_run
+
+        class FakePopen:
+            returncode = 0
+            def __init__(self, cmd, **kwargs):
+                commands.append(cmd)
+                self.stdout = iter(["0.000000,50000,K__\n", "0.500000,25000,___\n",
+                                    "1.000000,25000,K__\n", "N/A,999,___\n"])
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                return False
+
+        with mock.patch.object(self.video_mod.subprocess, "Popen", FakePopen):
+            metadata = probe_media(self.source_path, packets=True)
+        self.assertEqual(len(commands), 2)
+        self.assertNotIn("-show_entries", commands[0])
+        self.assertEqual(commands[1][commands[1].index("-select_streams") + 1], "v:0")
+        self.assertEqual(commands[1][commands[1].index("-of") + 1], "csv=p=0")
+        self.assertEqual(metadata["duration_ms"], 2002)
+        self.assertEqual((metadata["video_codec"], metadata["width"], metadata["height"]), ("h264", 1280, 720))
+        self.assertEqual(metadata["frame_rate"], 29.97)
+        self.assertEqual((metadata["bitrate"], metadata["size"]), (650, 162662))
+        self.assertEqual(metadata["audio_tracks"], [{"codec": "aac", "channels": 2, "sample_rate": 48000, "language": "deu"}])
+        self.assertEqual((metadata["video_bitrate"], metadata["peak_bitrate"]), (400, 600))
+        self.assertEqual(metadata["keyframe_interval"], 1.0)
+
+    def test_plan_resolutions_never_upscales(self):
+        self.assertEqual(plan_resolutions(1080), [120, 360, 720, 1080])
+        self.assertEqual(plan_resolutions(720), [120, 360, 720])
+        self.assertEqual(plan_resolutions(480), [120, 360])
+        self.assertEqual(plan_resolutions(90), [120])
+
+    def test_plan_resolutions_keeps_top_rung_of_letterboxed_source(self):
+        self.assertEqual(plan_resolutions(800, 1920), [120, 360, 720, 1080])
+        self.assertEqual(plan_resolutions(536, 1280), [120, 360, 720])
+        self.assertEqual(plan_resolutions(1080, 1440), [120, 360, 720, 1080])
+        self.assertEqual(plan_resolutions(480, 640), [120, 360])
+
+    def test_convert_video_to_resolutions_decodes_once(self):
+        commands = []
+        self.video_mod.subprocess.run = self.fake_encode(commands)
+
+        paths = convert_video_to_resolutions(self.source_path, [720, 120])
+        self.assertEqual(len(commands), 1)
+        cmd = commands[0]
+        self.assertEqual(cmd.count("-i"), 1)
+        self.assertEqual(
+            cmd[cmd.index("-filter_complex") + 1],
+            "[0:v]split=2[v0][v1];"
+            "[v0]scale='min(214,iw)':'min(120,ih)':force_original_aspect_ratio=decrease:force_divisible_by=2[out0];"
+            "[v1]scale='min(1280,iw)':'min(720,ih)':force_original_aspect_ratio=decrease:force_divisible_by=2[out1]",
+        )
+        self.assertEqual(sorted(paths), [120, 720])
+        self.assertTrue(paths[720].endswith("_720p.mp4"))
+        self.assertEqual(cmd[-1], f"{paths[720]}.part.mp4")
+        self.assertIn(f"{paths[120]}.part.mp4", cmd)
@@ -1,9 +1,20 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
-from movies.models import Movie, Category, MovieProgress
+from movies.models import Movie, Category, MovieProgress, ProcessingStage
+from movies.utils.thumbnail_cache import thumbnail_version
+from movies.views import AsyncMovieStreamView, MovieStreamView
+from PIL import Image
 
 User = get_user_model()
 
@@ -100,3 +111,269 @@ class MovieViewsTest(APITestCase):
             'page': 1,
             'page_size': 5
         }, expected_len=0, expect_next=False)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MovieStreamViewTest(APITestCase):
+    def setUp(self):
+        self.content = b'0123456789'
+        self.movie = Movie.objects.create(title='Streamable', available_resolutions=[120, 360])
+        self.movie.video_360p.save('stream_360p.mp4', ContentFile(self.content), save=True)
+        self.url = f'/movies/{self.movie.pk}/stream/'
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_stream_range_request(self):
+        response = self.client.get(self.url, {'resolution': '360'}, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.content[:4])
+
+    def test_stream_unknown_resolution(self):
+        response = self.client.get(self.url, {'resolution': '720'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stream_skips_rungs_outside_the_plan(self):
+        self.movie.video_720p.save('stale_720p.mp4', ContentFile(self.content), save=True)
+        response = self.client.get(self.url, {'resolution': '720'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(VIDEO_STREAM_OFFLOAD='nginx', VIDEO_STREAM_OFFLOAD_PREFIX='/protected-media/')
+    def test_stream_offloaded_to_nginx(self):
+        response = self.client.get(self.url, {'resolution': '360'}, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.movie.video_360p.name}')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+
+    def test_stream_sends_validators_and_revalidates(self):
+        response = self.client.get(self.url, {'resolution': '360'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], settings.VIDEO_STREAM_CACHE_CONTROL)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+        etag = response['ETag']
+        response.close()
+        response = self.client.get(self.url, {'resolution': '360'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_trailer_stream(self):
+        self.movie.trailer.save('stream_trailer.mp4', ContentFile(b'trailer'), save=True)
+        response = self.client.get(f'/movies/{self.movie.pk}/trailer/', HTTP_RANGE='bytes=-4')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'iler')
+
+    def test_cache_stats_requires_admin(self):
+        response = self.client.get('/movies/stream/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_stats_for_admin(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='pass')
+        self.client.force_authenticate(admin)
+        response = self.client.get('/movies/stream/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for key in ('pid', 'hits', 'misses', 'evictions', 'entries'):
+            self.assertIn(key, response.json())
+
+    def test_trailer_stream_missing(self):
+        response = self.client.get(f'/movies/{self.movie.pk}/trailer/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+#  TransactionTestCase: the checks run in a pool thread with its own connection, which must see the movie.
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AsyncMovieStreamViewTest(TransactionTestCase):
+    def setUp(self):
+        self.content = b'0123456789'
+        self.movie = Movie.objects.create(title='Async Streamable', available_resolutions=[120, 360])
+        self.movie.video_360p.save('async_360p.mp4', ContentFile(self.content), save=True)
+        self.url = f'/movies/{self.movie.pk}/stream/async/'
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    async def _read(self, response):
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    async def test_async_stream_range_request(self):
+        response = await self.async_client.get(self.url, {'resolution': '360'}, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertTrue(response.is_async)
+        self.assertEqual(await self._read(response), self.content[2:6])
+
+    async def test_async_stream_full_content(self):
+        response = await self.async_client.get(self.url, {'resolution': '360'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(await self._read(response), self.content)
+
+    async def test_async_stream_uses_the_stream_view_headers(self):
+        class WebmStreamView(MovieStreamView):
+            def get_content_type(self, name):
+                return 'video/webm'
+
+            def get_cache_control(self, name):
+                return 'no-store'
+
+        with mock.patch.object(AsyncMovieStreamView, 'stream_view_class', WebmStreamView):
+            response = await self.async_client.get(self.url, {'resolution': '360'})
+        self.assertEqual(response['Content-Type'], 'video/webm')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        await self._read(response)
+
+    async def test_async_stream_unknown_resolution(self):
+        response = await self.async_client.get(self.url, {'resolution': '720'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), {'detail': 'Resolution not available'})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MovieHlsViewTest(APITestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Adaptive')
+        folder = os.path.join(settings.MEDIA_ROOT, 'hls', str(self.movie.pk), 'v1', '360p')
+        os.makedirs(folder)
+        with open(os.path.join(folder, '..', 'master.m3u8'), 'w') as f:
+            f.write('#EXTM3U\n360p/index.m3u8\n')
+        with open(os.path.join(folder, 'segment_00000.m4s'), 'wb') as f:
+            f.write(b'segmentdata')
+        with open(os.path.join(settings.MEDIA_ROOT, 'secret.mp4'), 'wb') as f:
+            f.write(b'secret')
+        self.movie.hls_playlist = f'hls/{self.movie.pk}/v1/master.m3u8'
+        self.movie.save()
+        self.base = f'/movies/{self.movie.pk}/hls/v1/'
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_master_playlist(self):
+        response = self.client.get(self.base + 'master.m3u8')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.apple.mpegurl')
+        self.assertEqual(response['Cache-Control'], settings.VIDEO_STREAM_CACHE_CONTROL)
+        self.assertEqual(b''.join(response.streaming_content), b'#EXTM3U\n360p/index.m3u8\n')
+
+    def test_segment_with_range(self):
+        response = self.client.get(self.base + '360p/segment_00000.m4s', HTTP_RANGE='bytes=0-6')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Type'], 'video/iso.segment')
+        self.assertEqual(response['Cache-Control'], settings.SEGMENT_CACHE_CONTROL)
+        self.assertEqual(b''.join(response.streaming_content), b'segment')
+
+    def test_path_traversal_is_rejected(self):
+        response = self.client.get(self.base + '../../../secret.mp4')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing_segment(self):
+        response = self.client.get(self.base + '360p/segment_09999.m4s')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_not_packaged(self):
+        other = Movie.objects.create(title='Plain')
+        response = self.client.get(f'/movies/{other.pk}/hls/v1/master.m3u8')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAIL_CACHE_DIR=tempfile.mkdtemp(),
+                   THUMBNAIL_WIDTHS=[320, 640], THUMBNAIL_FORMATS=['webp'])
+class MovieThumbnailViewTest(APITestCase):
+    def setUp(self):
+        image = io.BytesIO()
+        Image.new('RGB', (1200, 675), 'green').save(image, format='PNG')
+        self.movie = Movie.objects.create(title='Poster')
+        self.movie.thumbnail.save('poster.png', ContentFile(image.getvalue()), save=True)
+        self.version = thumbnail_version(self.movie.thumbnail.path)
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(settings.THUMBNAIL_CACHE_DIR, ignore_errors=True)
+
+    def test_resized_thumbnail_is_cached_and_immutable(self):
+        url = f'/movies/{self.movie.pk}/thumbnail/{self.version}/320.webp'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (320, 180))
+        self.assertEqual(len(os.listdir(settings.THUMBNAIL_CACHE_DIR)), 1)
+
+    def test_stale_version_redirects_to_current(self):
+        response = self.client.get(f'/movies/{self.movie.pk}/thumbnail/old/640.webp')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response['Location'], f'/movies/{self.movie.pk}/thumbnail/{self.version}/640.webp')
+
+    def test_sizes_outside_whitelist_are_rejected(self):
+        for name in ('333.webp', '320.gif'):
+            response = self.client.get(f'/movies/{self.movie.pk}/thumbnail/{self.version}/{name}')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_movie_without_thumbnail(self):
+        other = Movie.objects.create(title='Plain')
+        response = self.client.get(f'/movies/{other.pk}/thumbnail/{self.version}/320.webp')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DASH_SEGMENT_BASE_URL='')
+class MovieDashViewTest(APITestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Dash')
+        folder = os.path.join(settings.MEDIA_ROOT, 'dash', str(self.movie.pk), 'v1')
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'manifest.mpd'), 'w') as f:
+            f.write('<MPD xmlns="urn:mpeg:dash:schema:mpd:2011"><Period/></MPD>')
+        with open(os.path.join(folder, 'chunk-0-00001.m4s'), 'wb') as f:
+            f.write(b'chunk')
+        self.movie.dash_manifest = f'dash/{self.movie.pk}/v1/manifest.mpd'
+        self.movie.save()
+        self.base = f'/movies/{self.movie.pk}/dash/'
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_manifest(self):
+        response = self.client.get(self.base + 'v1/manifest.mpd')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/dash+xml')
+        self.assertEqual(response['Cache-Control'], settings.VIDEO_STREAM_CACHE_CONTROL)
+        response.close()
+
+    def test_segment_is_immutable(self):
+        response = self.client.get(self.base + 'v1/chunk-0-00001.m4s')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], settings.SEGMENT_CACHE_CONTROL)
+        self.assertEqual(b''.join(response.streaming_content), b'chunk')
+
+    def test_manifest_points_at_segment_origin(self):
+        with self.settings(DASH_SEGMENT_BASE_URL='https://cdn.example.com/media/'):
+            response = self.client.get(self.base + 'v1/manifest.mpd')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            f'<BaseURL>https://cdn.example.com/media/dash/{self.movie.pk}/v1/</BaseURL>',
+            response.content.decode(),
+        )
+
+    def test_other_movie_is_rejected(self):
+        response = self.client.get(self.base + '../../1/v1/manifest.mpd')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MovieStatusViewTest(APITestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Status')
+        ProcessingStage.objects.create(movie=self.movie, name='thumbnail', status=ProcessingStage.Status.FINISHED, percent=100, exit_code=0)
+        ProcessingStage.objects.create(movie=self.movie, name='720p', status=ProcessingStage.Status.RUNNING, percent=42.5)
+        self.url = f'/movies/{self.movie.pk}/status/'
+
+    def test_admin_sees_stages(self):
+        admin = User.objects.create_superuser(email='ops@example.com', password='pw')
+        self.client.force_authenticate(admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(s['name'], s['status'], s['percent']) for s in response.data['stages']],
+            [('thumbnail', 'finished', 100), ('720p', 'running', 42.5)],
+        )
+
+    def test_regular_user_is_forbidden(self):
+        user = User.objects.create_user(email='viewer@example.com', password='pw')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
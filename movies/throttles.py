@@ -1,4 +1,12 @@
 from rest_framework.throttling import UserRateThrottle
 
 class VideoStreamRateThrottle(UserRateThrottle):
-    scope = 'video_stream'
\ No newline at end of file
+    scope = 'video_stream'
+
+
+class VideoSegmentRateThrottle(UserRateThrottle):
+    scope = 'video_segment'
+
+
+class ThumbnailRateThrottle(UserRateThrottle):
+    scope = 'thumbnail'
@@ -9,6 +9,15 @@ urlpatterns = [
     path('load-more/', views.LoadMoreMoviesAPIView.as_view(), name='load-more-movies'),
     path("<int:pk>/", views.MovieDetailAPIView.as_view(), name="movie-detail"),
     path("<int:pk>/stream/", views.MovieStreamView.as_view(), name="movie-stream"),
+    path("<int:pk>/stream/async/", views.AsyncMovieStreamView.as_view(), name="movie-stream-async"),
+    path("<int:pk>/hls/<path:name>", views.MovieHlsView.as_view(), name="movie-hls"),
+    path("<int:pk>/dash/<path:name>", views.MovieDashView.as_view(), name="movie-dash"),
+    path("<int:pk>/status/", views.MovieStatusView.as_view(), name="movie-status"),
+    path("<int:pk>/thumbnail/<str:version>/<int:width>.<str:fmt>", views.MovieThumbnailView.as_view(), name="movie-thumbnail"),
+    path("<int:pk>/trailer/", views.MovieTrailerStreamView.as_view(), name="movie-trailer-stream"),
+    path("uploads/", views.UploadCreateView.as_view(), name="movie-upload-create"),
+    path("uploads/<uuid:pk>/", views.UploadView.as_view(), name="movie-upload"),
+    path("stream/cache-stats/", views.MediaFileCacheStatsView.as_view(), name="stream-cache-stats"),
     path('progress/update/', views.UpdateProgressAPIView.as_view(), name='update-progress'),
    
 ]
\ No newline at end of file
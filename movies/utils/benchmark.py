@@ -0,0 +1,96 @@
+import os
+import re
+import resource
+import subprocess
+import time
+
+from movies.utils.video import encoder_args, scale_filter
+
+SSIM_RE = re.compile(r'SSIM .*All:([\d.]+)')
+PSNR_RE = re.compile(r'PSNR .*average:([\d.]+|inf)')
+
+
+def add_source_arguments(parser):
+    """
+    Options of the benchmark commands that choose the source clip.
+    """
+    parser.add_argument('--duration', type=int, default=30, help="Length of the synthetic source in seconds.")
+    parser.add_argument('--size', default='1920x1080', help="Frame size of the synthetic source.")
+    parser.add_argument('--source', help="Use an existing video instead of the synthetic source.")
+
+
+def create_test_source(workdir, duration, size):
+    """
+    Writes a synthetic lavfi source (testsrc2 + sine) to workdir and
+    returns its path.
+    """
+    path = os.path.join(workdir, 'source.mp4')
+    command = [
+        'ffmpeg', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=25',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+        '-t', str(duration),
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+        '-c:a', 'aac',
+        path
+    ]
+    subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+    return path
+
+
+def measure(run):
+    """
+    Calls run() and returns (wall seconds, CPU-seconds of the child
+    processes that finished meanwhile, i.e. of ffmpeg).
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    run()
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return wall, cpu
+
+
+def encode_rung(source, output, resolution, profile):
+    """
+    Encodes the video of source at one rung with one encoder profile, no audio.
+    """
+    command = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-i', source,
+        '-vf', scale_filter(resolution),
+        *encoder_args(profile),
+        '-an',
+        output
+    ]
+    subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+
+
+def measure_quality(output, source, resolution):
+    """
+    Returns (SSIM, PSNR in dB) of an encode against the source scaled to
+    the same rung.
+    """
+    command = [
+        'ffmpeg', '-hide_banner', '-nostats',
+        '-i', output, '-i', source,
+        '-lavfi', (
+            f"[1:v]{scale_filter(resolution)},split=2[ref0][ref1];"
+            "[0:v]split=2[out0][out1];"
+            "[out0][ref0]ssim;[out1][ref1]psnr"
+        ),
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    return parse_quality(result.stderr)
+
+
+def parse_quality(log):
+    """
+    Reads SSIM and PSNR from the ffmpeg log of measure_quality; a missing
+    value is NaN (SSIM) or "?" (PSNR, which may also be "inf").
+    """
+    ssim = SSIM_RE.search(log)
+    psnr = PSNR_RE.search(log)
+    return float(ssim.group(1)) if ssim else float('nan'), psnr.group(1) if psnr else '?'
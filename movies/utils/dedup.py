@@ -0,0 +1,37 @@
+import os
+import shutil
+from django.core.files.storage import default_storage
+
+
+def link_media_file(path, name):
+    """
+    Hard-links the file at path to a free storage name derived from name,
+    so two movies share the bytes but not the name (deleting one movie
+    leaves the other's file intact). Copies the file if it can't be linked,
+    e.g. across file systems. Returns the new storage name.
+    """
+    name = default_storage.get_available_name(name)
+    target_path = default_storage.path(name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    try:
+        os.link(path, target_path)
+    except OSError:
+        shutil.copy2(path, target_path)
+    return name
+
+
+def link_media_tree(source_dir, target_dir):
+    """
+    Recreates source_dir (e.g. an HLS or DASH package) in target_dir with
+    hard links to every file, copying where linking fails. An existing
+    target_dir is replaced.
+    """
+    shutil.rmtree(target_dir, ignore_errors=True)
+    for root, _, files in os.walk(source_dir):
+        folder = os.path.join(target_dir, os.path.relpath(root, source_dir))
+        os.makedirs(folder, exist_ok=True)
+        for name in files:
+            try:
+                os.link(os.path.join(root, name), os.path.join(folder, name))
+            except OSError:
+                shutil.copy2(os.path.join(root, name), os.path.join(folder, name))
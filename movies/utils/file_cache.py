@@ -0,0 +1,161 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+class CachedMediaFile(io.FileIO):
+    """
+    Unbuffered read-only file on a descriptor borrowed from a MediaFileCache.
+    close() hands the descriptor back to the cache instead of closing it.
+    """
+
+    def __init__(self, fd, cache, entry):
+        super().__init__(fd, 'rb', closefd=False)
+        self._cache = cache
+        self._entry = entry
+
+    def close(self):
+        if self.closed:
+            return
+        fd = self.fileno()
+        super().close()
+        self._cache._release(self._entry, fd)
+
+
+def same_file(stat, other):
+    """
+    True if both stat results describe the same, unchanged file.
+    """
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns) == (other.st_ino, other.st_size, other.st_mtime_ns)
+
+
+class _Entry:
+    def __init__(self, path, stat):
+        self.path = path
+        self.stat = stat
+        self.created = time.monotonic()
+        self.idle_fds = []
+
+
+class MediaFileCache:
+    """
+    Bounded per-process LRU cache of read-only descriptors and stat results
+    for media files, keyed by absolute path.
+    - open() returns (file, stat); closing the file returns its descriptor
+      to a small per-path pool, so concurrent requests never share a file offset.
+    - Entries expire after `ttl` seconds, which bounds staleness for files
+      rewritten or deleted by other processes (e.g. RQ workers).
+    - invalidate() drops an entry at once; descriptors still in use are
+      closed instead of being pooled when they come back. It only reaches
+      the calling process, so the RQ tasks that replace renditions don't
+      call it: across processes the ttl and the stat check below are the
+      only guarantee. Until an entry expires, a pooled descriptor keeps
+      serving the old file with its matching stat. Outputs are swapped
+      in with os.replace, so that is the complete previous version.
+    - A hit without an idle descriptor opens the path again; if that file
+      differs from the cached stat (inode, size or mtime), the entry is
+      replaced, so a new descriptor is never paired with an old stat.
+    - hits, misses and evictions are counted for sizing the cache.
+    A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize=128, ttl=30, max_idle_fds=4):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_idle_fds = max_idle_fds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        """
+        Returns an open read-only file and the os.stat_result for `path`.
+        The caller must close the file.
+        """
+        if self.maxsize <= 0:
+            f = open(path, 'rb', buffering=0)
+            return f, os.fstat(f.fileno())
+
+        fd = None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and time.monotonic() - entry.created < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(path)
+                if entry.idle_fds:
+                    fd = entry.idle_fds.pop()
+            else:
+                self.misses += 1
+                if entry is not None:
+                    self._discard(path)
+                entry = None
+
+        if entry is None:
+            fd = os.open(path, os.O_RDONLY)
+            entry = _Entry(path, os.fstat(fd))
+            self._store(entry)
+        elif fd is None:
+            fd = os.open(path, os.O_RDONLY)
+            stat = os.fstat(fd)
+            if not same_file(stat, entry.stat):
+                entry = _Entry(path, stat)
+                self._store(entry)
+        return CachedMediaFile(fd, self, entry), entry.stat
+
+    def invalidate(self, path):
+        """
+        Forgets everything cached for `path`, e.g. after it was rewritten or deleted.
+        """
+        with self._lock:
+            self._discard(path)
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._entries):
+                self._discard(path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "idle_fds": sum(len(entry.idle_fds) for entry in self._entries.values()),
+            }
+
+    def _store(self, entry):
+        with self._lock:
+            self._discard(entry.path)
+            self._entries[entry.path] = entry
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def _discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        for fd in entry.idle_fds:
+            os.close(fd)
+        entry.idle_fds = []
+
+    def _release(self, entry, fd):
+        with self._lock:
+            if self._entries.get(entry.path) is entry and len(entry.idle_fds) < self.max_idle_fds:
+                entry.idle_fds.append(fd)
+                return
+        os.close(fd)
+
+
+media_file_cache = MediaFileCache(
+    maxsize=getattr(settings, 'MEDIA_FILE_CACHE_SIZE', 128),
+    ttl=getattr(settings, 'MEDIA_FILE_CACHE_TTL', 30),
+)
@@ -0,0 +1,65 @@
+import os
+from PIL import Image, features
+
+#  Pillow save options per output format of the thumbnail variants.
+FORMAT_OPTIONS = {
+    "avif": {"quality": 55, "speed": 6},
+    "webp": {"quality": 80, "method": 4},
+}
+
+
+def supported_formats(formats):
+    """
+    The formats of the list this Pillow build can write, e.g. "avif" only
+    with Pillow 11.2+ built against libavif.
+    """
+    return [name for name in formats if name in features.modules and features.check(name)]
+
+
+def plan_widths(image_width, widths):
+    """
+    Returns the widths at or below the image width, so nothing is
+    upscaled; a narrower image gets one variant at its own width.
+    """
+    return [width for width in sorted(widths) if width <= image_width] or [image_width]
+
+
+def scale_to_width(image, width):
+    """
+    The image scaled to `width` with its aspect ratio kept.
+    """
+    if width == image.width:
+        return image
+    height = max(round(image.height * width / image.width), 1)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def write_resized_image(image_path, output_path, width, name):
+    """
+    Saves the image scaled down to `width` (never up) in format `name`
+    (e.g. "webp") to output_path.
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        resized = scale_to_width(image, min(width, image.width))
+        resized.save(output_path, format=name.upper(), **FORMAT_OPTIONS.get(name, {}))
+    return output_path
+
+
+def write_image_variants(image_path, output_dir, widths, formats):
+    """
+    Scales the image to every width (keeping the aspect ratio) and saves
+    each size in every supported format as output_dir/thumb_<width>.<format>.
+    Returns {format: {width: path}}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    variants = {}
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        for width in plan_widths(image.width, widths):
+            resized = scale_to_width(image, width)
+            for name in supported_formats(formats):
+                path = os.path.join(output_dir, f"thumb_{width}.{name}")
+                resized.save(path, format=name.upper(), **FORMAT_OPTIONS.get(name, {}))
+                variants.setdefault(name, {})[width] = path
+    return variants
@@ -1,65 +1,298 @@
+import asyncio
 import os
 import re
-from django.http import StreamingHttpResponse, FileResponse
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from movies.utils.file_cache import media_file_cache
+
+
+class RangeFileWrapper:
+    """
+    File-like view on the byte range [start, end] of an open binary file.
+    Exposes fileno() so WSGI servers that support wsgi.file_wrapper
+    (e.g. gunicorn) can hand the range to os.sendfile, bounded by the
+    Content-Length header. When iterated in Python instead, read() never
+    returns bytes past the end of the range.
+    """
+
+    def __init__(self, filelike, start, end, blksize=8192):
+        self.filelike = filelike
+        self.end = end
+        self.blksize = blksize
+        self.filelike.seek(start)
+
+    def fileno(self):
+        return self.filelike.fileno()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.filelike.seek(offset, whence)
+
+    def tell(self):
+        return self.filelike.tell()
+
+    def read(self, size=-1):
+        remaining = self.end + 1 - self.filelike.tell()
+        if remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self.filelike.read(size)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.blksize)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self.filelike.close()
+
+
+_read_executor = None
+_read_executor_lock = threading.Lock()
+
+
+def get_read_executor():
+    """
+    Returns the bounded thread pool (STREAM_READ_THREADS) used for blocking
+    file reads of async streaming responses.
+    """
+    global _read_executor
+    # requests of several threads may arrive before the pool exists; only one may create it
+    with _read_executor_lock:
+        if _read_executor is None:
+            _read_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'STREAM_READ_THREADS', 32),
+                thread_name_prefix='stream-read',
+            )
+    return _read_executor
+
+
+async def aiter_in_thread(iterable):
+    """
+    Async iterator over a blocking iterable of chunks: every next() call,
+    i.e. every file read, runs in the bounded read executor so the event
+    loop never waits on disk I/O.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterable)
+    while True:
+        chunk = await loop.run_in_executor(get_read_executor(), next, iterator, None)
+        if chunk is None:
+            break
+        yield chunk
+
 
 class RangeFileResponse(StreamingHttpResponse):
     """
-    A response class that supports HTTP Range requests for byte ranges.
+    A response class that supports HTTP Range requests for byte ranges (RFC 7233).
     Useful for streaming video/audio files efficiently.
+    - bytes=N-M, bytes=N- and suffix ranges (bytes=-N, e.g. a trailing moov atom).
+    - Several ranges are answered as multipart/byteranges; overlapping or
+      adjacent ranges are coalesced first.
+    - Ranges that all start past EOF get 416 with Content-Range: bytes */size.
+    - Malformed Range headers are ignored and the full file is served.
+    Every response carries a strong ETag (inode/size/mtime) and Last-Modified;
+    If-None-Match / If-Modified-Since yield 304, If-Match / If-Unmodified-Since
+    412, and a Range is only honoured when If-Range still matches the file.
+    The descriptor and stat result come from the per-process media_file_cache.
+    Single-range and full bodies are a RangeFileWrapper exposed as
+    ``file_to_stream``, so Django passes them to ``wsgi.file_wrapper`` and
+    the server can use zero-copy sendfile.
+    With asynchronous=True the body is an async iterator whose reads run
+    in a bounded thread pool (for ASGI servers).
     """
 
-    def __init__(self, request, filename, chunk_size=8192, content_type='application/octet-stream'):
-        self.file_size = os.path.getsize(filename)
+    range_spec_re = re.compile(r'^(\d*)-(\d*)$')
+    max_ranges = 16
+
+    def __init__(self, request, filename, chunk_size=8192, content_type='application/octet-stream',
+                 cache_control=None, file_cache=None, asynchronous=False):
+        self._file, stat = (file_cache or media_file_cache).open(filename)
+        self.file_size = stat.st_size
+        self.etag = f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = int(stat.st_mtime)
         self.filename = filename
         self.chunk_size = chunk_size
+        self.block_size = chunk_size
         self.content_type = content_type
+        self.asynchronous = asynchronous
 
+        conditional = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
         range_header = request.META.get('HTTP_RANGE', '').strip()
-        range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
+        ranges = self._parse_ranges(range_header) if self._if_range_matches(request) else None
 
-        if range_match:
-            self._handle_partial_content(range_match)
-        else:
+        if conditional is not None:
+            self._handle_conditional(conditional.status_code)
+        elif ranges is None:
             self._handle_full_content()
+        elif not ranges:
+            self._handle_unsatisfiable()
+        elif len(ranges) == 1:
+            self._handle_partial_content(*ranges[0])
+        else:
+            self._handle_multipart_content(ranges)
+
+        self._resource_closers.append(self._file.close)
+        self['ETag'] = self.etag
+        self['Last-Modified'] = http_date(self.last_modified)
+        if cache_control:
+            self['Cache-Control'] = cache_control
+
+    def _if_range_matches(self, request):
+        """
+        A Range only applies if If-Range is absent or still names this file:
+        a strong ETag compared exactly, or a date equal to Last-Modified.
+        """
+        if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+        if not if_range:
+            return True
+        if if_range.startswith('"'):
+            return if_range == self.etag
+        if if_range.startswith('W/'):
+            return False
+        return parse_http_date_safe(if_range) == self.last_modified
+
+    def _parse_ranges(self, range_header):
+        """
+        Returns the satisfiable (start, end) pairs of a Range header,
+        an empty list if none is satisfiable, or None if the header is
+        absent or invalid and must be ignored.
+        """
+        unit, separator, specs = range_header.partition('=')
+        if not separator or unit.strip().lower() != 'bytes':
+            return None
+        parts = [part.strip() for part in specs.split(',') if part.strip()]
+        if not parts or len(parts) > self.max_ranges:
+            return None
+        ranges = []
+        for part in parts:
+            match = self.range_spec_re.match(part)
+            if not match or part == '-':
+                return None
+            first, last = match.groups()
+            if not first:
+                start = max(self.file_size - int(last), 0)
+                end = self.file_size - 1
+                if int(last) == 0 or start > end:
+                    continue
+            else:
+                start = int(first)
+                end = int(last) if last else self.file_size - 1
+                if last and end < start:
+                    return None
+                if start >= self.file_size:
+                    continue
+                end = min(end, self.file_size - 1)
+            ranges.append((start, end))
+        return self._coalesce_ranges(ranges)
 
-    def _parse_range(self, match):
-        start = int(match.group(1))
-        end_part = match.group(2)
-        end = int(end_part) if end_part else self.file_size - 1
-        end = min(end, self.file_size - 1)
-        return start, end
+    def _coalesce_ranges(self, ranges):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
 
     def _file_stream(self, start, end):
-        def generator():
-            with open(self.filename, 'rb') as f:
-                f.seek(start)
-                remaining = end - start + 1
-                while remaining > 0:
-                    chunk = f.read(min(self.chunk_size, remaining))
-                    if not chunk:
-                        break
-                    remaining -= len(chunk)
-                    yield chunk
-        return generator()
+        return RangeFileWrapper(self._file, start, end, blksize=self.chunk_size)
+
+    def _body(self, iterable):
+        return aiter_in_thread(iterable) if self.asynchronous else iterable
+
+    def _set_file_to_stream(self, stream):
+        self.file_to_stream = None if self.asynchronous else stream
 
     def _set_partial_headers(self, start, end):
         self['Content-Range'] = f'bytes {start}-{end}/{self.file_size}'
         self['Accept-Ranges'] = 'bytes'
         self['Content-Length'] = str(end - start + 1)
 
-    def _handle_partial_content(self, range_match):
-        start, end = self._parse_range(range_match)
+    def _handle_partial_content(self, start, end):
         stream = self._file_stream(start, end)
         status_code = 206  # Partial Content
-        super(RangeFileResponse, self).__init__(stream, status=status_code, content_type=self.content_type)
+        super(RangeFileResponse, self).__init__(self._body(stream), status=status_code, content_type=self.content_type)
+        self._set_file_to_stream(stream)
         self._set_partial_headers(start, end)
 
-    def _handle_full_content(self):
-        response = FileResponse(open(self.filename, 'rb'), content_type=self.content_type)
+    def _part_header(self, boundary, start, end):
+        return (
+            f'--{boundary}\r\n'
+            f'Content-Type: {self.content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{self.file_size}\r\n'
+            '\r\n'
+        ).encode('ascii')
+
+    def _multipart_stream(self, ranges, boundary):
+        for start, end in ranges:
+            yield self._part_header(boundary, start, end)
+            yield from self._file_stream(start, end)
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode('ascii')
+
+    def _handle_multipart_content(self, ranges):
+        boundary = secrets.token_hex(16)
+        content_length = sum(
+            len(self._part_header(boundary, start, end)) + (end - start + 1) + 2
+            for start, end in ranges
+        ) + len(f'--{boundary}--\r\n')
         super(RangeFileResponse, self).__init__(
-            response.streaming_content,
-            status=response.status_code,
-            content_type=self.content_type
+            self._body(self._multipart_stream(ranges, boundary)),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
         )
         self['Accept-Ranges'] = 'bytes'
+        self['Content-Length'] = str(content_length)
 
+    def _handle_unsatisfiable(self):
+        self._file.close()
+        super(RangeFileResponse, self).__init__(self._body(()), status=416, content_type=self.content_type)
+        self['Content-Range'] = f'bytes */{self.file_size}'
+        self['Accept-Ranges'] = 'bytes'
+        self['Content-Length'] = '0'
+
+    def _handle_conditional(self, status_code):
+        self._file.close()
+        super(RangeFileResponse, self).__init__(self._body(()), status=status_code, content_type=self.content_type)
+        if status_code == 304:
+            del self['Content-Type']
+        else:
+            self['Content-Length'] = '0'
+
+    def _handle_full_content(self):
+        stream = self._file_stream(0, self.file_size - 1)
+        super(RangeFileResponse, self).__init__(self._body(stream), status=200, content_type=self.content_type)
+        self._set_file_to_stream(stream)
+        self['Accept-Ranges'] = 'bytes'
+        self['Content-Length'] = str(self.file_size)
+
+
+def offload_file_response(path, name, content_type='application/octet-stream'):
+    """
+    Hands a media file over to the front proxy instead of streaming it from Python.
+    - "nginx": X-Accel-Redirect to VIDEO_STREAM_OFFLOAD_PREFIX + name (an internal location).
+    - "sendfile": X-Sendfile with the absolute path (Apache mod_xsendfile, lighttpd).
+    The proxy answers Range requests itself, so the worker is released right away.
+    Returns None when VIDEO_STREAM_OFFLOAD is not set.
+    """
+    mode = getattr(settings, 'VIDEO_STREAM_OFFLOAD', '')
+    if not mode:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if mode == 'nginx':
+        prefix = settings.VIDEO_STREAM_OFFLOAD_PREFIX.rstrip('/')
+        response['X-Accel-Redirect'] = f"{prefix}/{quote(name.lstrip('/'))}"
+    elif mode == 'sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError(f"Unknown VIDEO_STREAM_OFFLOAD mode: {mode}")
+    return response
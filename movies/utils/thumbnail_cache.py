@@ -0,0 +1,80 @@
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from movies.utils.file_cache import media_file_cache
+from movies.utils.images import write_resized_image
+
+
+def thumbnail_version(path):
+    """
+    Short token that changes whenever the image at path is replaced
+    (path, size and mtime), so URLs containing it can be cached forever.
+    """
+    stat = os.stat(path)
+    return hashlib.sha1(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+
+
+class ThumbnailCache:
+    """
+    Size-bounded LRU disk cache of resized thumbnails, shared by every
+    process serving from the same folder.
+    - get() returns the cached file for (source version, width, format),
+      resizing the source on a miss.
+    - New files are written to a hidden temporary file in the cache folder
+      and renamed into place, so readers never see a partial image.
+    - A hit touches the file's mtime; once the folder exceeds max_bytes the
+      least recently served files are deleted first.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def get(self, source_path, width, name):
+        path = os.path.join(self.directory, f"{thumbnail_version(source_path)}_{width}.{name}")
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=f".{name}")
+        os.close(fd)
+        try:
+            write_resized_image(source_path, temp_path, width, name)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently served files until the cache fits into
+        max_bytes; `keep` (the file just written) is never deleted.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            media_file_cache.invalidate(path)
+            total -= size
+
+
+def thumbnail_cache():
+    return ThumbnailCache(settings.THUMBNAIL_CACHE_DIR, settings.THUMBNAIL_CACHE_MAX_BYTES)
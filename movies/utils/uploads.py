@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.http import UnreadablePostError
+
+CHUNK_SIZE = 1024 * 1024
+MAX_HASHERS = 64
+
+_hashers = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_hasher(upload_id, path, offset):
+    """
+    Returns the sha256 state over the first `offset` bytes of an upload.
+    The state of running uploads is kept per process; if this process has
+    not seen the upload up to `offset` (another worker, a restart), it is
+    rebuilt by reading the part file once.
+    """
+    with _lock:
+        cached = _hashers.pop(upload_id, None)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = offset
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            data = f.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+def store_hasher(upload_id, offset, hasher):
+    """
+    Keeps the sha256 state of an upload for its next chunk (bounded LRU).
+    """
+    with _lock:
+        _hashers[upload_id] = (offset, hasher)
+        _hashers.move_to_end(upload_id)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def forget_hasher(upload_id):
+    with _lock:
+        _hashers.pop(upload_id, None)
+
+
+def file_sha256(path):
+    """
+    Returns the hex sha256 of a file, read in CHUNK_SIZE pieces.
+    """
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+@contextmanager
+def upload_write_lock(upload_id):
+    """
+    Claims the right to append to an upload in the shared cache, so at
+    most one request (in any process) writes its part file at a time.
+    Yields False if another request holds it. The claim expires after
+    UPLOAD_LOCK_TIMEOUT seconds in case its holder dies.
+    """
+    key = f"upload-write:{upload_id}"
+    acquired = cache.add(key, True, timeout=settings.UPLOAD_LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(key)
+
+
+def append_chunk(path, offset, stream, length, hasher):
+    """
+    Copies up to `length` bytes from `stream` into the file at `offset`
+    in CHUNK_SIZE pieces and feeds them to `hasher`. Stops early if the
+    client disconnects. Returns the number of bytes written.
+    """
+    written = 0
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            try:
+                data = stream.read(min(CHUNK_SIZE, length - written))
+            except UnreadablePostError:
+                break
+            if not data:
+                break
+            f.write(data)
+            hasher.update(data)
+            written += len(data)
+    return written
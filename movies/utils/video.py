@@ -1,49 +1,432 @@
 from django.conf import settings
+import json
+import math
 import os
+import re
 import subprocess
+import tempfile
+from xml.sax.saxutils import escape
+from PIL import Image
 
-def convert_video_to_resolution(source_path, resolution):
+RESOLUTIONS = (120, 360, 720, 1080)
+
+def plan_resolutions(source_height, source_width=None, ladder=RESOLUTIONS):
     """
-    Converts a video file to the specified resolution (e.g., 360p, 720p).
-    The converted file is saved in a resolution-specific folder under MEDIA_ROOT.
-    Uses ffmpeg to handle the conversion.
+    Returns the rungs of the ladder the source fills, so nothing is
+    upscaled. Rungs are 16:9 boxes: a wide source (e.g. 1920x800 scope)
+    is measured by its 16:9-equivalent height max(height, width * 9 / 16)
+    and keeps its 1080 rung. A source smaller than every rung still gets
+    the lowest rung (encoded at its own size).
+    """
+    height = max(source_height, source_width * 9 / 16) if source_width else source_height
+    return [resolution for resolution in sorted(ladder) if resolution <= height] or [min(ladder)]
+
+def rung_width(resolution):
+    #  Width of the rung's 16:9 box, rounded to an even number (e.g. 1280 for 720).
+    return round(resolution * 16 / 9 / 2) * 2
+
+def scale_filter(resolution):
+    """
+    Scales into the rung's 16:9 box (rung_width x resolution) without
+    upscaling and keeps the aspect ratio, both sides rounded to even
+    numbers for yuv420p: 1920x800 becomes 1280x532 at 720, 1440x1080
+    becomes 960x720.
+    """
+    return (
+        f"scale='min({rung_width(resolution)},iw)':'min({resolution},ih)'"
+        f":force_original_aspect_ratio=decrease:force_divisible_by=2"
+    )
+
+def rendition_target_path(source_path, resolution):
+    """
+    Returns MEDIA_ROOT/videos/<resolution>p/<source name>_<resolution>p.mp4,
+    creating the folder if needed.
     """
-    resolutions = {
-        120: (210, 120),
-        360: (640, 360),
-        720: (1280, 720),
-        1080: (1920, 1080),
-    }
-    width, height = resolutions[resolution]
     base_name = os.path.basename(source_path).split('.')[0]
     folder = os.path.join(settings.MEDIA_ROOT, f"videos/{resolution}p")
     os.makedirs(folder, exist_ok=True)
-    target_path = os.path.join(folder, f"{base_name}_{resolution}p.mp4")
+    return os.path.join(folder, f"{base_name}_{resolution}p.mp4")
+
+def encoder_args(profile):
+    """
+    ffmpeg video encoder options of a profile: a name from
+    VIDEO_ENCODER_PROFILES or the profile dict itself.
+    """
+    if isinstance(profile, str):
+        profile = settings.VIDEO_ENCODER_PROFILES[profile]
+    args = ["-c:v", profile.get("codec", "libx264")]
+    if "preset" in profile:
+        args += ["-preset", str(profile["preset"])]
+    if "crf" in profile:
+        args += ["-crf", str(profile["crf"])]
+    if "bitrate" in profile:
+        args += ["-b:v", str(profile["bitrate"])]
+    if "maxrate" in profile:
+        args += ["-maxrate", str(profile["maxrate"]), "-bufsize", str(profile.get("bufsize", profile["maxrate"]))]
+    if "gop" in profile:
+        args += ["-g", str(profile["gop"])]
+    if "threads" in profile:
+        args += ["-threads", str(profile["threads"])]
+    return args
+
+def rendition_profile(resolution):
+    """
+    Name of the encoder profile used for a rung.
+    """
+    return settings.VIDEO_RUNG_PROFILES.get(resolution, settings.VIDEO_DEFAULT_PROFILE)
+
+def bitrate_kbps(value):
+    """
+    Returns a bitrate like 3500, "3500k" or "3.5M" in kbit/s.
+    """
+    value = str(value)
+    if value[-1:] in ("k", "K"):
+        return float(value[:-1])
+    if value[-1:] == "M":
+        return float(value[:-1]) * 1000
+    return float(value) / 1000
+
+def rendition_encoder_args(resolution=None, encoding=None, two_pass=False):
+    """
+    ffmpeg output options of an MP4 rendition: the rung's encoder profile,
+    updated with the per-title `encoding` (crf, maxrate, bufsize) if given,
+    plus the keyframe cadence shared by every rendition.
+    With VIDEO_RATE_CONTROL "crf" the encode is quality-only: maxrate and
+    bufsize of the profile and of the per-title ladder are dropped.
+    Otherwise a rung without its own maxrate is capped at
+    VIDEO_RUNG_MAXRATE (bufsize twice the maxrate). For two-pass encodes
+    the CRF is replaced by an average bitrate of VIDEO_TWO_PASS_AVERAGE
+    times the maxrate.
+    """
+    profile = {**settings.VIDEO_ENCODER_PROFILES[rendition_profile(resolution)], **(encoding or {})}
+    if settings.VIDEO_RATE_CONTROL == "crf":
+        profile.pop("maxrate", None)
+        profile.pop("bufsize", None)
+    elif "maxrate" not in profile and resolution in settings.VIDEO_RUNG_MAXRATE:
+        maxrate = settings.VIDEO_RUNG_MAXRATE[resolution]
+        profile.update(maxrate=f"{maxrate}k", bufsize=f"{maxrate * 2}k")
+    if two_pass and "maxrate" in profile:
+        profile.pop("crf", None)
+        profile["bitrate"] = f"{round(bitrate_kbps(profile['maxrate']) * settings.VIDEO_TWO_PASS_AVERAGE)}k"
+    return [
+        *encoder_args(profile),
+        # keyframes every HLS_KEYFRAME_INTERVAL seconds in every rendition, so HLS segments line up
+        "-force_key_frames", f"expr:gte(t,n_forced*{settings.HLS_KEYFRAME_INTERVAL})",
+    ]
+
+def run_ffmpeg(command, on_progress=None, input_path=None):
+    """
+    Runs an ffmpeg command and raises CalledProcessError if it fails.
+    With on_progress, ffmpeg reports its position through -progress and
+    on_progress(percent) is called while it runs; the percentage is
+    relative to the duration of input_path.
+    """
+    duration = None
+    if on_progress is not None and input_path:
+        try:
+            duration = get_video_duration(input_path)
+        except (OSError, ValueError):
+            duration = None
+    if not duration:
+        subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+        return
+
+    command = [command[0], "-progress", "pipe:1", "-nostats", *command[1:]]
+    with subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True) as process:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            # out_time_us is "N/A" until the first frame is written
+            if key == "out_time_us" and value.isdigit():
+                on_progress(min(int(value) / 1_000_000 / duration * 100, 100.0))
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+def run_rendition_encode(input_args, outputs, on_progress=None, input_path=None, two_pass=False):
+    """
+    Runs one ffmpeg encode of one or more renditions; outputs is a list of
+    (output options, target path). With two_pass, a first pass (video only,
+    to the null muxer) writes the rate-control stats of every output to a
+    temporary folder and the second pass encodes against them.
+    on_progress covers both passes (0-50 and 50-100 percent).
+    Every rendition is written under a .part name (overwriting leftovers of
+    an interrupted run) and renamed once ffmpeg succeeded, so an existing
+    target is always complete.
+    """
+    if not two_pass:
+        command = ["ffmpeg", "-y", *input_args]
+        for options, target_path in outputs:
+            command += [*options, f"{target_path}.part.mp4"]
+        run_ffmpeg(command, on_progress, input_path)
+    else:
+        with tempfile.TemporaryDirectory() as passlog_dir:
+            for pass_number in (1, 2):
+                command = ["ffmpeg", "-y", *input_args]
+                for index, (options, target_path) in enumerate(outputs):
+                    pass_args = ["-pass", str(pass_number), "-passlogfile", os.path.join(passlog_dir, str(index))]
+                    if pass_number == 1:
+                        command += [*options, *pass_args, "-an", "-f", "null", os.devnull]
+                    else:
+                        command += [*options, *pass_args, f"{target_path}.part.mp4"]
+                offset = (pass_number - 1) * 50
+                pass_progress = on_progress and (lambda percent, offset=offset: on_progress(offset + percent / 2))
+                run_ffmpeg(command, pass_progress, input_path)
+    for _, target_path in outputs:
+        os.replace(f"{target_path}.part.mp4", target_path)
+
+def convert_video_to_resolution(source_path, resolution, on_progress=None, encoding=None):
+    """
+    Converts a video file to the specified resolution (e.g., 360p, 720p).
+    The converted file is saved in a resolution-specific folder under MEDIA_ROOT.
+    Uses ffmpeg to handle the conversion; the aspect ratio is kept and the
+    source is never upscaled. on_progress(percent) follows the encode;
+    encoding holds per-title overrides of the rung's profile.
+    """
+    target_path = rendition_target_path(source_path, resolution)
+    two_pass = settings.VIDEO_RATE_CONTROL == "two_pass"
+    run_rendition_encode(
+        ["-i", source_path],
+        [(["-vf", scale_filter(resolution), *rendition_encoder_args(resolution, encoding, two_pass)], target_path)],
+        on_progress, source_path, two_pass,
+    )
+    return target_path
+
+def ladder_filter(resolutions):
+    """
+    Returns the filter graph that splits the decoded video into one
+    scaled output [out<i>] per resolution.
+    """
+    labels = "".join(f"[v{index}]" for index in range(len(resolutions)))
+    scales = ";".join(
+        f"[v{index}]{scale_filter(resolution)}[out{index}]"
+        for index, resolution in enumerate(resolutions)
+    )
+    return f"[0:v]split={len(resolutions)}{labels};{scales}"
+
+def convert_video_to_resolutions(source_path, resolutions, on_progress=None, encodings=None):
+    """
+    Converts a video into several resolutions with a single ffmpeg process:
+    the source is decoded once and a split/scale filter graph feeds one
+    encoder per rung. encodings maps rungs to per-title overrides.
+    Returns {resolution: target path}.
+    """
+    encodings = encodings or {}
+    resolutions = sorted(resolutions)
+    two_pass = settings.VIDEO_RATE_CONTROL == "two_pass"
+    target_paths = {}
+    outputs = []
+    for index, resolution in enumerate(resolutions):
+        target_paths[resolution] = rendition_target_path(source_path, resolution)
+        options = [
+            "-map", f"[out{index}]", "-map", "0:a?",
+            *rendition_encoder_args(resolution, encodings.get(resolution), two_pass),
+        ]
+        outputs.append((options, target_paths[resolution]))
+    run_rendition_encode(
+        ["-i", source_path, "-filter_complex", ladder_filter(resolutions)],
+        outputs, on_progress, source_path, two_pass,
+    )
+    return target_paths
+
+def split_video_into_chunks(source_path, chunk_dir, chunk_duration=60):
+    """
+    Splits the video stream of a source into chunks of about chunk_duration
+    seconds without re-encoding. The segment muxer only cuts at keyframes,
+    so every chunk can be decoded on its own. Returns the chunk paths in order.
+    """
+    os.makedirs(chunk_dir, exist_ok=True)
     command = [
-        "ffmpeg", "-i", source_path,
-        "-vf", f"scale={width}:{height}",
-        "-c:v", "libx264", "-preset", "slow", "-crf", "22",
-        target_path
+        "ffmpeg", "-y", "-i", source_path,
+        "-map", "0:v:0", "-c", "copy", "-an",
+        "-f", "segment", "-segment_time", str(chunk_duration),
+        "-reset_timestamps", "1",
+        os.path.join(chunk_dir, "chunk_%05d.mp4")
     ]
     subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
-    return target_path
+    return list_chunks(chunk_dir)
+
+def list_chunks(chunk_dir):
+    """
+    Returns the source chunks in chunk_dir in order.
+    """
+    return sorted(
+        os.path.join(chunk_dir, name) for name in os.listdir(chunk_dir)
+        if name.startswith("chunk_") and name.endswith(".mp4")
+    )
+
+def chunk_target_path(chunk_path, resolution):
+    """
+    Returns <chunk folder>/<resolution>p/<chunk name>, the encoded chunk of a rung.
+    """
+    chunk_dir, name = os.path.split(chunk_path)
+    return os.path.join(chunk_dir, f"{resolution}p", name)
 
-def generate_thumbnail(video_path, output_path, time='00:00:05'):
+def encode_video_chunk(chunk_path, resolutions, encodings=None):
     """
-    Generates a thumbnail image from a video at a specific time position.
-    The thumbnail is saved to the given output path.
+    Encodes one source chunk into every resolution (single decode, video only).
+    The encoded chunks are written to <chunk folder>/<resolution>p/<chunk name>.
+    encodings maps rungs to per-title overrides. Chunks are always encoded
+    in one pass (capped CRF). The files are written under a .part name and
+    renamed when ffmpeg succeeded, so an existing encoded chunk is complete.
+    Returns {resolution: path}.
     """
+    encodings = encodings or {}
+    resolutions = sorted(resolutions)
     command = [
-        'ffmpeg',
-        '-ss', time,
-        '-i', video_path,
-        '-frames:v', '1',
-        '-q:v', '2',  # Quality from 1 (best) to 31 (worst)
-        output_path
+        "ffmpeg", "-y", "-i", chunk_path,
+        "-filter_complex", ladder_filter(resolutions),
     ]
+    target_paths = {}
+    for index, resolution in enumerate(resolutions):
+        target_paths[resolution] = chunk_target_path(chunk_path, resolution)
+        os.makedirs(os.path.dirname(target_paths[resolution]), exist_ok=True)
+        command += [
+            "-map", f"[out{index}]", "-an",
+            *rendition_encoder_args(resolution, encodings.get(resolution)),
+            f"{target_paths[resolution]}.part.mp4",
+        ]
+    subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+    for target_path in target_paths.values():
+        os.replace(f"{target_path}.part.mp4", target_path)
+    return target_paths
 
+def concat_video_chunks(chunk_paths, source_path, target_path):
+    """
+    Joins encoded chunks losslessly (concat demuxer, stream copy) and muxes
+    in the audio of the source, encoded once as AAC. Like the renditions of
+    run_rendition_encode, the result is written under a .part name and
+    renamed once ffmpeg succeeded, so an existing target is always complete.
+    """
+    list_path = f"{target_path}.txt"
+    with open(list_path, "w") as f:
+        for chunk_path in chunk_paths:
+            escaped = chunk_path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    command = [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", source_path,
+        "-map", "0:v", "-map", "1:a:0?",
+        "-c:v", "copy", "-c:a", "aac",
+        "-movflags", "+faststart",
+        f"{target_path}.part.mp4"
+    ]
+    try:
+        subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+    finally:
+        os.remove(list_path)
+    os.replace(f"{target_path}.part.mp4", target_path)
+    return target_path
+
+def measure_complexity(source_path, samples=4, sample_duration=4, resolution=360, crf=23):
+    """
+    Fast complexity probe: encodes `samples` short segments spread over the
+    video at a fixed CRF with a fast preset and returns their average
+    bitrate in kbit/s. At equal CRF, simple content (cartoons, talking
+    heads) needs far fewer bits than complex content (action, grain).
+    """
+    duration = get_video_duration(source_path)
+    if duration <= 0:
+        raise ValueError(f"Cannot sample a video without duration: {source_path}")
+    sample_duration = min(sample_duration, duration)
+    samples = max(1, min(samples, int(duration // sample_duration)))
+    total_bits = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        for index in range(samples):
+            start = max(duration * (index + 0.5) / samples - sample_duration / 2, 0)
+            sample_path = os.path.join(workdir, f"sample_{index}.mp4")
+            command = [
+                "ffmpeg", "-v", "error",
+                "-ss", f"{start:.3f}", "-i", source_path,
+                "-t", str(sample_duration),
+                "-vf", scale_filter(resolution), "-an",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf),
+                sample_path
+            ]
+            subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+            total_bits += os.path.getsize(sample_path) * 8
+    return total_bits / (samples * sample_duration) / 1000
+
+def per_title_ladder(complexity_kbps, resolutions):
+    """
+    Chooses CRF, maxrate and bufsize per rung from the probe bitrate
+    (see VIDEO_COMPLEXITY_LEVELS). Returns the ladder stored on the Movie:
+    {"complexity_kbps": ..., "rungs": {"720": {"crf": ..., "maxrate": "...k", "bufsize": "...k"}}}.
+    """
+    for max_kbps, crf_offset, maxrate_factor in settings.VIDEO_COMPLEXITY_LEVELS:
+        if max_kbps is None or complexity_kbps <= max_kbps:
+            break
+    rungs = {}
+    for resolution in sorted(resolutions):
+        profile = settings.VIDEO_ENCODER_PROFILES[rendition_profile(resolution)]
+        maxrate = round(settings.VIDEO_RUNG_MAXRATE[resolution] * maxrate_factor)
+        rungs[str(resolution)] = {
+            "crf": profile.get("crf", 23) + crf_offset,
+            "maxrate": f"{maxrate}k",
+            "bufsize": f"{maxrate * 2}k",
+        }
+    return {"complexity_kbps": round(complexity_kbps, 1), "rungs": rungs}
+
+def extract_frame_previews(video_path, poster_path, sprite_dir, poster_time=5, interval=5,
+                           tile_width=160, grid=10, poster_width=1280):
+    """
+    Writes in one ffmpeg run, without decoding the whole source:
+    - the poster at poster_time seconds, scaled to at most poster_width,
+      to poster_path (WebP); the input seeks there, so only the frames
+      since the preceding keyframe are decoded,
+    - sprite sheets of grid x grid tiles, one tile of tile_width pixels
+      every `interval` seconds, to sprite_dir/sprite_000.jpg ...; this
+      input decodes keyframes only (-skip_frame nokey), each tile shows
+      the nearest keyframe.
+    Returns the sprite sheet paths in order.
+    """
+    os.makedirs(sprite_dir, exist_ok=True)
+    filters = (
+        f"[0:v]scale='min({poster_width},iw)':-2[poster];"
+        f"[1:v]fps=1/{interval},scale={tile_width}:-2,tile={grid}x{grid}[sprites]"
+    )
+    command = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-ss', str(poster_time), '-i', video_path,
+        '-skip_frame', 'nokey', '-i', video_path,
+        '-filter_complex', filters,
+        '-map', '[poster]', '-frames:v', '1', '-c:v', 'libwebp', '-quality', '80', poster_path,
+        '-map', '[sprites]', '-q:v', '4', '-start_number', '0', os.path.join(sprite_dir, 'sprite_%03d.jpg'),
+    ]
     subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
-    return output_path
+    return [os.path.join(sprite_dir, name) for name in sorted(os.listdir(sprite_dir)) if name.startswith('sprite_')]
+
+def vtt_timestamp(seconds):
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    return f"{hours:02d}:{minutes:02d}:{milliseconds / 1000:06.3f}"
+
+def write_sprite_vtt(vtt_path, sprite_paths, duration, interval=5, grid=10):
+    """
+    Writes the WebVTT index of the sprite sheets: one cue per tile whose
+    text is the sheet (relative to the VTT) with the tile's media fragment,
+    e.g. "sprite_000.jpg#xywh=160,0,160,90". Players show the tile of the
+    cue at the seek position. Returns vtt_path.
+    """
+    if not sprite_paths:
+        raise ValueError(f"No sprite sheets for {vtt_path}")
+    with Image.open(sprite_paths[0]) as sheet:
+        tile_width, tile_height = sheet.width // grid, sheet.height // grid
+    tiles_per_sheet = grid * grid
+    cues = min(math.ceil(duration / interval), len(sprite_paths) * tiles_per_sheet)
+    lines = ["WEBVTT", ""]
+    for index in range(cues):
+        sheet_index, position = divmod(index, tiles_per_sheet)
+        row, column = divmod(position, grid)
+        sheet_name = os.path.relpath(sprite_paths[sheet_index], os.path.dirname(vtt_path))
+        lines += [
+            f"{vtt_timestamp(index * interval)} --> {vtt_timestamp(min((index + 1) * interval, duration))}",
+            f"{sheet_name}#xywh={column * tile_width},{row * tile_height},{tile_width},{tile_height}",
+            "",
+        ]
+    with open(vtt_path, "w") as vtt:
+        vtt.write("\n".join(lines))
+    return vtt_path
 
 def get_video_duration(video_path):
     """
@@ -60,21 +443,315 @@ def get_video_duration(video_path):
     duration = float(result.stdout.strip())
     return duration
 
-def cut_video_for_trailer(video_path, output_path, duration=7):
+def parse_frame_rate(value):
+    """
+    Returns an ffprobe rate like "30000/1001" as frames per second, or None.
+    """
+    numerator, _, denominator = (value or "").partition("/")
+    try:
+        rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(rate, 3) if rate > 0 else None
+
+def probe_video_packets(path, duration, window=1.0):
+    """
+    Reads the video packets of a media file in a separate ffprobe pass
+    (CSV, first video stream only) and sums them up while ffprobe writes
+    them, so memory stays flat however long the file is. Returns:
+    - video_bitrate: average video kbit/s,
+    - peak_bitrate: most video kbit/s in any `window`-second slot, i.e.
+      what a player has to download to keep up at the worst point,
+    - keyframe_interval: average seconds between keyframes.
     """
-    Cuts a short trailer from a video with the specified duration in seconds.
-    The trailer is saved to the given output path.
+    # ffprobe writes the entries in its own order: pts_time,size,flags
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'packet=pts_time,size,flags', '-of', 'csv=p=0', path]
+    slots = {}
+    keyframes, first_keyframe, last_keyframe = 0, None, None
+    with subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True) as process:
+        for line in process.stdout:
+            pts_time, _, rest = line.strip().partition(",")
+            size, _, flags = rest.partition(",")
+            # packets without a timestamp can't be put into a slot
+            if pts_time in ("", "N/A") or not size.isdigit():
+                continue
+            time = float(pts_time)
+            slots[int(time // window)] = slots.get(int(time // window), 0) + int(size)
+            if "K" in flags:
+                keyframes += 1
+                first_keyframe = time if first_keyframe is None else min(first_keyframe, time)
+                last_keyframe = time if last_keyframe is None else max(last_keyframe, time)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+    stats = {}
+    if slots:
+        stats["video_bitrate"] = round(sum(slots.values()) * 8 / duration / 1000)
+        stats["peak_bitrate"] = round(max(slots.values()) * 8 / window / 1000)
+    if keyframes > 1:
+        stats["keyframe_interval"] = round((last_keyframe - first_keyframe) / (keyframes - 1), 3)
+    return stats
+
+def probe_media(path, packets=False, window=1.0):
     """
+    Reads container and stream properties of a media file with an ffprobe
+    JSON pass and returns them as a dict with the fields of MediaMetadata.
+    With packets, the video packets are read in a second pass to add
+    video_bitrate, peak_bitrate and keyframe_interval (see
+    probe_video_packets).
+    Raises ValueError if the file has no duration.
+    """
+    command = ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path]
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    probe = json.loads(result.stdout)
+    container = probe.get("format", {})
+    streams = probe.get("streams", [])
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), {})
+    duration = float(container.get("duration") or video.get("duration") or 0)
+    if duration <= 0:
+        raise ValueError(f"No duration in {path}")
+
+    metadata = {
+        "duration_ms": round(duration * 1000),
+        "video_codec": video.get("codec_name", ""),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "frame_rate": parse_frame_rate(video.get("avg_frame_rate")),
+        "bitrate": round(int(container["bit_rate"]) / 1000) if container.get("bit_rate") else None,
+        "audio_tracks": [
+            {
+                "codec": stream.get("codec_name", ""),
+                "channels": stream.get("channels"),
+                "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+                "language": stream.get("tags", {}).get("language", ""),
+            }
+            for stream in streams if stream.get("codec_type") == "audio"
+        ],
+        "size": int(container["size"]) if container.get("size") else None,
+    }
+    if packets and video:
+        metadata.update(probe_video_packets(path, duration, window))
+    return metadata
+
+#  Codecs an MP4 can carry that every browser plays; a source using them is stream-copied for its trailer.
+WEB_VIDEO_CODECS = ("h264",)
+WEB_AUDIO_CODECS = ("aac", "mp3")
+
+def is_web_compatible(video_codec, audio_tracks=()):
+    """
+    True if the video codec and the first audio track (if any) can be
+    copied into an MP4 trailer without re-encoding.
+    """
+    audio_ok = not audio_tracks or audio_tracks[0].get("codec") in WEB_AUDIO_CODECS
+    return video_codec in WEB_VIDEO_CODECS and audio_ok
+
+def keyframe_before(video_path, time, lookback=30):
+    """
+    Returns the timestamp of the last keyframe at or before `time` seconds.
+    Only the packet headers of the `lookback` seconds before it are read,
+    nothing is decoded. Returns 0.0 for the start of the file and `time`
+    itself if no keyframe was found.
+    """
+    if time <= 0:
+        return 0.0
     command = [
-        'ffmpeg',
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-read_intervals', f"{max(time - lookback, 0)}%{time}",
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.strip().partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A') and float(pts_time) <= time:
+            keyframes.append(float(pts_time))
+    return max(keyframes, default=float(time))
+
+def cut_video_for_trailer(video_path, output_path, duration=7, start=0, copy=False):
+    """
+    Cuts a trailer of `duration` seconds from the video and saves it to
+    output_path.
+    - copy: stream-copies (-c copy) from the keyframe at or before `start`,
+      which only reads the bytes of the trailer. Use it for sources with
+      web-compatible codecs (see is_web_compatible).
+    - Otherwise, or if the copy fails, re-encodes from `start` at the small
+      VIDEO_TRAILER_RESOLUTION with VIDEO_TRAILER_PROFILE.
+    Both seek before opening the input, so the rest of the source is never decoded.
+    """
+    if copy:
+        try:
+            command = [
+                'ffmpeg', '-v', 'error', '-y',
+                '-ss', str(keyframe_before(video_path, start)),
+                '-i', video_path,
+                '-t', str(duration),
+                '-map', '0:v:0', '-map', '0:a:0?',
+                '-c', 'copy',
+                '-avoid_negative_ts', 'make_zero',
+                '-movflags', '+faststart',
+                output_path
+            ]
+            subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+            return output_path
+        except (subprocess.CalledProcessError, ValueError):
+            pass
+
+    command = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-ss', str(start),
         '-i', video_path,
         '-t', str(duration),
-        '-c:v', 'libx264',
-        '-preset', 'slow',
-        '-crf', '22',
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', scale_filter(settings.VIDEO_TRAILER_RESOLUTION),
+        *encoder_args(settings.VIDEO_TRAILER_PROFILE),
+        '-c:a', 'aac', '-b:a', '96k',
+        '-movflags', '+faststart',
         output_path
     ]
 
     subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
     return output_path
 
+def get_video_dimensions(video_path):
+    """
+    Gets (width, height) of the first video stream using ffprobe.
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height',
+        '-of', 'csv=s=x:p=0',
+        video_path
+    ]
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    width, height = result.stdout.strip().split('x')[:2]
+    return int(width), int(height)
+
+def segment_rendition_to_hls(video_path, output_dir, segment_duration=6):
+    """
+    Stream-copies an MP4 rendition into an fMP4/CMAF HLS media playlist
+    (index.m3u8, init.mp4, segment_00000.m4s ...) inside output_dir.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    playlist_path = os.path.join(output_dir, "index.m3u8")
+    command = [
+        'ffmpeg', '-y',
+        '-i', video_path,
+        '-c', 'copy',
+        '-f', 'hls',
+        '-hls_time', str(segment_duration),
+        '-hls_playlist_type', 'vod',
+        '-hls_segment_type', 'fmp4',
+        '-hls_fmp4_init_filename', 'init.mp4',
+        '-hls_segment_filename', os.path.join(output_dir, 'segment_%05d.m4s'),
+        playlist_path
+    ]
+    subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+    return playlist_path
+
+def measure_hls_bandwidth(playlist_path):
+    """
+    Returns (peak, average) bits per second of an HLS media playlist,
+    computed from its segment sizes and #EXTINF durations.
+    """
+    folder = os.path.dirname(playlist_path)
+    peak = total_bits = total_duration = 0
+    duration = None
+    with open(playlist_path) as playlist:
+        for line in playlist:
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            elif line and not line.startswith('#') and duration:
+                bits = os.path.getsize(os.path.join(folder, line)) * 8
+                peak = max(peak, bits / duration)
+                total_bits += bits
+                total_duration += duration
+                duration = None
+    average = total_bits / total_duration if total_duration else 0
+    return int(peak), int(average)
+
+def package_hls(rendition_paths, output_dir, segment_duration=6):
+    """
+    Packages MP4 renditions ({resolution: path}) as HLS: one fMP4 media
+    playlist per rendition in output_dir/<resolution>p/ plus master.m3u8
+    with BANDWIDTH, AVERAGE-BANDWIDTH and RESOLUTION per variant.
+    Returns the path of the master playlist.
+    """
+    lines = ['#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-INDEPENDENT-SEGMENTS']
+    for resolution, video_path in sorted(rendition_paths.items()):
+        variant = f"{resolution}p"
+        playlist_path = segment_rendition_to_hls(video_path, os.path.join(output_dir, variant), segment_duration)
+        peak, average = measure_hls_bandwidth(playlist_path)
+        width, height = get_video_dimensions(video_path)
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={peak},AVERAGE-BANDWIDTH={average},RESOLUTION={width}x{height}"
+        )
+        lines.append(f"{variant}/index.m3u8")
+    master_path = os.path.join(output_dir, "master.m3u8")
+    with open(master_path, "w") as master:
+        master.write("\n".join(lines) + "\n")
+    return master_path
+
+def has_audio_stream(video_path):
+    """
+    Returns True if the file contains at least one audio stream.
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'a',
+        '-show_entries', 'stream=index',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return bool(result.stdout.strip())
+
+def package_dash(rendition_paths, output_dir, segment_duration=6):
+    """
+    Stream-copies MP4 renditions ({resolution: path}) into one MPEG-DASH
+    presentation in output_dir: manifest.mpd, one video representation per
+    rendition and the audio of the largest rendition, as fMP4 segments.
+    Returns the path of the manifest.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.mpd")
+    paths = [path for _, path in sorted(rendition_paths.items())]
+    command = ['ffmpeg', '-y']
+    for path in paths:
+        command += ['-i', path]
+    for index in range(len(paths)):
+        command += ['-map', f'{index}:v:0']
+    adaptation_sets = "id=0,streams=v"
+    if has_audio_stream(paths[-1]):
+        command += ['-map', f'{len(paths) - 1}:a:0']
+        adaptation_sets += " id=1,streams=a"
+    command += [
+        '-c', 'copy',
+        '-f', 'dash',
+        '-seg_duration', str(segment_duration),
+        '-use_template', '1',
+        '-use_timeline', '1',
+        '-adaptation_sets', adaptation_sets,
+        '-init_seg_name', 'init-$RepresentationID$.m4s',
+        '-media_seg_name', 'chunk-$RepresentationID$-$Number%05d$.m4s',
+        manifest_path
+    ]
+    subprocess.run(command, stdin=subprocess.DEVNULL, check=True)
+    return manifest_path
+
+def add_dash_base_url(manifest, base_url):
+    """
+    Inserts a <BaseURL> as first child of the <MPD> element, so players
+    fetch the segments from base_url (e.g. a CDN or static media origin).
+    """
+    match = re.search(r'<MPD\b[^>]*>', manifest)
+    if not match:
+        return manifest
+    return f"{manifest[:match.end()]}\n\t<BaseURL>{escape(base_url)}</BaseURL>{manifest[match.end():]}"
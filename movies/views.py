@@ -1,17 +1,31 @@
 
 from rest_framework import generics, permissions
-from movies.throttles import VideoStreamRateThrottle
-from .models import Movie, Category
-from .serializers import MovieSerializer, MovieProgressSerializer, MovieFileSerializer
+from movies.throttles import VideoStreamRateThrottle, VideoSegmentRateThrottle, ThumbnailRateThrottle
+from .models import Movie, Category, Upload
+from .serializers import MovieSerializer, MovieProgressSerializer, MovieFileSerializer, MovieStatusSerializer, UploadSerializer
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
-from django.http import FileResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
 import os
+import posixpath
 from django.shortcuts import get_object_or_404
-from movies.utils.streaming import RangeFileResponse
+from django.db import close_old_connections, transaction
+from django.urls import reverse
+from django.views import View
+from movies.utils.file_cache import media_file_cache
+from movies.utils.images import supported_formats
+from movies.utils.thumbnail_cache import thumbnail_cache, thumbnail_version
+from movies.utils.streaming import RangeFileResponse, offload_file_response
+from movies.utils.video import RESOLUTIONS, add_dash_base_url
+from movies.utils.uploads import append_chunk, forget_hasher, get_hasher, store_hasher, upload_write_lock
+from movies.pipeline import attach_upload
 from .pagination import StandardMoviePagination
 from django.db.models import Max, Q
 
@@ -120,16 +134,363 @@ class MovieStreamView(APIView):
     """
     Stream the MP4 file at the requested resolution using HTTP Range support.
     URL kwargs: pk (movie ID), resolution (e.g. '360').
+    Only the file name column is fetched; the descriptor and stat result
+    are reused from the per-process media_file_cache.
+    With VIDEO_STREAM_OFFLOAD set, only the lookup happens here and the
+    file itself is served by the front proxy (X-Accel-Redirect / X-Sendfile).
+    Responses carry ETag/Last-Modified and VIDEO_STREAM_CACHE_CONTROL; the
+    URL has no version and the file is rewritten when the source is
+    replaced, so the default policy makes clients revalidate.
     """
     throttle_classes = [VideoStreamRateThrottle]
+    not_found_detail = "Resolution not available"
+    resolutions = tuple(str(resolution) for resolution in RESOLUTIONS)
    
     def get(self, request, pk, *args, **kwargs):
-        movie = get_object_or_404(Movie, pk=pk)
+        path, name = self.get_media(request, pk)
+        content_type = self.get_content_type(name)
+        offloaded = offload_file_response(path, name, content_type=content_type)
+        if offloaded is not None:
+            return offloaded
+        return RangeFileResponse(
+            request, path, content_type=content_type,
+            cache_control=self.get_cache_control(name),
+        )
+
+    def get_media(self, request, pk):
+        """
+        Returns (absolute path, storage name) of the requested file or raises NotFound.
+        """
+        field_name = self.get_field_name(request)
+        row = field_name and get_object_or_404(Movie.objects.values_list(field_name, "available_resolutions"), pk=pk)
+        if not row or not row[0] or not self.is_planned(request, row[1]):
+            raise NotFound(self.not_found_detail)
+        return default_storage.path(row[0]), row[0]
+
+    def get_field_name(self, request):
         res = request.query_params.get("resolution", "360")
-        field = getattr(movie, f"video_{res}p", None)
-        if not field:
-            return Response({"detail": "Resolution not available"}, status=404)
-        return RangeFileResponse(request, field.path, content_type="video/mp4")
+        return f"video_{res}p" if res in self.resolutions else None
+
+    def is_planned(self, request, available_resolutions):
+        """
+        Only rungs planned for the current source are streamed, never a
+        rendition left over from a previous one.
+        """
+        return int(request.query_params.get("resolution", "360")) in available_resolutions
+
+    def get_content_type(self, name):
+        return "video/mp4"
+
+    def get_cache_control(self, name):
+        return settings.VIDEO_STREAM_CACHE_CONTROL
+
+
+class MovieTrailerStreamView(MovieStreamView):
+    """
+    Stream the movie's trailer with the same Range, validator and offload
+    handling as the full video.
+    URL kwargs: pk (movie ID).
+    """
+    not_found_detail = "Trailer not available"
+
+    def get_field_name(self, request):
+        return "trailer"
+
+    def is_planned(self, request, available_resolutions):
+        return True
+
+
+class MovieHlsView(MovieStreamView):
+    """
+    Serve a movie's HLS master playlist, media playlists and fMP4 segments
+    with the same auth and Range handling as the MP4 stream.
+    URL kwargs: pk (movie ID), name ('<version>/master.m3u8' or a file below
+    it, e.g. '<version>/360p/segment_00001.m4s'). Every packaging run
+    writes a new version folder, so segments and init files are sent with
+    SEGMENT_CACHE_CONTROL (immutable); playlists revalidate
+    (VIDEO_STREAM_CACHE_CONTROL).
+    """
+    throttle_classes = [VideoSegmentRateThrottle]
+    not_found_detail = "HLS file not available"
+    content_types = {
+        ".m3u8": "application/vnd.apple.mpegurl",
+        ".m4s": "video/iso.segment",
+        ".mp4": "video/mp4",
+    }
+    playlist_extensions = (".m3u8",)
+
+    def get_field_name(self, request):
+        return "hls_playlist"
+
+    def is_planned(self, request, available_resolutions):
+        return True
+
+    def get_media(self, request, pk):
+        _, playlist_name = MovieStreamView.get_media(self, request, pk)
+        # <hls|dash>/<movie id>/<version>/<playlist>: requests name the version themselves
+        return self.resolve_package_file(posixpath.dirname(posixpath.dirname(playlist_name)), self.kwargs["name"])
+
+    def resolve_package_file(self, base, requested):
+        """
+        Maps a requested name onto a file inside the package folder `base`;
+        anything outside it or with an unknown extension is NotFound.
+        """
+        name = posixpath.normpath(posixpath.join(base, requested))
+        if not name.startswith(base + "/") or posixpath.splitext(name)[1] not in self.content_types:
+            raise NotFound(self.not_found_detail)
+        path = default_storage.path(name)
+        if not os.path.isfile(path):
+            raise NotFound(self.not_found_detail)
+        return path, name
+
+    def get_content_type(self, name):
+        return self.content_types[posixpath.splitext(name)[1]]
+
+    def get_cache_control(self, name):
+        if posixpath.splitext(name)[1] in self.playlist_extensions:
+            return settings.VIDEO_STREAM_CACHE_CONTROL
+        return settings.SEGMENT_CACHE_CONTROL
+
+
+class MovieDashView(MovieHlsView):
+    """
+    Serve a movie's MPEG-DASH manifest and segments.
+    URL kwargs: pk (movie ID), name ('<version>/manifest.mpd' or a segment
+    next to it). Segments are immutable and sent with SEGMENT_CACHE_CONTROL;
+    with DASH_SEGMENT_BASE_URL set, the manifest points players at that
+    origin so segments never hit Django.
+    """
+    not_found_detail = "DASH file not available"
+    content_types = {
+        ".mpd": "application/dash+xml",
+        ".m4s": "video/iso.segment",
+    }
+    playlist_extensions = (".mpd",)
+
+    def get(self, request, pk, *args, **kwargs):
+        if self.kwargs["name"].endswith(".mpd") and settings.DASH_SEGMENT_BASE_URL:
+            path, name = self.get_media(request, pk)
+            with open(path) as f:
+                base_url = f"{settings.DASH_SEGMENT_BASE_URL.rstrip('/')}/{posixpath.dirname(name)}/"
+                manifest = add_dash_base_url(f.read(), base_url)
+            response = HttpResponse(manifest, content_type=self.content_types[".mpd"])
+            response["Cache-Control"] = self.get_cache_control(name)
+            return response
+        return super().get(request, pk, *args, **kwargs)
+
+    def get_field_name(self, request):
+        return "dash_manifest"
+
+
+class MovieThumbnailView(APIView):
+    """
+    Serve the movie's thumbnail (generated or uploaded) resized to a width
+    of THUMBNAIL_WIDTHS in a format of THUMBNAIL_FORMATS, as resized on the
+    first request and kept in the thumbnail_cache.
+    URL kwargs: pk (movie ID), version (thumbnail_version of the current
+    thumbnail), width, fmt. The URL changes with the thumbnail, so
+    responses carry THUMBNAIL_CACHE_CONTROL (immutable); a stale version
+    redirects to the current URL.
+    """
+    throttle_classes = [ThumbnailRateThrottle]
+    not_found_detail = "Thumbnail not available"
+
+    def get(self, request, pk, version, width, fmt):
+        if width not in settings.THUMBNAIL_WIDTHS or fmt not in supported_formats(settings.THUMBNAIL_FORMATS):
+            raise NotFound("Thumbnail size not available")
+        name = get_object_or_404(Movie.objects.values_list("thumbnail", flat=True), pk=pk)
+        path = name and default_storage.path(name)
+        if not name or not os.path.isfile(path):
+            raise NotFound(self.not_found_detail)
+        current = thumbnail_version(path)
+        if version != current:
+            return HttpResponseRedirect(reverse("movies:movie-thumbnail", kwargs={
+                "pk": pk, "version": current, "width": width, "fmt": fmt,
+            }))
+        try:
+            cached = thumbnail_cache().get(path, width, fmt)
+        except OSError:
+            raise NotFound(self.not_found_detail)
+        return RangeFileResponse(
+            request, cached, content_type=f"image/{fmt}",
+            cache_control=settings.THUMBNAIL_CACHE_CONTROL,
+        )
+
+
+class AsyncMovieStreamView(View):
+    """
+    ASGI variant of MovieStreamView for many concurrent, slow viewers.
+    Auth, permission and throttle checks plus the file lookup reuse
+    stream_view_class in a worker thread, as do the content type and cache
+    policy of the response. The body is an async iterator whose file reads
+    run in the bounded STREAM_READ_THREADS pool, so one event loop can hold
+    thousands of open streams.
+    URL kwargs: pk (movie ID), query param resolution (e.g. '360').
+    """
+    stream_view_class = MovieStreamView
+
+    async def get(self, request, pk):
+        media, error_response = await sync_to_async(self._prepare, thread_sensitive=False)(request, pk)
+        if error_response is not None:
+            return error_response
+        path, name = media
+        view = self.stream_view_class()
+        content_type = view.get_content_type(name)
+        offloaded = offload_file_response(path, name, content_type=content_type)
+        if offloaded is not None:
+            return offloaded
+        return await sync_to_async(RangeFileResponse, thread_sensitive=False)(
+            request, path, content_type=content_type,
+            cache_control=view.get_cache_control(name),
+            asynchronous=True,
+        )
+
+    def _prepare(self, request, pk):
+        """
+        Runs the DRF checks of stream_view_class; returns ((path, name), None)
+        or (None, rendered error response).
+        Runs in any thread of the sync_to_async pool (not the shared
+        thread-sensitive one, so slow checks of one request don't queue the
+        others); the database connection of that thread is closed
+        afterwards like at the end of a request.
+        """
+        view = self.stream_view_class()
+        view.args, view.kwargs = (), {"pk": pk}
+        drf_request = view.initialize_request(request, pk=pk)
+        view.request = drf_request
+        view.headers = view.default_response_headers
+        try:
+            view.initial(drf_request, pk=pk)
+            return view.get_media(drf_request, pk), None
+        except Exception as exc:
+            response = view.finalize_response(drf_request, view.handle_exception(exc))
+            return None, response.render()
+        finally:
+            close_old_connections()
+
+
+class MovieStatusView(generics.RetrieveAPIView):
+    """
+    Admin-only processing status of a movie: every pipeline stage with
+    status, percent complete, exit code and start/end time.
+    """
+    queryset = Movie.objects.prefetch_related('stages')
+    serializer_class = MovieStatusSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+
+class MediaFileCacheStatsView(APIView):
+    """
+    Admin-only view of this worker process's media_file_cache counters
+    (hits, misses, evictions, entries), used to size MEDIA_FILE_CACHE_SIZE.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({"pid": os.getpid(), **media_file_cache.stats()})
+
+
+def upload_headers(upload):
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+        "Cache-Control": "no-store",
+    }
+
+
+class UploadCreateView(APIView):
+    """
+    Starts a resumable (tus-style) upload of a movie's source video.
+    Expects the total size in the Upload-Length header and JSON { movie, filename }.
+    Answers 201 with the upload URL in Location and Upload-Offset: 0.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    throttle_classes = []
+
+    def post(self, request):
+        try:
+            length = int(request.headers.get("Upload-Length", ""))
+        except ValueError:
+            return Response({"detail": "Upload-Length header required."}, status=status.HTTP_400_BAD_REQUEST)
+        if length <= 0:
+            return Response({"detail": "Upload-Length must be positive."}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.UPLOAD_MAX_SIZE:
+            return Response({"detail": "Upload too large."}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        serializer = UploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(length=length)
+        os.makedirs(os.path.dirname(upload.part_path), exist_ok=True)
+        open(upload.part_path, "wb").close()
+
+        headers = upload_headers(upload)
+        headers["Location"] = reverse("movies:movie-upload", args=[upload.pk])
+        return Response(UploadSerializer(upload).data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class UploadView(APIView):
+    """
+    A resumable upload.
+    - HEAD: current Upload-Offset, to resume after a broken connection.
+    - PATCH: appends the raw body (Content-Type application/offset+octet-stream)
+      at Upload-Offset, which must equal the stored offset (409 otherwise).
+      The body is streamed to disk and into an incremental sha256 in 1 MiB
+      pieces, never buffered. One request writes at a time
+      (upload_write_lock, 409 for a concurrent one); the row is only locked
+      to recheck and advance the offset afterwards. The chunk that
+      completes the upload attaches the file to the movie and starts
+      processing once the transaction commits.
+    - GET: upload state as JSON.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    throttle_classes = []
+    parser_classes = []
+
+    def get(self, request, pk):
+        upload = get_object_or_404(Upload, pk=pk)
+        return Response(UploadSerializer(upload).data, headers=upload_headers(upload))
+
+    def head(self, request, pk):
+        upload = get_object_or_404(Upload, pk=pk)
+        return Response(headers=upload_headers(upload))
+
+    def patch(self, request, pk):
+        if request.content_type != "application/offset+octet-stream":
+            return Response({"detail": "Content-Type must be application/offset+octet-stream."},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return Response({"detail": "Upload-Offset header required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with upload_write_lock(pk) as acquired:
+            upload = get_object_or_404(Upload, pk=pk)
+            if not acquired or upload.completed_at or offset != upload.offset:
+                return Response({"detail": "Upload-Offset does not match."},
+                                status=status.HTTP_409_CONFLICT, headers=upload_headers(upload))
+            if offset + content_length > upload.length:
+                return Response({"detail": "Chunk exceeds Upload-Length."},
+                                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, headers=upload_headers(upload))
+
+            hasher = get_hasher(upload.pk, upload.part_path, offset)
+            written = append_chunk(upload.part_path, offset, request.stream, content_length, hasher)
+
+            with transaction.atomic():
+                upload = get_object_or_404(Upload.objects.select_for_update(), pk=pk)
+                if upload.completed_at or offset != upload.offset:
+                    return Response({"detail": "Upload-Offset does not match."},
+                                    status=status.HTTP_409_CONFLICT, headers=upload_headers(upload))
+                upload.offset = offset + written
+                upload.save(update_fields=["offset"])
+                if upload.offset == upload.length:
+                    forget_hasher(upload.pk)
+                    attach_upload(upload, hasher.hexdigest())
+                else:
+                    store_hasher(upload.pk, upload.offset, hasher)
+
+        return Response(status=status.HTTP_204_NO_CONTENT, headers=upload_headers(upload))
+
 
 class UpdateProgressAPIView(APIView):
     """
@@ -51,6 +51,104 @@ else:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Let the front proxy stream video files: "" (serve from Django), "nginx" (X-Accel-Redirect)
+# or "sendfile" (X-Sendfile for Apache/lighttpd). The prefix is nginx's internal media location.
+VIDEO_STREAM_OFFLOAD = os.getenv("VIDEO_STREAM_OFFLOAD", "").lower()
+VIDEO_STREAM_OFFLOAD_PREFIX = os.getenv("VIDEO_STREAM_OFFLOAD_PREFIX", "/protected-media/")
+# Stream/trailer URLs carry no version and their files are rewritten in place when the source is
+# replaced, so clients revalidate every time (304 via ETag/Last-Modified); "public, no-cache" for a CDN.
+VIDEO_STREAM_CACHE_CONTROL = os.getenv("VIDEO_STREAM_CACHE_CONTROL", "private, no-cache")
+# Per-worker LRU of open media file descriptors and stat results (0 disables it).
+# Invalidation is per process and the RQ workers don't invalidate: web workers notice a file rewritten by an
+# RQ worker when they open a new descriptor for it, or at the latest after MEDIA_FILE_CACHE_TTL seconds.
+MEDIA_FILE_CACHE_SIZE = int(os.getenv("MEDIA_FILE_CACHE_SIZE", "128"))
+MEDIA_FILE_CACHE_TTL = int(os.getenv("MEDIA_FILE_CACHE_TTL", "30"))
+# Threads doing the blocking file reads of /movies/<pk>/stream/async/ under ASGI.
+STREAM_READ_THREADS = int(os.getenv("STREAM_READ_THREADS", "32"))
+
+# "fanout": one RQ job and ffmpeg process per resolution (parallel across workers).
+# "ladder": one job that decodes the source once and encodes every resolution from it.
+# "chunked": the source is split at keyframes into VIDEO_CHUNK_DURATION-second chunks that are
+# encoded as independent jobs on any worker and concatenated losslessly afterwards.
+VIDEO_TRANSCODE_MODE = os.getenv("VIDEO_TRANSCODE_MODE", "fanout").lower()
+VIDEO_CHUNK_DURATION = int(os.getenv("VIDEO_CHUNK_DURATION", "60"))
+# RQ job timeouts in seconds: whole-file encodes (fanout/ladder, split, concat) and single chunks.
+VIDEO_ENCODE_JOB_TIMEOUT = int(os.getenv("VIDEO_ENCODE_JOB_TIMEOUT", str(6 * 60 * 60)))
+VIDEO_CHUNK_JOB_TIMEOUT = int(os.getenv("VIDEO_CHUNK_JOB_TIMEOUT", "1800"))
+# Failed processing jobs are retried after these delays in seconds (exponential backoff).
+VIDEO_JOB_RETRY_INTERVALS = [60, 240, 960]
+# `manage.py resume_stalled_movies` resumes movies whose stages haven't changed for this many seconds.
+VIDEO_STALL_TIMEOUT = int(os.getenv("VIDEO_STALL_TIMEOUT", str(2 * 60 * 60)))
+# Largest source video accepted by the resumable upload API (/movies/uploads/), in bytes.
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(50 * 1024 ** 3)))
+# A chunk that takes longer than this many seconds to arrive loses its write claim (see upload_write_lock).
+UPLOAD_LOCK_TIMEOUT = int(os.getenv("UPLOAD_LOCK_TIMEOUT", "900"))
+
+# Named ffmpeg encoder profiles. Keys: codec, preset, crf, maxrate/bufsize (e.g. "3M"), gop (max frames
+# between keyframes), threads (0 = auto). VIDEO_RUNG_PROFILES picks a profile per resolution; rungs not
+# listed use VIDEO_DEFAULT_PROFILE. Compare profiles on your hardware with `manage.py benchmark_encoders`.
+VIDEO_ENCODER_PROFILES = {
+    "quality": {"codec": "libx264", "preset": "slow", "crf": 22},
+    "balanced": {"codec": "libx264", "preset": "medium", "crf": 23},
+    "fast": {"codec": "libx264", "preset": "veryfast", "crf": 23},
+}
+VIDEO_DEFAULT_PROFILE = os.getenv("VIDEO_DEFAULT_PROFILE", "quality")
+VIDEO_RUNG_PROFILES = {}
+# Responsive thumbnails: the poster scaled to these widths (never upscaled) in each format Pillow can write
+# (AVIF needs Pillow 11.2+ with libavif), returned as srcsets by the movie list.
+THUMBNAIL_WIDTHS = [320, 640, 1280]
+THUMBNAIL_FORMATS = ["avif", "webp"]
+# Thumbnails resized on request (/movies/<pk>/thumbnail/<version>/<width>.<format>, same widths and formats)
+# are kept on disk up to THUMBNAIL_CACHE_MAX_BYTES; the least recently served are deleted first.
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR") or os.path.join(BASE_DIR, "cache", "thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+THUMBNAIL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Thumbnail stage: poster (at most VIDEO_POSTER_WIDTH wide) and seek-preview sprite sheets of
+# VIDEO_PREVIEW_GRID x VIDEO_PREVIEW_GRID tiles, one tile of VIDEO_PREVIEW_TILE_WIDTH px every
+# VIDEO_PREVIEW_INTERVAL seconds, with a WebVTT index. The sprites decode keyframes only and the
+# poster seeks to its frame, so the stage stays short enough for the fast queue.
+VIDEO_POSTER_WIDTH = 1280
+VIDEO_PREVIEW_INTERVAL = int(os.getenv("VIDEO_PREVIEW_INTERVAL", "5"))
+VIDEO_PREVIEW_TILE_WIDTH = 160
+VIDEO_PREVIEW_GRID = 10
+# Trailers: "copy" stream-copies VIDEO_TRAILER_START.. from the nearest keyframe if the source is H.264 with
+# AAC/MP3 audio; other sources (and mode "encode") are re-encoded at VIDEO_TRAILER_RESOLUTION.
+VIDEO_TRAILER_MODE = os.getenv("VIDEO_TRAILER_MODE", "copy")
+VIDEO_TRAILER_START = float(os.getenv("VIDEO_TRAILER_START", "0"))
+VIDEO_TRAILER_RESOLUTION = int(os.getenv("VIDEO_TRAILER_RESOLUTION", "360"))
+VIDEO_TRAILER_PROFILE = os.getenv("VIDEO_TRAILER_PROFILE", "fast")
+# Per-title ladder: a fast probe encode of sampled segments (360p, CRF 23, veryfast) measures how
+# many kbit/s the content needs. The first level whose limit the probe stays under sets the CRF offset
+# (added to the profile's CRF) and the share of VIDEO_RUNG_MAXRATE (kbit/s per rung) used as maxrate.
+VIDEO_PER_TITLE = os.getenv("VIDEO_PER_TITLE", "True") == "True"
+VIDEO_COMPLEXITY_LEVELS = [
+    # (probe kbit/s up to, CRF offset, maxrate factor)
+    (250, 4, 0.5),   # slides, cartoons, talking heads
+    (600, 2, 0.75),
+    (1500, 0, 1.0),
+    (None, -1, 1.25),  # grain, sports, action
+]
+VIDEO_RUNG_MAXRATE = {120: 250, 360: 1000, 720: 3500, 1080: 6500}
+# Rate control of the renditions: "crf" (quality only, bitrate may spike; maxrate/bufsize of the profile and
+# per-title ladder are ignored), "capped" (CRF with a VBV cap: maxrate from VIDEO_RUNG_MAXRATE unless the
+# profile/per-title ladder sets one, bufsize = 2x maxrate) or
+# "two_pass" (two-pass average bitrate of VIDEO_TWO_PASS_AVERAGE x maxrate, same cap; not for chunked mode).
+VIDEO_RATE_CONTROL = os.getenv("VIDEO_RATE_CONTROL", "capped")
+VIDEO_TWO_PASS_AVERAGE = 0.7
+
+# HLS packaging: every rendition gets a keyframe each HLS_KEYFRAME_INTERVAL seconds,
+# segments are cut every HLS_SEGMENT_DURATION seconds (a multiple of the keyframe interval).
+HLS_KEYFRAME_INTERVAL = 2
+HLS_SEGMENT_DURATION = 6
+# HLS and DASH segments are immutable (every packaging run writes a new version folder); playlists and
+# manifests use VIDEO_STREAM_CACHE_CONTROL. Set DASH_SEGMENT_BASE_URL
+# (e.g. "https://cdn.example.com/media/") to let players fetch DASH segments from the edge instead of Django.
+DASH_SEGMENT_BASE_URL = os.getenv("DASH_SEGMENT_BASE_URL", "")
+SEGMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# A replaced HLS/DASH version folder is deleted PACKAGE_GRACE_PERIOD seconds after the new one is live
+# (scheduled maintenance job), so viewers of the old playlist can finish watching; 0 deletes it at once.
+PACKAGE_GRACE_PERIOD = int(os.getenv("PACKAGE_GRACE_PERIOD", str(6 * 60 * 60)))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -113,7 +211,10 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_RATES': {
         'user': '1000/day',
         'anon': '1000/day', 
-        'video_stream': '30/minute',
+        # per user; raise it (or use several users) when load testing with loadtest_streaming
+        'video_stream': os.getenv("VIDEO_STREAM_THROTTLE_RATE", "30/minute"),
+        'video_segment': '600/minute',
+        'thumbnail': '1200/minute',
     }
 }
 
@@ -129,13 +230,31 @@ CACHES = {
     },
 }
 
+RQ_CONNECTION = {
+    'HOST': 'localhost',
+    'PORT': 6379,
+    'DB': 0,
+}
 RQ_QUEUES = {
     'default': {
-        'HOST': 'localhost',
-        'PORT': 6379,
-        'DB': 0,
+        **RQ_CONNECTION,
         'DEFAULT_TIMEOUT': 360,
     },
+    # upload readiness checks, thumbnails, trailers and durations: never wait behind an encode
+    'fast': {
+        **RQ_CONNECTION,
+        'DEFAULT_TIMEOUT': 300,
+    },
+    # whole-file encodes, splitting and concatenation (chunk jobs set VIDEO_CHUNK_JOB_TIMEOUT)
+    'encode': {
+        **RQ_CONNECTION,
+        'DEFAULT_TIMEOUT': VIDEO_ENCODE_JOB_TIMEOUT,
+    },
+    # source hashing (dedup), HLS/DASH packaging, finalizing and cleanup
+    'maintenance': {
+        **RQ_CONNECTION,
+        'DEFAULT_TIMEOUT': 1800,
+    },
 }
 ROOT_URLCONF = 'videoflix_backend.urls'
 